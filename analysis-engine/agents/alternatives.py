@@ -1,6 +1,12 @@
-from tools.search import search
-from datetime import date
-from lib.client import client
+import asyncio
+from agents.loop import run_searches
+from tools.search import format_results
+from lib import llm, prompts
+from lib.compaction import Compactor, strip_cache_breakpoints
+from lib.context import current_job, parallel_search_enabled
+from lib.novelty import NoveltyMonitor, record_stop
+
+SEARCH_LIMIT = 3
 
 # Two tools: Tavily search + structured submit when done
 ALTERNATIVES_TOOLS = [
@@ -44,61 +50,73 @@ ALTERNATIVES_TOOLS = [
 ]
 
 
-def run_alternatives(product: str, emit=None) -> dict:
+async def arun_alternatives(product: str, emit=None) -> dict:
     searches = []
     search_count = 0
 
+    PARALLEL_NOTE = " If you need more than one search, issue them together in a single turn — they run in parallel." if parallel_search_enabled() else ""
+
+    # The product is only named in the user message, so this prompt is the same for every job
     SYSTEM_PROMPT = f"""You are the Alternatives agent in a product analysis pipeline.
-Today's date is {date.today().strftime("%B %d, %Y")}.
 
-Your only job: identify 3-5 products that consumers most commonly compare to — or buy instead of — the {product}.
+Your only job: identify 3-5 products that consumers most commonly compare to — or buy instead of — the product you are given.
 
 Search for what people actually consider as alternatives. Focus on:
 - Products in the same category and price range
 - Commonly mentioned competitors in reviews and comparison articles
 - A range of price points where relevant (budget, mid, premium)
 
-You have 3 searches maximum. Be efficient — one broad search often surfaces most candidates.
+You have 3 searches maximum. Be efficient — one broad search often surfaces most candidates.{PARALLEL_NOTE}
 When done, call submit_alternatives with your findings. Do not write prose analysis.
 """
 
+    system = prompts.system(SYSTEM_PROMPT)
     messages = [{"role": "user", "content": f"Find the top alternatives to: {product}"}]
 
+    job = current_job.get()
+    budget = job.deadline.allot("alternatives", write_reserve=5) if job else None
+    compactor = Compactor()
+    novelty = NoveltyMonitor(min_searches=2)  # Its whole budget is 3
+    stop_reason = None
+
     while True:
-        response = client.messages.create(
-            model="claude-haiku-4-5",
-            system=SYSTEM_PROMPT,
-            messages=messages,
-            tools=ALTERNATIVES_TOOLS,
-            max_tokens=1024
-        )
+        request = dict(model="claude-haiku-4-5", system=system, messages=messages, tools=ALTERNATIVES_TOOLS, max_tokens=1024)
+        if budget and budget.should_write():
+            # Out of time: submit whatever it has instead of searching again
+            request["tool_choice"] = {"type": "tool", "name": "submit_alternatives"}
+            stop_reason = stop_reason or "time_budget"
+        response = await llm.create("alternatives", **request)
 
         messages.append({"role": "assistant", "content": response.content})
 
         if response.stop_reason == "end_turn":
+            # Ended without submitting; still counted, like research_loop's finish()
+            record_stop("alternatives", stop_reason or "done")
             return {"alternatives": [], "searches": searches}
 
         elif response.stop_reason == "tool_use":
             tool_results = []
+            pending = []  # (index into tool_results, tool_use block) for searches to run this turn
             for block in response.content:
                 if block.type != "tool_use":
                     continue
 
                 if block.name == "search":
                     search_count += 1
+                    if search_count > SEARCH_LIMIT:
+                        tool_results.append({
+                            "type": "tool_result",
+                            "tool_use_id": block.id,
+                            "content": "Search limit reached. Call submit_alternatives now."
+                        })
+                        continue
                     print(f"[Alternatives] Searching: {block.input['query']}")
-                    result = search(block.input["query"])
-                    searches.append({"query": block.input["query"], "result": result})
-                    if search_count >= 3:
-                        result += "\n\nYou have enough information. Call submit_alternatives now."
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": block.id,
-                        "content": result
-                    })
+                    pending.append((len(tool_results), block))
+                    tool_results.append(None)
 
                 elif block.name == "submit_alternatives":
                     print(f"[Alternatives] Done — {len(block.input['alternatives'])} alternatives found")
+                    record_stop("alternatives", stop_reason or "done")
                     if emit:
                         emit({"type": "alternatives", "data": block.input["alternatives"]})
                     return {
@@ -106,14 +124,38 @@ When done, call submit_alternatives with your findings. Do not write prose analy
                         "searches": searches
                     }
 
+            results = await run_searches(
+                [block.input["query"] for _, block in pending],
+                timeout=budget.search_timeout() if budget else None,
+                agent="alternatives",
+            )
+            for (index, block), found in zip(pending, results):
+                tool_result = {"type": "tool_result", "tool_use_id": block.id}
+                novelty.observe(compactor.fill(tool_result, block.input["query"], found, turn_size=len(pending)))
+                searches.append({"query": block.input["query"], "result": format_results(found or [])})
+                tool_results[index] = tool_result
+            if pending and search_count >= SEARCH_LIMIT:
+                stop_reason = stop_reason or "search_limit"
+                tool_results[pending[-1][0]]["content"] += "\n\nYou have enough information. Call submit_alternatives now."
+            elif pending and novelty.exhausted() and stop_reason is None:
+                stop_reason = "low_novelty"
+                print(f"[Alternatives] Searches stopped adding anything new ({novelty.summary()})")
+                tool_results[pending[-1][0]]["content"] += "\n\nYour recent searches mostly repeat what you already found. Call submit_alternatives now."
+
             if tool_results:
+                strip_cache_breakpoints(messages)
                 tool_results[-1]["cache_control"] = {"type": "ephemeral"}
             messages.append({"role": "user", "content": tool_results})
 
         else:
+            record_stop("alternatives", stop_reason or "done")
             return {"alternatives": [], "searches": searches}
 
 
+def run_alternatives(product: str, emit=None) -> dict:
+    return asyncio.run(arun_alternatives(product, emit=emit))
+
+
 if __name__ == "__main__":
     product = "Sony WH-1000XM5 Headphones"
     result = run_alternatives(product)
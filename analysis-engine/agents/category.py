@@ -0,0 +1,40 @@
+import asyncio
+from agents.loop import research_loop, search_style_prompt
+from lib import prompts
+
+SEARCH_LIMIT = 4
+
+# Terms used to pick which already-gathered sources to hand this agent
+FOCUS = "best top rated buying guide comparison versus category ranking"
+
+
+async def arun_category(products: list[str], emit=None) -> dict:
+    messages = [
+        {"role": "user", "content": f"Research the category these products compete in: {'; '.join(products)}"}
+    ]
+
+    STATIC_PROMPT = f"""You are the Category Researcher in a product comparison pipeline.
+Several products are being compared head to head. Per-product agents will research each one in depth after you — do not do their job.
+Your job is the research every one of them would otherwise repeat:
+what matters most when choosing in this category, how current expert buying guides and comparison roundups rank the leading options,
+failure modes common across the category, and typical price ranges at each tier.
+Prefer broad category searches ("best ... of the year", "... buying guide", "X vs Y") over searches about a single product.
+You have {SEARCH_LIMIT} searches. Use them wisely. Prioritize recent sources over older ones.
+{search_style_prompt()}
+Write 2 short paragraphs. No headers, no bullet points, no markdown. Every claim cites a source."""
+
+    return await research_loop("category", system=prompts.system(STATIC_PROMPT, cache_dynamic=True), messages=messages, max_tokens=1024, emit=emit, focus=FOCUS, search_limit=SEARCH_LIMIT)
+
+
+def run_category(products: list[str], emit=None) -> dict:
+    return asyncio.run(arun_category(products, emit=emit))
+
+
+if __name__ == "__main__":
+    result = run_category(["Sony WH-1000XM5 Headphones", "Bose QuietComfort Ultra Headphones"])
+    print("\n --- Category ---")
+    print(result["analysis"])
+
+    print(f"\n --- Searches ({len(result['searches'])}) ---")
+    for s in result["searches"]:
+        print(f"  - {s['query']}")
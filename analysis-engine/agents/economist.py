@@ -1,20 +1,17 @@
-import os
-from tools.search import search
-from datetime import date
-from lib.client import client
-from tools.tools import TOOLS
+import asyncio
+from agents.loop import research_loop, search_style_prompt
+from lib import prompts
 
-def run_economist(product: str, owns: str|None = None, context: dict = {}, emit=None) -> dict:
-    thinking_steps = []
-    searches = []
-    search_count = 0
+# Terms used to pick which already-gathered sources to hand this agent
+FOCUS = "price deal sale cost discount cheaper value alternative budget msrp"
 
 
+async def arun_economist(product: str, owns: str|None = None, context: dict = {}, emit=None) -> dict:
     messages = [
         {"role": "user", "content": f"Analyze this product: {product}"}
     ]
     
-    STATIC_PROMPT = """You are the Economist agent in a product analysis pipeline.
+    STATIC_PROMPT = f"""You are the Economist agent in a product analysis pipeline.
 Your job is to answer two questions with evidence:
 1. Is the current price a good time to buy, or should the buyer wait for a better deal?
    Find the current price, the 90-day low, and any predictable sale windows. If waiting makes sense, name an exact price alert threshold.
@@ -22,89 +19,22 @@ Your job is to answer two questions with evidence:
    Name exact products with exact current prices. One concrete reason each avoids the identified weakness.
 
 Search for: current price vs 90-day history, competing products with current prices, value comparisons.
-Search one query at a time. After each result, reason about what you found and what to look for next before searching again.
-Never batch multiple searches at once. 7 searches maximum.
+7 searches maximum.
+{search_style_prompt()}
 Write 2-3 paragraphs. No headers, no bullets, no markdown. Plain prose, every price cited.
 Do NOT give a final BUY/WAIT/SKIP verdict — the Orchestrator makes that call. End with price and value findings only."""
 
-    OWNS_CONTEXT = f"\n\nThe user currently owns: {owns}. Frame your analysis based on the value proposition given what they already have. Factor in possible resale or trade-in value of their existing product as well." if owns else ""
-
-    DYNAMIC_PROMPT = f"Today's date is {date.today().strftime('%B %d, %Y')}.{OWNS_CONTEXT}\n\nThe Advocate made the case FOR buying:\n---\n{context.get('advocate', 'No prior analysis available.')}\n---\n\nThe Skeptic identified these weaknesses:\n---\n{context.get('skeptic', 'No prior analysis available.')}\n---"
-
-    while True:
-        response = client.messages.create(
-            model="claude-sonnet-4-6",
-            system=[
-                {"type": "text", "text": STATIC_PROMPT, "cache_control": {"type": "ephemeral"}},
-                {"type": "text", "text": DYNAMIC_PROMPT},
-            ],
-            messages=messages,
-            tools=TOOLS,
-            max_tokens=4096
-        )
+    OWNS_CONTEXT = f"The user currently owns: {owns}. Frame your analysis based on the value proposition given what they already have. Factor in possible resale or trade-in value of their existing product as well." if owns else ""
 
-        # Always append what the model said to the conversation history
-        messages.append({"role": "assistant", "content": response.content})
-        if response.stop_reason == "end_turn":
-            # Done! Extract and return text.
-            for block in response.content:
-                if hasattr(block, "text"):
-                    if emit:
-                        emit({"type": "analysis", "agent": "economist", "text": block.text})
-                    return {
-                        "analysis": block.text,
-                        "thinking_steps": thinking_steps,
-                        "searches": searches
-                            }
+    ADVOCATE = prompts.section("The Advocate made the case FOR buying:", context.get("advocate"), "No prior analysis available.")
+    SKEPTIC = prompts.section("The Skeptic identified these weaknesses:", context.get("skeptic"), "No prior analysis available.")
 
-        elif response.stop_reason == "tool_use":
-            tool_results = []
-            for block in response.content:
-                if hasattr(block, "text") and block.text:
-                    thinking_steps.append(block.text) # capture thinking steps
-                    print(f"[Economist thinking] {block.text}")
-                    if emit:
-                        emit({"type": "step", "agent": "economist", "step": {"type": "think", "text": block.text}})
-                if block.type == "tool_use":
-                    search_count += 1
-                    if search_count > 7:
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": "Search limit reached. Write your final analysis now."
-                        })
-                        continue
-                    print(f"[Economist] Searching: {block.input['query']}")
-                    if emit:
-                        emit({"type": "step", "agent": "economist", "step": {"type": "search", "query": block.input["query"]}})
-                    result = search(block.input["query"])
-                    searches.append({"query": block.input["query"], "result": result})
-                    if search_count == 7:
-                        result += "\n\nYou have enough information. Write your final analysis now."
-                        if emit:
-                            emit({"type": "writing_start", "agent": "economist"})
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": block.id,
-                        "content": result
-                    })
-            if tool_results:
-                tool_results[-1]["cache_control"] = {"type": "ephemeral"}
-            messages.append({"role": "user", "content": tool_results}) # type: ignore
+    return await research_loop("economist", system=prompts.system(STATIC_PROMPT, OWNS_CONTEXT, ADVOCATE, SKEPTIC, cache_dynamic=True), messages=messages, max_tokens=4096, emit=emit, focus=FOCUS)
 
-        elif response.stop_reason == "max_tokens":
-            for block in response.content:
-                if hasattr(block, "text"):
-                    return {
-                        "analysis": block.text,
-                        "thinking_steps": thinking_steps, 
-                        "searches": searches
-                    }
 
-        else:
-            return {"analysis": "", "thinking_steps": thinking_steps, "searches": searches}  # Unexpected stop reason, end the loop
+def run_economist(product: str, owns: str|None = None, context: dict = {}, emit=None) -> dict:
+    return asyncio.run(arun_economist(product, owns=owns, context=context, emit=emit))
 
-    
 
 if __name__ == "__main__":
     product = "Sony WH-1000XM5 Headphones"
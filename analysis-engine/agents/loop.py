@@ -0,0 +1,257 @@
+# The search-then-write loop shared by the Advocate, Skeptic and Economist.
+# Each agent supplies its prompts; the loop drives the model until it writes.
+import asyncio
+from tools.cache import normalize_query
+from tools.search import asearch_results, format_results
+from lib import llm, resilience
+from lib.compaction import Compactor, strip_cache_breakpoints
+from lib.context import current_job, parallel_search_enabled
+from lib.novelty import NoveltyMonitor, record_stop
+from lib.routing import Router, finished
+from lib.tracing import annotate, span
+from tools.tools import TOOLS
+
+SEARCH_LIMIT = 7
+# Text that runs this long without a tool call is treated as the write-up and
+# streamed; shorter text is usually a "let me search for..." thinking step.
+STREAM_AFTER_CHARS = 300
+
+
+SERIAL_SEARCH_PROMPT = """Search one query at a time. After each result, reason about what you found and what to look for next before searching again.
+Never batch multiple searches at once."""
+
+PARALLEL_SEARCH_PROMPT = """When you have several independent questions, issue those searches together in a single turn — they run in parallel.
+Only batch queries that don't depend on each other's results. After each batch, reason about what you found and what to look for next."""
+
+
+def search_style_prompt() -> str:
+    return PARALLEL_SEARCH_PROMPT if parallel_search_enabled() else SERIAL_SEARCH_PROMPT
+
+
+async def run_searches(queries: list[str], timeout: float | None = None, agent: str | None = None) -> list[list[dict] | None]:
+    """Run a turn's searches concurrently, within the job's in-flight cap. Results come
+    back in query order; a search that timed out comes back as None. Queries close
+    enough to one already run in this job are answered from its evidence store, or
+    wait for a matching one still in flight. A search that failed even after retries,
+    or whose provider's circuit is open, is skipped and also comes back as None."""
+    job = current_job.get()
+
+    async def limited(query: str) -> list[dict]:
+        with span("search", agent=agent, query=query) as trace_span:
+            if job is None:
+                return await asearch_results(query)
+            known = job.evidence.lookup(query)
+            if known is None:
+                running = job.evidence.running(query)
+                if running is not None:
+                    # Shielded: this search timing out mustn't cancel the one it's waiting on
+                    known = await asyncio.shield(running)
+            if known is not None:
+                print(f"[Evidence] Reusing earlier results for: {query}")
+                trace_span.set(evidence_hit=True, results=len(known))
+                return known
+            job.evidence.start(query)
+            try:
+                async with job.search_slots:
+                    results = await asearch_results(query)
+            except BaseException:
+                job.evidence.abandon(query)
+                raise
+            job.evidence.add(query, results, agent)
+            trace_span.set(results=len(results))
+            return results
+
+    async def one(query: str) -> list[dict] | None:
+        try:
+            return await asyncio.wait_for(limited(query), timeout)
+        except asyncio.TimeoutError:
+            print(f"[Search] Timed out after {timeout:.0f}s: {query}")
+            return None
+        except Exception as e:
+            if not resilience.degradable(e):
+                raise
+            # The agent carries on with what it has rather than failing the job
+            print(f"[Search] Skipped ({resilience.describe(e)}): {query}")
+            resilience.counters["searches_skipped"] += 1
+            return None
+
+    return list(await asyncio.gather(*(one(q) for q in queries)))
+
+
+async def stream_turn(agent: str, emit, writing: bool, **kwargs):
+    """Run one model turn through the streaming API, forwarding write-up text as
+    analysis_delta events. When `writing` is set the turn is known to be the
+    write-up and streams from the first token; otherwise text is held back
+    until it is clearly not a thinking step ahead of a search."""
+    pending = ""
+    streaming = writing
+    async with llm.stream(agent, **kwargs) as stream:
+        async for event in stream:
+            if event.type == "content_block_start" and event.content_block.type == "tool_use":
+                if streaming:
+                    # It was a long thinking step after all — tell clients to drop it
+                    emit({"type": "analysis_reset", "agent": agent})
+                streaming = False
+                pending = ""
+            elif event.type == "text":
+                if streaming:
+                    emit({"type": "analysis_delta", "agent": agent, "text": event.text})
+                else:
+                    pending += event.text
+                    if len(pending) >= STREAM_AFTER_CHARS:
+                        emit({"type": "analysis_delta", "agent": agent, "text": pending})
+                        streaming, pending = True, ""
+        response = await stream.get_final_message()
+    if pending and response.stop_reason != "tool_use":
+        emit({"type": "analysis_delta", "agent": agent, "text": pending})
+    return response
+
+
+async def research_loop(agent: str, system: list, messages: list, max_tokens: int = 2048, emit=None, focus: str = "",
+                        search_limit: int = SEARCH_LIMIT) -> dict:
+    label = agent.capitalize()
+    thinking_steps = []
+    searches = []
+    search_count = 0
+    writing = False  # Set once the agent has been told to stop searching and write
+    compactor = Compactor()
+    router = Router(agent)
+    searched = set()  # Normalized queries this agent has run
+    novelty = NoveltyMonitor()
+    stop_reason = None  # Why searching ended: done, low_novelty, search_limit or time_budget
+
+    def start_writing(reason: str, nudge: str, tool_result: dict | None):
+        # Tools are withheld from here on; the nudge rides on the newest tool result
+        nonlocal writing, stop_reason
+        writing, stop_reason = True, reason
+        record_stop(agent, reason)
+        if tool_result is not None:
+            tool_result["content"] += f"\n\n{nudge} Write your final analysis now."
+        if emit:
+            emit({"type": "writing_start", "agent": agent, "reason": reason})
+
+    def finish(analysis: str) -> dict:
+        if stop_reason is None:
+            record_stop(agent, "done")
+        annotate(stop_reason=stop_reason or "done", searches=len(searches), novelty=novelty.summary())
+        return {
+            "analysis": analysis,
+            "thinking_steps": thinking_steps,
+            "searches": searches,
+            "stop_reason": stop_reason or "done",
+        }
+
+    def newest_result() -> dict | None:
+        last = messages[-1]["content"]
+        return last[-1] if isinstance(last, list) and last else None
+
+    async def model_turn(model: str):
+        request = dict(model=model, system=system, messages=messages, tools=router.tools(model, TOOLS),
+                       max_tokens=router.max_tokens(model, max_tokens))
+        if writing:
+            request["tool_choice"] = {"type": "none"}
+        router.count(model)
+        if emit and not router.is_planner(model):
+            return await stream_turn(agent, emit, writing=writing, **request)
+        # Planner turns aren't streamed: they're a thought and a search, never the write-up
+        return await llm.create(agent, **request)
+
+    job = current_job.get()
+    budget = job.deadline.allot(agent) if job else None
+
+    if job and isinstance(messages[0]["content"], str):
+        # Hand over what earlier agents already found, ranked by this agent's focus
+        known = job.evidence.relevant(focus, exclude_agent=agent)
+        if known:
+            messages[0]["content"] += job.evidence.brief(known)
+            compactor.mark_seen(known)
+
+    while True:
+        if budget and not writing and budget.should_write():
+            # Out of research time: nudge on the pending tool results and take tools away
+            print(f"[{label}] Time budget spent, writing now")
+            start_writing("time_budget", "Time is nearly up.", newest_result())
+
+        model = router.model(writing)
+        try:
+            response = await model_turn(model)
+        except Exception as e:
+            if not (router.is_planner(model) and resilience.degradable(e)):
+                raise
+            # The planner model is failing; the writer takes the turn
+            model = router.escalate("planner_error")
+            response = await model_turn(model)
+        if router.is_planner(model):
+            reason = router.review(response, searched)
+            if reason:
+                response = await model_turn(router.escalate(reason))
+            elif finished(response):
+                # The planner has what it needs; the write-up itself goes to the writer model
+                print(f"[{label}] Research done, writing now")
+                start_writing("done", "You have enough information.", newest_result())
+                continue
+
+        # Always append what the model said to the conversation history
+        messages.append({"role": "assistant", "content": response.content})
+        if response.stop_reason == "end_turn":
+            # Done! Extract and return text.
+            for block in response.content:
+                if hasattr(block, "text"):
+                    if emit:
+                        emit({"type": "analysis", "agent": agent, "text": block.text})
+                    return finish(block.text)
+
+        elif response.stop_reason == "tool_use":
+            tool_results = []
+            pending = []  # (index into tool_results, tool_use block) for searches to run this turn
+            for block in response.content:
+                if hasattr(block, "text") and block.text:
+                    thinking_steps.append(block.text) # capture thinking steps
+                    print(f"[{label} thinking] {block.text}")
+                    if emit:
+                        emit({"type": "step", "agent": agent, "step": {"type": "think", "text": block.text}})
+                if block.type == "tool_use":
+                    search_count += 1
+                    if search_count > search_limit:
+                        tool_results.append({
+                            "type": "tool_result",
+                            "tool_use_id": block.id,
+                            "content": "Search limit reached. Write your final analysis now."
+                        })
+                        continue
+                    print(f"[{label}] Searching: {block.input['query']}")
+                    if emit:
+                        emit({"type": "step", "agent": agent, "step": {"type": "search", "query": block.input["query"]}})
+                    pending.append((len(tool_results), block))
+                    tool_results.append(None)
+
+            results = await run_searches(
+                [block.input["query"] for _, block in pending],
+                timeout=budget.search_timeout() if budget else None,
+                agent=agent,
+            )
+            compactor.make_room()
+            for (index, block), found in zip(pending, results):
+                tool_result = {"type": "tool_result", "tool_use_id": block.id}
+                novelty.observe(compactor.fill(tool_result, block.input["query"], found, turn_size=len(pending)))
+                searches.append({"query": block.input["query"], "result": format_results(found or [])})
+                searched.add(normalize_query(block.input["query"]))
+                tool_results[index] = tool_result
+            if pending and search_count >= search_limit and not writing:
+                start_writing("search_limit", "You have enough information.", tool_results[pending[-1][0]])
+            elif pending and novelty.exhausted() and not writing:
+                # The last few searches mostly turned up sources it had already seen
+                print(f"[{label}] Searches stopped adding anything new ({novelty.summary()}), writing now")
+                start_writing("low_novelty", "Your recent searches mostly repeat what you already found.", tool_results[pending[-1][0]])
+            if tool_results:
+                strip_cache_breakpoints(messages)
+                tool_results[-1]["cache_control"] = {"type": "ephemeral"}
+            messages.append({"role": "user", "content": tool_results}) # type: ignore
+
+        elif response.stop_reason == "max_tokens":
+            for block in response.content:
+                if hasattr(block, "text"):
+                    return finish(block.text)
+
+        else:
+            return finish("")  # Unexpected stop reason, end the loop
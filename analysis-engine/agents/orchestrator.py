@@ -1,5 +1,5 @@
-from datetime import date
-from lib.client import client
+import asyncio
+from lib import llm, prompts
 
 # No Tavily — synthesis only. Forces a single structured tool call.
 VERDICT_TOOL = [
@@ -49,35 +49,10 @@ VERDICT_TOOL = [
 ]
 
 
-def run_orchestrator(product: str, owns:str|None = None, context: dict = {}) -> dict:
-    
-    OWNS_CONTEXT = f"""
-    The user currently owns: {owns}.
-    Frame your analysis in the context of their existing ownership. For example, if they already own an older version of the same product, they may be more inclined to upgrade. If they own a competing product, they may be more inclined to switch if the new product addresses a key weakness of their current one. But be careful to ensure the Advocate's case is still strong on its own merits, and that the Skeptic's concerns are not dismissed just because the user might already own a version of the product.
-    """ if owns else ""
-    
-    
-    SYSTEM_PROMPT = f"""You are the Orchestrator in a product analysis pipeline.
-Today's date is {date.today().strftime("%B %d, %Y")}.
-
-{OWNS_CONTEXT}
-
-Three specialized agents have analyzed the {product}:
-
-ADVOCATE — the case FOR buying:
----
-{context.get("advocate", "No analysis available.")}
----
-
-SKEPTIC — weaknesses and problems found:
----
-{context.get("skeptic", "No analysis available.")}
----
-
-ECONOMIST — price timing and value alternatives:
----
-{context.get("economist", "No analysis available.")}
----
+# Everything job-specific (date, owns, the analyses) goes after this, so it is cached across jobs
+SYSTEM_PROMPT = """You are the Orchestrator in a product analysis pipeline.
+Three specialized agents have analyzed a product: the Advocate made the case FOR buying, the Skeptic searched for weaknesses and problems, and the Economist looked at price timing and value alternatives.
+Their analyses follow below.
 
 Synthesize these three perspectives into one decisive verdict. Call submit_verdict immediately.
 
@@ -91,9 +66,25 @@ Decision criteria:
 Confidence reflects how clearly the three analyses converge. Be decisive — do not hedge.
 """
 
-    response = client.messages.create(
+
+async def arun_orchestrator(product: str, owns:str|None = None, context: dict = {}) -> dict:
+    
+    OWNS_CONTEXT = f"""
+    The user currently owns: {owns}.
+    Frame your analysis in the context of their existing ownership. For example, if they already own an older version of the same product, they may be more inclined to upgrade. If they own a competing product, they may be more inclined to switch if the new product addresses a key weakness of their current one. But be careful to ensure the Advocate's case is still strong on its own merits, and that the Skeptic's concerns are not dismissed just because the user might already own a version of the product.
+    """ if owns else ""
+    
+    
+    ANALYSES = f"Three specialized agents have analyzed the {product}:\n\n" + "\n\n".join([
+        prompts.section("ADVOCATE — the case FOR buying:", context.get("advocate")),
+        prompts.section("SKEPTIC — weaknesses and problems found:", context.get("skeptic")),
+        prompts.section("ECONOMIST — price timing and value alternatives:", context.get("economist")),
+    ])
+
+    response = await llm.create(
+        "orchestrator",
         model="claude-sonnet-4-6",
-        system=SYSTEM_PROMPT,
+        system=prompts.system(SYSTEM_PROMPT, OWNS_CONTEXT, ANALYSES),
         messages=[{"role": "user", "content": "Synthesize the three analyses and submit your verdict."}],
         tools=VERDICT_TOOL,
         tool_choice={"type": "tool", "name": "submit_verdict"},
@@ -121,6 +112,120 @@ Confidence reflects how clearly the three analyses converge. Be decisive — do
     }
 
 
+# Comparison mode: one verdict across several products, each researched by its own agents
+COMPARISON_TOOL = [
+    {
+        "name": "submit_comparison",
+        "description": "Submit the comparative verdict across all products analyzed.",
+        "cache_control": {"type": "ephemeral"},
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "winner": {
+                    "type": "string",
+                    "description": "Exact name of the product to buy, as given. 'NONE' if none of them is worth buying right now."
+                },
+                "confidence": {
+                    "type": "integer",
+                    "minimum": 1,
+                    "maximum": 100,
+                    "description": "Confidence in the pick (1-100). Higher when the gap between the products is clear and well sourced."
+                },
+                "reasoning": {
+                    "type": "string",
+                    "description": "2-3 sentences explaining the pick. Name the deciding differences — the price gap, the defect, the feature."
+                },
+                "ranking": {
+                    "type": "array",
+                    "description": "Every product, best first.",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "product":  {"type": "string", "description": "Exact product name, as given"},
+                            "decision": VERDICT_TOOL[0]["input_schema"]["properties"]["decision"],
+                            "reason":   {"type": "string", "description": "One sentence (max 20 words) on where it stands against the others"}
+                        },
+                        "required": ["product", "decision", "reason"]
+                    }
+                },
+                "bullets": {
+                    "type": "array",
+                    "description": "Exactly 3 short bullet points (max 12 words each) on the differences that decided it.",
+                    "items": {"type": "string"},
+                    "minItems": 3,
+                    "maxItems": 3
+                }
+            },
+            "required": ["winner", "confidence", "reasoning", "ranking", "bullets"]
+        }
+    }
+]
+
+
+COMPARISON_PROMPT = """You are the Orchestrator in a head-to-head product comparison.
+Category research shared by all products follows below, then each product's analyses from an Advocate (case for), a Skeptic (problems found) and an Economist (price timing and value).
+
+Compare the products directly and pick one. Call submit_comparison immediately.
+Weigh the Skeptic's structural problems above the Advocate's strengths, and the Economist's prices against what each product delivers.
+Rank every product, and give each its own decision as if it had been analyzed alone.
+Confidence reflects how clearly one product beats the rest. Be decisive — do not hedge.
+"""
+
+
+async def arun_comparison_orchestrator(products: list[str], owns: str | None = None, category: str = "",
+                                       contexts: dict = {}) -> dict:
+    OWNS_CONTEXT = f"""
+The user currently owns: {owns}. If what they own already covers this use case better than any of these products, pick NONE and say so.
+""" if owns else ""
+
+    # Job context in the same layout as arun_orchestrator's, after the static instructions
+    ANALYSES = f"Three specialized agents have analyzed each of {len(products)} products:\n\n" + "\n\n".join(
+        f"=== {product} ===\n" + "\n\n".join([
+            prompts.section("ADVOCATE — the case FOR buying:", contexts.get(product, {}).get("advocate")),
+            prompts.section("SKEPTIC — weaknesses and problems found:", contexts.get(product, {}).get("skeptic")),
+            prompts.section("ECONOMIST — price timing and value alternatives:", contexts.get(product, {}).get("economist")),
+        ])
+        for product in products
+    )
+
+    CATEGORY = prompts.section("Category research shared by all products:", category, "No category research available.")
+
+    response = await llm.create(
+        "orchestrator",
+        model="claude-sonnet-4-6",
+        system=prompts.system(COMPARISON_PROMPT, OWNS_CONTEXT, CATEGORY, ANALYSES),
+        messages=[{"role": "user", "content": f"Compare {', '.join(products)} and submit your verdict."}],
+        tools=COMPARISON_TOOL,
+        tool_choice={"type": "tool", "name": "submit_comparison"},
+        max_tokens=1024
+    )
+
+    for block in response.content:
+        if block.type == "tool_use" and block.name == "submit_comparison":
+            verdict = block.input
+            print(f"[Orchestrator] Pick: {verdict['winner']} ({verdict['confidence']}% confidence)")
+            return {
+                "winner":     verdict["winner"],
+                "confidence": verdict["confidence"],
+                "reasoning":  verdict["reasoning"],
+                "ranking":    verdict.get("ranking", []),
+                "bullets":    verdict.get("bullets", []),
+            }
+
+    # Fallback — should not happen with tool_choice forced
+    return {
+        "winner": "NONE",
+        "confidence": 0,
+        "reasoning": "Orchestrator failed to produce a comparison.",
+        "ranking": [],
+        "bullets": [],
+    }
+
+
+def run_orchestrator(product: str, owns:str|None = None, context: dict = {}) -> dict:
+    return asyncio.run(arun_orchestrator(product, owns=owns, context=context))
+
+
 if __name__ == "__main__":
     product = "Sony WH-1000XM5 Headphones"
     result = run_orchestrator(product, context={
@@ -1,20 +1,17 @@
-import os
-from tools.search import search
-from datetime import date
-from lib.client import client
-from tools.tools import TOOLS
+import asyncio
+from agents.loop import research_loop, search_style_prompt
+from lib import prompts
 
-def run_skeptic(product: str, owns: str|None = None, context: dict = {}, emit=None) -> dict:
-    thinking_steps = []
-    searches = []
-    search_count = 0
+# Terms used to pick which already-gathered sources to hand this agent
+FOCUS = "problem complaint issue reddit durability failure broken regret lawsuit return defect"
 
 
+async def arun_skeptic(product: str, owns: str|None = None, context: dict = {}, emit=None) -> dict:
     messages = [
         {"role": "user", "content": f"Analyze this product: {product}"}
     ]
     
-    STATIC_PROMPT = """You are the Skeptic agent in a product analysis pipeline.
+    STATIC_PROMPT = f"""You are the Skeptic agent in a product analysis pipeline.
 Your job is to find what the Advocate missed. Search specifically for:
 - Reddit complaints, owner forums, failure reports
 - Durability issues, long-term problems
@@ -23,88 +20,19 @@ Your job is to find what the Advocate missed. Search specifically for:
 
 Do not repeat anything the Advocate already covered. Only find the weaknesses.
 Only 7 searches maximum.
-Search one query at a time. After each result, reason about what you found and what to look for next before searching again.
-Never batch multiple searches at once.
+{search_style_prompt()}
 Write 2-3 paragraphs. No headers, no bullets, no markdown. Plain prose, every sentence cited."""
 
-    OWNS_CONTEXT = f"\n\nThe user currently owns: {owns}. Scrutinize the Advocate's case for weaknesses especially relevant given what the user already owns. Also scrutinize whether the upgrade is actually worth it vs keeping the existing product." if owns else ""
-
-    DYNAMIC_PROMPT = f"Today's date is {date.today().strftime('%B %d, %Y')}.{OWNS_CONTEXT}\n\nThe Advocate has already built the case FOR buying this product:\n---\n{context.get('advocate', 'No prior analysis available.')}\n---"
-
-    while True:
-        response = client.messages.create(
-            model="claude-sonnet-4-6",
-            system=[
-                {"type": "text", "text": STATIC_PROMPT, "cache_control": {"type": "ephemeral"}},
-                {"type": "text", "text": DYNAMIC_PROMPT},
-            ],
-            messages=messages,
-            tools=TOOLS,
-            max_tokens=2048
-        )
+    OWNS_CONTEXT = f"The user currently owns: {owns}. Scrutinize the Advocate's case for weaknesses especially relevant given what the user already owns. Also scrutinize whether the upgrade is actually worth it vs keeping the existing product." if owns else ""
 
-        # Always append what the model said to the conversation history
-        messages.append({"role": "assistant", "content": response.content})
-        if response.stop_reason == "end_turn":
-            # Done! Extract and return text.
-            for block in response.content:
-                if hasattr(block, "text"):
-                    if emit:
-                        emit({"type": "analysis", "agent": "skeptic", "text": block.text})
-                    return {
-                        "analysis": block.text,
-                        "thinking_steps": thinking_steps,
-                        "searches": searches
-                            }
+    ADVOCATE = prompts.section("The Advocate has already built the case FOR buying this product:", context.get("advocate"), "No prior analysis available.")
 
-        elif response.stop_reason == "tool_use":
-            tool_results = []
-            for block in response.content:
-                if hasattr(block, "text") and block.text:
-                    thinking_steps.append(block.text) # capture thinking steps
-                    print(f"[Skeptic thinking] {block.text}")
-                    if emit:
-                        emit({"type": "step", "agent": "skeptic", "step": {"type": "think", "text": block.text}})
-                if block.type == "tool_use":
-                    search_count += 1
-                    if search_count > 7:
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": "Search limit reached. Write your final analysis now."
-                        })
-                        continue
-                    print(f"[Skeptic] Searching: {block.input['query']}")
-                    if emit:
-                        emit({"type": "step", "agent": "skeptic", "step": {"type": "search", "query": block.input["query"]}})
-                    result = search(block.input["query"])
-                    searches.append({"query": block.input["query"], "result": result})
-                    if search_count == 7:
-                        result += "\n\nYou have enough information. Write your final analysis now."
-                        if emit:
-                            emit({"type": "writing_start", "agent": "skeptic"})
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": block.id,
-                        "content": result
-                    })
-            if tool_results:
-                tool_results[-1]["cache_control"] = {"type": "ephemeral"}
-            messages.append({"role": "user", "content": tool_results}) # type: ignore
+    return await research_loop("skeptic", system=prompts.system(STATIC_PROMPT, OWNS_CONTEXT, ADVOCATE, cache_dynamic=True), messages=messages, max_tokens=2048, emit=emit, focus=FOCUS)
 
-        elif response.stop_reason == "max_tokens":
-            for block in response.content:
-                if hasattr(block, "text"):
-                    return {
-                        "analysis": block.text,
-                        "thinking_steps": thinking_steps, 
-                        "searches": searches
-                    }
 
-        else:
-            return {"analysis": "", "thinking_steps": thinking_steps, "searches": searches}  # Unexpected stop reason, end the loop
+def run_skeptic(product: str, owns: str|None = None, context: dict = {}, emit=None) -> dict:
+    return asyncio.run(arun_skeptic(product, owns=owns, context=context, emit=emit))
 
-    
 
 if __name__ == "__main__":
     product = "Sony WH-1000XM5 Headphones"
@@ -1,12 +1,37 @@
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import asyncio, json, threading
+import json, os
+from contextlib import asynccontextmanager
 from uuid import uuid4
+from typing import Literal
 from pydantic import BaseModel
-from pipeline import run_pipeline
+from pipeline import arun_comparison, arun_pipeline
+from tools.backend import get_backend
+from tools.search import cache as search_cache
+from lib.usage import totals as usage_totals
+from lib.jobs import JobRegistry, comparison_key, job_key, counters as stream_counters
+from lib.canonical import index as canonical_index
+from lib.job_store import store_from_env
+from lib.scheduler import QueueFull, SchedulerClosed, scheduler_from_env
+from lib.batches import get_batcher
+from lib import governor, resilience, routing
+from lib.novelty import stop_reasons
+from lib.bulk import BULK_MAX_ITEMS, BulkJob, BulkRegistry
 
-app = FastAPI(docs_url=None, redoc_url=None)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled search backend for the whole process, shared by every job
+    backend = get_backend()
+    yield
+    await bulk_registry.close()
+    await scheduler.close()
+    await get_batcher().aclose()
+    await backend.aclose()
+    await registry.aclose()
+
+app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,50 +39,141 @@ app.add_middleware(
     allow_methods=["GET", "POST"],
     allow_headers=["*"],
 )
-jobs: dict[str, asyncio.Queue] = {}
+registry = JobRegistry(retention=float(os.getenv("JOB_RETENTION_SECONDS", "900")), store=store_from_env())
+scheduler = scheduler_from_env()
+bulk_registry = BulkRegistry(retention=float(os.getenv("BULK_RETENTION_SECONDS", "86400")))
 
 class AnalyzeRequest(BaseModel):
     product: str
     owns: str | None = None
+    priority: Literal["interactive", "background"] = "interactive"
 
-@app.post("/analyze")
-async def analyze(req: AnalyzeRequest):
-    job_id = str(uuid4())
-    loop = asyncio.get_running_loop()
-    q: asyncio.Queue = asyncio.Queue()
-    jobs[job_id] = q
+MAX_COMPARE_PRODUCTS = int(os.getenv("MAX_COMPARE_PRODUCTS", "4"))
+
+class CompareRequest(BaseModel):
+    products: list[str]
+    owns: str | None = None
+    priority: Literal["interactive", "background"] = "interactive"
+
+class BatchItem(BaseModel):
+    product: str
+    owns: str | None = None
+
+class BatchRequest(BaseModel):
+    items: list[BatchItem]
 
-    def emit(event: dict):
-        loop.call_soon_threadsafe(q.put_nowait, event)
+async def start_job(key: tuple, work, priority: str):
+    """Single-flight admission shared by /analyze and /compare. `work(emit)` runs the pipeline."""
+    job, job_id = await registry.open(str(uuid4()), key)
+    if job is None:
+        # Already running, here or on another worker
+        await scheduler.promote(job_id, priority)
+        return {"job_id": job_id}
 
-    def run():
+    async def run():
+        # Runs on a scheduler worker on the server's event loop, so events go straight into the job
         try:
-            run_pipeline(req.product, req.owns, emit=emit)
+            await work(job.append)
         except Exception as e:
-            loop.call_soon_threadsafe(q.put_nowait, {"type": "error", "message": str(e)})
+            job.append({"type": "error", "message": str(e)})
         finally:
-            loop.call_soon_threadsafe(q.put_nowait, None)
+            await registry.finish(job)
 
-    threading.Thread(target=run, daemon=True).start()
-    return {"job_id": job_id}
+    try:
+        await scheduler.submit(job.id, run, lane=priority, emit=job.append)
+    except QueueFull as e:
+        await registry.discard(job)
+        return JSONResponse(
+            {"error": "Too many analyses in progress. Try again shortly.", "retry_after": e.retry_after},
+            status_code=429, headers={"Retry-After": str(e.retry_after)},
+        )
+    except SchedulerClosed:
+        await registry.discard(job)
+        return JSONResponse({"error": "Server is shutting down."}, status_code=503, headers={"Retry-After": "5"})
+    return {"job_id": job.id}
+
+@app.post("/analyze")
+async def analyze(req: AnalyzeRequest):
+    # Single-flight: an identical request already running gets shared, not rerun
+    return await start_job(
+        job_key(req.product, req.owns),
+        lambda emit: arun_pipeline(req.product, req.owns, emit=emit),
+        req.priority,
+    )
+
+@app.post("/compare")
+async def compare(req: CompareRequest):
+    # Head-to-head: shared category research, one chain per product, one comparative verdict
+    products = list({canonical_index.canonicalize(p): p.strip() for p in req.products if p.strip()}.values())
+    if not 2 <= len(products) <= MAX_COMPARE_PRODUCTS:
+        return JSONResponse({"error": f"Compare between 2 and {MAX_COMPARE_PRODUCTS} distinct products."}, status_code=400)
+    return await start_job(
+        comparison_key(products, req.owns),
+        lambda emit: arun_comparison(products, req.owns, emit=emit),
+        req.priority,
+    )
+
+@app.post("/batch")
+async def create_batch(req: BatchRequest):
+    # Catalog-sized runs: background lane, shared evidence, batched synthesis calls
+    if not req.items:
+        return JSONResponse({"error": "No items."}, status_code=400)
+    if len(req.items) > BULK_MAX_ITEMS:
+        return JSONResponse({"error": f"At most {BULK_MAX_ITEMS} items per batch."}, status_code=413)
+    if scheduler.closed:
+        return JSONResponse({"error": "Server is shutting down."}, status_code=503, headers={"Retry-After": "5"})
+    bulk = BulkJob(str(uuid4()), [(item.product, item.owns) for item in req.items])
+    bulk_registry.start(bulk, scheduler, arun_pipeline, batcher=get_batcher())
+    return {"batch_id": bulk.id, "items": len(bulk.items)}
+
+@app.get("/batch/{batch_id}")
+async def batch_status(batch_id: str):
+    bulk = bulk_registry.get(batch_id)
+    if not bulk:
+        return JSONResponse({"error": "batch not found"}, status_code=404)
+    return bulk.status()
+
+@app.get("/batch/{batch_id}/results")
+async def batch_results(batch_id: str):
+    # Finished items so far; complete once GET /batch/{id} reports status "done"
+    bulk = bulk_registry.get(batch_id)
+    if not bulk:
+        return JSONResponse({"error": "batch not found"}, status_code=404)
+    return StreamingResponse(
+        bulk.lines(), media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="batch-{batch_id}.jsonl"'},
+    )
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "llm": usage_totals.stats(),
+        "search_cache": search_cache.stats(),
+        "scheduler": scheduler.stats(),
+        "model_batches": get_batcher().stats(),
+        "bulk": bulk_registry.stats(),
+        "canonical": canonical_index.stats(),
+        "routing": routing.stats(),
+        "stop_reasons": dict(stop_reasons),
+        "resilience": resilience.stats(),
+        "governor": governor.stats(),
+        "streams": {"jobs": len(registry.jobs), "store": registry.store.name, **stream_counters},
+    }
 
 @app.get("/stream/{job_id}")
-async def stream(job_id: str):
+async def stream(job_id: str, last_event_id: int = 0, last_event_id_header: str | None = Header(None, alias="Last-Event-ID")):
+    # EventSource sends Last-Event-ID on reconnect; ?last_event_id= covers clients that can't set headers
+    if last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
+
     async def generator():
-        q = jobs.get(job_id)
-        if not q:
+        frames = await registry.stream(job_id, after=last_event_id, keepalive=15.0)
+        if frames is None:
             yield f"data: {json.dumps({'type': 'error', 'message': 'job not found'})}\n\n"
             return
-        while True:
-            try:
-                event = await asyncio.wait_for(q.get(), timeout=15.0)
-            except asyncio.TimeoutError:
-                yield ": keepalive\n\n"
-                continue
-            if event is None:
-                yield "data: [DONE]\n\n"
-                jobs.pop(job_id, None)
-                break
-            yield f"data: {json.dumps(event)}\n\n"
+        # Frames are serialized once per event and shared by every reader
+        async for _, frame in frames:
+            yield frame
+        yield b"data: [DONE]\n\n"
 
     return StreamingResponse(generator(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},)
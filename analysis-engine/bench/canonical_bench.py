@@ -0,0 +1,157 @@
+# Benchmark for lib/canonical.py. Builds an index over a synthetic catalog
+# (default 300k names), then times lookups of exact names, cosmetic variants,
+# typos and never-seen names, and checks variants resolve to the right key
+# and that another brand's product with the same model number doesn't.
+#
+#   python -m bench.canonical_bench --entries 300000 --lookups 20000
+import argparse, os, random, string, sys, time
+from lib.canonical import CanonicalIndex, parse, tokenize
+
+BRANDS = [
+    "Sony", "Bose", "Apple", "Samsung", "LG", "Dell", "Lenovo", "Asus", "Acer", "HP", "Microsoft", "Google",
+    "Sennheiser", "JBL", "Anker", "Logitech", "Razer", "Corsair", "Dyson", "Shark", "iRobot", "Philips",
+    "Panasonic", "Canon", "Nikon", "Fujifilm", "GoPro", "DJI", "Garmin", "Fitbit", "Xiaomi", "OnePlus",
+    "Nothing", "Jabra", "Beats", "Skullcandy", "Audio-Technica", "Shure", "Marshall", "Bang & Olufsen",
+    "Vizio", "TCL", "Hisense", "Roku", "Amazon", "Netgear", "TP-Link", "Eufy", "Ninja", "Vitamix",
+]
+SYLLABLES = ["quiet", "comfort", "ultra", "zen", "pro", "air", "max", "nova", "sound", "wave", "pulse", "flex",
+             "core", "edge", "vision", "spark", "aero", "nitro", "prime", "studio", "fusion", "halo", "orbit", "terra"]
+CATEGORIES = ["Headphones", "Earbuds", "Laptop", "Monitor", "Speaker", "Camera", "Vacuum", "Router", "Smartwatch", "TV"]
+COLORS = ["Black", "White", "Silver", "Midnight", "Blue"]
+
+
+def model_number(rng: random.Random) -> str:
+    letters = "".join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 3)))
+    digits = "".join(rng.choices(string.digits, k=rng.randint(3, 4)))
+    suffix = rng.choice(["", "", "X", "XM5", "S", "-II"])
+    return f"{letters}-{digits}{suffix}" if rng.random() < 0.5 else f"{letters}{digits}{suffix}"
+
+
+def catalog(n: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < n:
+        line = " ".join(w.capitalize() for w in rng.sample(SYLLABLES, rng.randint(1, 2)))
+        if rng.random() < 0.8:
+            name = f"{rng.choice(BRANDS)} {line} {model_number(rng)} {rng.choice(CATEGORIES)}"
+        else:
+            # No model number: only words and a generation digit
+            name = f"{rng.choice(BRANDS)} {line} {rng.randint(2, 12)} {rng.choice(CATEGORIES)}"
+        names.add(name)
+    return list(names)
+
+
+def variant(name: str, rng: random.Random) -> str:
+    """A cosmetic respelling that should land on the same key."""
+    choice = rng.randrange(4)
+    if choice == 0:
+        return name.lower().replace("-", "")
+    if choice == 1:
+        return f"{name} ({rng.choice(COLORS)})"
+    if choice == 2:
+        return name.upper()
+    words = name.split()
+    return " ".join(words[:-1]) if len(words) > 2 else name  # Drop the category noun
+
+
+def typo(name: str, rng: random.Random) -> str:
+    words = name.split()
+    candidates = [i for i, w in enumerate(words) if w.isalpha() and len(w) >= 6]
+    if not candidates:
+        return name
+    i = rng.choice(candidates)
+    j = rng.randrange(1, len(words[i]) - 1)
+    words[i] = words[i][:j] + words[i][j + 1:]
+    return " ".join(words)
+
+
+def rebrand(name: str, rng: random.Random) -> str | None:
+    """The same line and model number under another brand: a different product."""
+    brand = next((b for b in BRANDS if name.startswith(b + " ")), None)
+    if brand is None or not parse(name).models:
+        return None
+    return rng.choice([b for b in BRANDS if b != brand]) + name[len(brand):]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return 0.0
+
+
+def timed(index: CanonicalIndex, names: list[str]) -> tuple[list[str], list[float]]:
+    keys, micros = [], []
+    for name in names:
+        started = time.perf_counter()
+        keys.append(index.canonicalize(name, learn=False))
+        micros.append((time.perf_counter() - started) * 1e6)
+    return keys, micros
+
+
+def summary(micros: list[float]) -> str:
+    ordered = sorted(micros)
+    at = lambda p: ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+    return f"mean {sum(ordered) / len(ordered):7.1f}µs  p50 {at(0.5):7.1f}µs  p99 {at(0.99):7.1f}µs  max {ordered[-1]:8.1f}µs"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark product-name canonicalization")
+    parser.add_argument("--entries", type=int, default=300_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-p99-us", type=float, default=1000.0, help="fail if any lookup kind's p99 exceeds this")
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed + 1)
+
+    names = catalog(args.entries, args.seed)
+    before = rss_mb()
+    started = time.perf_counter()
+    index = CanonicalIndex(max_entries=args.entries)
+    for name in names:
+        index.add(name)
+    build = time.perf_counter() - started
+    print(f"Indexed {len(index)} entries in {build:.1f}s ({build / len(names) * 1e6:.1f}µs each), "
+          f"+{rss_mb() - before:.0f} MB RSS, {len(index.postings)} trigrams")
+
+    sample = rng.sample(names, min(args.lookups, len(names)))
+    expected = [index.canonicalize(n, learn=False) for n in sample]
+    seen = set(names)
+    unseen = [n for n in catalog(args.lookups, args.seed + 99) if n not in seen][:args.lookups]
+    kinds = {
+        "exact": sample,
+        "variant": [variant(n, rng) for n in sample],
+        "typo": [typo(n, rng) for n in sample],
+        "unseen": unseen,
+    }
+    rebranded = [(r, e) for n, e in zip(sample, expected) if (r := rebrand(n, rng))]
+
+    failed = False
+    for kind, queries in kinds.items():
+        keys, micros = timed(index, queries)
+        line = f"  {kind:<8} {summary(micros)}"
+        if kind in ("exact", "variant", "typo"):
+            line += f"  resolved {sum(k == e for k, e in zip(keys, expected)) / len(keys):6.1%}"
+        print(line)
+        failed |= sorted(micros)[int(0.99 * len(micros))] > args.max_p99_us
+    # A rebranded name may exist in the catalog on its own; it must never resolve to the original
+    keys, micros = timed(index, [r for r, _ in rebranded])
+    merged = sum(k == e for k, (_, e) in zip(keys, rebranded))
+    print(f"  rebrand  {summary(micros)}  merged   {merged}/{len(keys)}")
+    failed |= merged > 0
+    print(f"  tokenize {summary(timed_tokenize(sample))}")
+    return 1 if failed else 0
+
+
+def timed_tokenize(names: list[str]) -> list[float]:
+    micros = []
+    for name in names:
+        started = time.perf_counter()
+        tokenize(name)
+        micros.append((time.perf_counter() - started) * 1e6)
+    return micros
+
+
+if __name__ == "__main__":
+    sys.exit(main())
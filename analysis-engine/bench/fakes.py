@@ -0,0 +1,332 @@
+# Offline stand-ins for Anthropic and Tavily, for load tests and benchmarks.
+# They replay synthetic agent transcripts: how many search turns each agent
+# takes, how long model turns and searches take, and how many tokens each turn
+# reports. A Profile is either the built-in synthetic one or is derived from a
+# trace file written by lib/tracing.py (TRACE_JSONL_PATH) on a real run.
+import asyncio, itertools, json, math, random
+import anthropic, httpx
+from collections import defaultdict
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from anthropic.types import Message, TextBlock, ToolUseBlock, Usage
+from lib.tracing import current_span
+from tools.backend import SearchBackend
+
+WORDS = (
+    "battery", "durability", "price history", "warranty", "long term review", "complaints", "teardown",
+    "resale value", "comparison", "firmware", "noise", "build quality", "return rate", "deal", "recall",
+)
+
+
+@dataclass
+class Latency:
+    """Lognormal fitted to a median and p95, or an empirical sample to draw from."""
+
+    median: float
+    p95: float
+    samples: tuple[float, ...] = ()
+
+    def sample(self, rng: random.Random) -> float:
+        if self.samples:
+            return rng.choice(self.samples)
+        sigma = max(math.log(self.p95 / self.median), 0.0) / 1.645
+        return rng.lognormvariate(math.log(self.median), sigma)
+
+    @classmethod
+    def from_samples(cls, samples: list[float]) -> "Latency":
+        ordered = sorted(samples)
+        return cls(
+            median=ordered[len(ordered) // 2],
+            p95=ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+            samples=tuple(ordered),
+        )
+
+
+@dataclass
+class Profile:
+    # Model turn latency by model family ("sonnet", "haiku"); first-token share for streamed turns
+    llm_latency: dict[str, Latency] = field(default_factory=lambda: {
+        "sonnet": Latency(median=4.0, p95=9.0),
+        "haiku": Latency(median=1.5, p95=3.5),
+    })
+    first_token_share: float = 0.3
+    search_latency: Latency = field(default_factory=lambda: Latency(median=1.2, p95=3.0))
+    # Search turns per agent, drawn uniformly from (low, high)
+    search_turns: dict[str, tuple[int, int]] = field(default_factory=lambda: {
+        "advocate": (3, 6), "skeptic": (3, 6), "economist": (4, 7), "alternatives": (1, 3), "category": (2, 4),
+    })
+    searches_per_turn: int = 1                # >1 issues parallel tool_use blocks in one turn
+    results_per_search: int = 5
+    result_overlap: float = 0.0               # Share of results drawn from a small pool every search returns
+    input_tokens: tuple[int, int] = (1500, 600)  # First turn, growth per turn
+    cache_read_share: float = 0.7             # Share of prompt tokens reported as cache reads after turn 1
+    output_tokens: dict[str, int] = field(default_factory=lambda: {
+        "thinking": 80, "analysis": 900, "verdict": 250, "alternatives": 200,
+    })
+    time_scale: float = 1.0                   # Multiplies every latency; <1 runs faster than real time
+    llm_error_rate: float = 0.0               # Share of model calls that fail with 529 overloaded
+    search_error_rate: float = 0.0            # Share of searches that fail with 502
+    search_stall_rate: float = 0.0            # Share of searches that take 10x their drawn latency
+
+    def latency(self, model: str) -> Latency:
+        family = "haiku" if "haiku" in model else "sonnet"
+        return self.llm_latency.get(family) or next(iter(self.llm_latency.values()))
+
+    @classmethod
+    def from_trace(cls, path: str, **overrides) -> "Profile":
+        """Build a profile from the spans of real runs (lib/tracing.py JSONL export)."""
+        llm = defaultdict(list)
+        search = []
+        turns = defaultdict(lambda: defaultdict(int))   # trace -> agent -> search turns
+        output = defaultdict(list)
+        with open(path) as f:
+            for line in f:
+                span = json.loads(line)
+                attrs = span["attributes"]
+                if span["name"] == "llm":
+                    family = "haiku" if "haiku" in attrs.get("model", "") else "sonnet"
+                    llm[family].append(span["duration_seconds"])
+                    if attrs.get("stop_reason") == "tool_use":
+                        turns[span["trace_id"]][attrs.get("agent")] += 1
+                    elif "output_tokens" in attrs:
+                        output["analysis"].append(attrs["output_tokens"])
+                elif span["name"] == "search" and not (attrs.get("cache_hit") or attrs.get("evidence_hit")):
+                    search.append(span["duration_seconds"])
+
+        profile = cls(**overrides)
+        if llm:
+            profile.llm_latency = {family: Latency.from_samples(samples) for family, samples in llm.items()}
+        if search:
+            profile.search_latency = Latency.from_samples(search)
+        per_agent = defaultdict(list)
+        for agents in turns.values():
+            for agent, count in agents.items():
+                if agent in profile.search_turns:
+                    # The orchestrator and alternatives' submit turn also stop on tool_use
+                    per_agent[agent].append(count - 1 if agent == "alternatives" else count)
+        for agent, counts in per_agent.items():
+            profile.search_turns[agent] = (max(min(counts), 0), max(counts))
+        if output["analysis"]:
+            profile.output_tokens["analysis"] = sorted(output["analysis"])[len(output["analysis"]) // 2]
+        return profile
+
+
+_ids = itertools.count()
+POPULAR_SOURCES = 6
+
+
+def _text(message_content) -> str:
+    if isinstance(message_content, str):
+        return message_content
+    return " ".join(block.get("text", "") for block in message_content if isinstance(block, dict))
+
+
+class FakeMessages:
+    def __init__(self, profile: Profile, seed: int = 0):
+        self.profile = profile
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+
+    def _agent(self, kwargs: dict) -> str:
+        span = current_span()
+        if span is not None and span.attributes.get("agent"):
+            return span.attributes["agent"]
+        tools = {t["name"] for t in kwargs.get("tools", [])}
+        if tools & {"submit_verdict", "submit_comparison"}:
+            return "orchestrator"
+        if "submit_alternatives" in tools:
+            return "alternatives"
+        return "advocate"
+
+    def _usage(self, turn: int, output_tokens: int) -> Usage:
+        first, growth = self.profile.input_tokens
+        prompt = first + growth * turn
+        cached = int(prompt * self.profile.cache_read_share) if turn else 0
+        return Usage(
+            input_tokens=prompt - cached,
+            output_tokens=output_tokens,
+            cache_read_input_tokens=cached,
+            cache_creation_input_tokens=growth if turn else first,
+        )
+
+    def _respond(self, kwargs: dict) -> Message:
+        agent = self._agent(kwargs)
+        messages = kwargs["messages"]
+        turn = sum(1 for m in messages if m["role"] == "assistant")
+        subject = _text(messages[0]["content"]).splitlines()[0] if messages else ""
+        # The same conversation always gets the same search plan, however many turns it replays
+        plan = random.Random(f"{self.seed}:{agent}:{subject}")
+        low, high = self.profile.search_turns.get(agent, (0, 0))
+        target = plan.randint(low, high)
+        pick = random.Random(f"{self.seed}:{agent}:{subject}:{turn}")  # Fresh wording each turn
+        tokens = self.profile.output_tokens
+        forced = (kwargs.get("tool_choice") or {}).get("type")
+
+        def tool(name: str, payload: dict) -> ToolUseBlock:
+            return ToolUseBlock(type="tool_use", id=f"toolu_fake_{next(_ids)}", name=name, input=payload)
+
+        tools = {t["name"] for t in kwargs.get("tools", [])}
+        if "submit_comparison" in tools:
+            products = [p.strip() for p in subject.removeprefix("Compare ").removesuffix(" and submit your verdict.").split(",")]
+            content = [tool("submit_comparison", {
+                "winner": plan.choice(products),
+                "confidence": plan.randint(55, 90),
+                "reasoning": "Synthetic comparison from the offline benchmark.",
+                "ranking": [{"product": p, "decision": plan.choice(["BUY", "WAIT", "SKIP"]), "reason": "Synthetic."} for p in products],
+                "bullets": ["First synthetic difference.", "Second synthetic difference.", "Third synthetic difference."],
+            })]
+            return self._message(kwargs, content, "tool_use", self._usage(0, tokens["verdict"]))
+
+        if agent == "orchestrator":
+            content = [tool("submit_verdict", {
+                "decision": plan.choice(["BUY", "WAIT", "SKIP"]),
+                "confidence": plan.randint(55, 90),
+                "reasoning": "Synthetic verdict from the offline benchmark.",
+                "bullets": ["First synthetic reason.", "Second synthetic reason.", "Third synthetic reason."],
+            })]
+            return self._message(kwargs, content, "tool_use", self._usage(0, tokens["verdict"]))
+
+        if turn >= target and "done_researching" in tools:
+            # A routed planner turn hands over to the writer model instead of writing
+            return self._message(kwargs, [tool("done_researching", {})], "tool_use", self._usage(turn, tokens["thinking"]))
+
+        if forced == "none" or (turn >= target and agent != "alternatives"):
+            words = tokens["analysis"] * 3 // 4
+            content = [TextBlock(type="text", text=" ".join(pick.choice(WORDS) for _ in range(words)))]
+            return self._message(kwargs, content, "end_turn", self._usage(turn, tokens["analysis"]))
+
+        if agent == "alternatives" and (turn >= target or forced == "tool"):
+            content = [tool("submit_alternatives", {"alternatives": [
+                {"name": f"Alternative {i + 1}", "price": f"${plan.randint(50, 500)}", "note": "Synthetic alternative."}
+                for i in range(3)
+            ]})]
+            return self._message(kwargs, content, "tool_use", self._usage(turn, tokens["alternatives"]))
+
+        content = [TextBlock(type="text", text=f"Next I need to check the {pick.choice(WORDS)}.")]
+        for i in range(self.profile.searches_per_turn):
+            query = f"{subject[:60]} {agent} {pick.choice(WORDS)} {pick.choice(WORDS)} {turn}.{i}"
+            content.append(tool("search", {"query": query}))
+        return self._message(kwargs, content, "tool_use", self._usage(turn, tokens["thinking"]))
+
+    @staticmethod
+    def _message(kwargs: dict, content: list, stop_reason: str, usage: Usage) -> Message:
+        return Message(
+            id=f"msg_fake_{next(_ids)}", type="message", role="assistant", model=kwargs["model"],
+            content=content, stop_reason=stop_reason, stop_sequence=None, usage=usage,
+        )
+
+    def _latency(self, model: str) -> float:
+        return self.profile.latency(model).sample(self.rng) * self.profile.time_scale
+
+    def _error(self) -> Exception | None:
+        if self.rng.random() < self.profile.llm_error_rate:
+            self.errors += 1
+            response = httpx.Response(529, request=httpx.Request("POST", "https://api.anthropic.invalid/v1/messages"))
+            return anthropic.OverloadedError("Overloaded", response=response, body=None)
+        return None
+
+    async def create(self, **kwargs) -> Message:
+        self.calls += 1
+        error = self._error()
+        await asyncio.sleep(self._latency(kwargs["model"]) * (0.1 if error else 1))
+        if error:
+            raise error
+        return self._respond(kwargs)
+
+    def stream(self, **kwargs) -> "FakeStream":
+        self.calls += 1
+        return FakeStream(self._respond(kwargs), self._latency(kwargs["model"]), self.profile.first_token_share, self._error())
+
+
+class FakeStream:
+    """Mimics the SDK's MessageStream: content_block_start and text events, then get_final_message()."""
+
+    CHUNK_CHARS = 40
+
+    def __init__(self, message: Message, latency: float, first_token_share: float, error: Exception | None = None):
+        self.message = message
+        self.latency = latency
+        self.first_token_share = first_token_share
+        self.error = error
+
+    async def __aenter__(self):
+        if self.error:
+            # Like the SDK, a failed request surfaces when the stream is opened
+            await asyncio.sleep(self.latency * 0.1)
+            raise self.error
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.latency * self.first_token_share)
+        chunks = [
+            block.text[i:i + self.CHUNK_CHARS]
+            for block in self.message.content if block.type == "text"
+            for i in range(0, len(block.text), self.CHUNK_CHARS)
+        ]
+        gap = self.latency * (1 - self.first_token_share) / max(len(chunks), 1)
+        for block in self.message.content:
+            yield SimpleNamespace(type="content_block_start", content_block=SimpleNamespace(type=block.type))
+            if block.type != "text":
+                continue
+            for i in range(0, len(block.text), self.CHUNK_CHARS):
+                await asyncio.sleep(gap)
+                yield SimpleNamespace(type="text", text=block.text[i:i + self.CHUNK_CHARS])
+
+    async def get_final_message(self) -> Message:
+        return self.message
+
+
+class FakeAsyncAnthropic:
+    def __init__(self, profile: Profile | None = None, seed: int = 0):
+        self.messages = FakeMessages(profile or Profile(), seed)
+
+
+class FakeTavily(SearchBackend):
+    """Search backend with the profile's latency distribution and deterministic synthetic results."""
+
+    name = "fake-tavily"
+
+    def __init__(self, profile: Profile | None = None, seed: int = 0):
+        self.profile = profile or Profile()
+        self.rng = random.Random(seed)
+        self.queries = 0
+        self.errors = 0
+
+    async def asearch(self, query: str, **params) -> list[dict]:
+        self.queries += 1
+        latency = self.profile.search_latency.sample(self.rng) * self.profile.time_scale
+        if self.rng.random() < self.profile.search_stall_rate:
+            latency *= 10
+        if self.rng.random() < self.profile.search_error_rate:
+            self.errors += 1
+            await asyncio.sleep(latency * 0.1)
+            request = httpx.Request("POST", "https://api.tavily.invalid/search")
+            raise httpx.HTTPStatusError("502 Bad Gateway", request=request, response=httpx.Response(502, request=request))
+        await asyncio.sleep(latency)
+        slug = "-".join(query.lower().split())[:80]
+        pick = random.Random(query)
+        results = []
+        for i in range(self.profile.results_per_search):
+            if pick.random() < self.profile.result_overlap:
+                # The handful of big review sites that come up for everything
+                j = pick.randrange(POPULAR_SOURCES)
+                results.append({
+                    "title": f"Popular source {j + 1}",
+                    "url": f"https://bench.invalid/popular/{j}",
+                    "content": f"The same widely cited review number {j + 1}. " * 8,
+                })
+            else:
+                results.append({
+                    "title": f"{query} — source {i + 1}",
+                    "url": f"https://bench.invalid/{slug}/{i}",
+                    "content": f"Synthetic snippet {i + 1} for {query}. " * 8,
+                })
+        return results
+
+    def search(self, query: str, **params) -> list[dict]:
+        raise NotImplementedError("The benchmark only drives the async pipeline")
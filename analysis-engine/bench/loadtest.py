@@ -0,0 +1,328 @@
+# Offline load test for the API. Drives N concurrent /analyze + /stream
+# sessions against the real app in-process, with Anthropic and Tavily replaced
+# by the stand-ins in bench/fakes.py, so it runs with no network and no keys.
+#
+#   python -m bench.loadtest --sessions 50 --concurrency 20 --time-scale 0.05
+#   python -m bench.loadtest --profile trace.jsonl --json after.json --compare before.json
+#
+# Reports jobs/sec, time to first event, time to verdict and time to done
+# percentiles, peak threads, asyncio tasks, RSS and event-loop lag.
+import argparse, asyncio, json, os, resource, sys, threading, time
+from dataclasses import dataclass, field
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for the analysis API")
+    parser.add_argument("--sessions", type=int, default=20, help="total /analyze + /stream sessions")
+    parser.add_argument("--concurrency", type=int, default=10, help="sessions in flight at once")
+    parser.add_argument("--products", type=int, default=0, help="distinct products (default: one per session; fewer exercises coalescing)")
+    parser.add_argument("--workers", type=int, default=None, help="JOB_WORKERS for the scheduler")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="multiplier on every fake latency")
+    parser.add_argument("--profile", help="trace JSONL (TRACE_JSONL_PATH) to replay latencies and search counts from")
+    parser.add_argument("--searches-per-turn", type=int, default=1)
+    parser.add_argument("--result-overlap", type=float, default=0.0, help="share of search results repeated across searches")
+    parser.add_argument("--llm-errors", type=float, default=0.0, help="share of model calls that fail with 529")
+    parser.add_argument("--search-errors", type=float, default=0.0, help="share of searches that fail with 502")
+    parser.add_argument("--search-stalls", type=float, default=0.0, help="share of searches that take 10x as long")
+    parser.add_argument("--parallel-search", action="store_true", help="set PARALLEL_SEARCH=1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--compare", help="baseline report to compare against; exits 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression vs the baseline")
+    return parser.parse_args(argv)
+
+
+def configure_env(args):
+    # Must run before the app is imported: these are read at import time
+    os.environ.setdefault("ANTHROPIC_API_KEY", "offline-benchmark")
+    os.environ["SEARCH_CACHE_PATH"] = ""
+    if args.workers:
+        os.environ["JOB_WORKERS"] = str(args.workers)
+    if args.parallel_search:
+        os.environ["PARALLEL_SEARCH"] = "1"
+
+
+@dataclass
+class Session:
+    product: str
+    started: float = 0.0
+    first_event: float | None = None
+    verdict: float | None = None
+    done: float | None = None
+    events: int = 0
+    rejected: int = 0
+    error: str | None = None
+
+
+async def asgi_request(app, method: str, path: str, body: dict | None = None, on_chunk=None) -> tuple[int, dict, bytes]:
+    """Minimal in-process ASGI client. Unlike httpx's ASGITransport it hands
+    over body chunks as the app sends them, so streaming latency is real."""
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    finished = asyncio.Event()
+    delivered = False
+    response = {"status": 0, "headers": {}, "body": []}
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode().lower(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if on_chunk and chunk:
+                on_chunk(chunk)
+            else:
+                response["body"].append(chunk)
+            if not message.get("more_body"):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return response["status"], response["headers"], b"".join(response["body"])
+
+
+async def run_session(app, session: Session):
+    session.started = time.monotonic()
+    while True:
+        status, headers, body = await asgi_request(app, "POST", "/analyze", {"product": session.product})
+        if status != 429:
+            break
+        session.rejected += 1
+        await asyncio.sleep(min(float(headers.get("retry-after", "1")), 1.0))
+    if status != 200:
+        session.error = f"/analyze returned {status}"
+        return
+    job_id = json.loads(body)["job_id"]
+
+    buffer = b""
+
+    def on_chunk(chunk: bytes):
+        nonlocal buffer
+        buffer += chunk
+        while b"\n\n" in buffer:
+            frame, buffer = buffer.split(b"\n\n", 1)
+            for line in frame.decode().splitlines():
+                if not line.startswith("data: "):
+                    continue
+                now = time.monotonic() - session.started
+                data = line[len("data: "):]
+                if data == "[DONE]":
+                    session.done = now
+                    continue
+                event = json.loads(data)
+                session.events += 1
+                if session.first_event is None:
+                    session.first_event = now
+                if event.get("type") == "verdict":
+                    session.verdict = now
+                elif event.get("type") == "error":
+                    session.error = event.get("message")
+
+    await asgi_request(app, "GET", f"/stream/{job_id}", on_chunk=on_chunk)
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Peak, not current, off Linux
+
+
+@dataclass
+class Sampler:
+    interval: float = 0.05
+    threads: int = 0
+    tasks: int = 0
+    rss: int = 0
+    loop_lag: list[float] = field(default_factory=list)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.loop_lag.append(max(loop.time() - expected, 0.0))
+            self.threads = max(self.threads, threading.active_count())
+            self.tasks = max(self.tasks, len(asyncio.all_tasks()))
+            self.rss = max(self.rss, rss_bytes())
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def at(p: float) -> float:
+        return round(ordered[min(int(p * len(ordered)), len(ordered) - 1)], 3)
+
+    return {"p50": at(0.50), "p90": at(0.90), "p95": at(0.95), "p99": at(0.99), "max": round(ordered[-1], 3)}
+
+
+async def run(args) -> dict:
+    configure_env(args)
+    import lib.client
+    from api import app
+    from tools.backend import set_backend
+    from lib.usage import totals
+    from lib.novelty import stop_reasons
+    from lib import governor, resilience
+    from bench.fakes import FakeAsyncAnthropic, FakeTavily, Profile
+
+    overrides = {"time_scale": args.time_scale, "searches_per_turn": args.searches_per_turn, "result_overlap": args.result_overlap,
+                 "llm_error_rate": args.llm_errors, "search_error_rate": args.search_errors, "search_stall_rate": args.search_stalls}
+    profile = Profile.from_trace(args.profile, **overrides) if args.profile else Profile(**overrides)
+    fake_llm = FakeAsyncAnthropic(profile, seed=args.seed)
+    fake_search = FakeTavily(profile, seed=args.seed)
+    lib.client.async_client = fake_llm
+    set_backend(fake_search)
+
+    products = args.products or args.sessions
+    sessions = [Session(product=f"Benchmark Product {i % products}") for i in range(args.sessions)]
+    slots = asyncio.Semaphore(args.concurrency)
+    sampler = Sampler()
+
+    async def limited(session: Session):
+        async with slots:
+            await run_session(app, session)
+
+    async with app.router.lifespan_context(app):
+        sampling = asyncio.create_task(sampler.run())
+        started = time.monotonic()
+        await asyncio.gather(*(limited(s) for s in sessions))
+        wall = time.monotonic() - started
+        sampling.cancel()
+
+    completed = [s for s in sessions if s.done is not None and s.error is None]
+    usage = totals.stats()["by_model"]
+    return {
+        "config": {
+            "sessions": args.sessions, "concurrency": args.concurrency, "products": products,
+            "workers": int(os.getenv("JOB_WORKERS", "8")), "time_scale": args.time_scale,
+            "profile": args.profile or "synthetic", "searches_per_turn": args.searches_per_turn,
+            "result_overlap": args.result_overlap, "llm_errors": args.llm_errors,
+            "search_errors": args.search_errors, "search_stalls": args.search_stalls,
+        },
+        "wall_seconds": round(wall, 3),
+        "completed": len(completed),
+        "failed": [{"product": s.product, "error": s.error} for s in sessions if s not in completed],
+        "rejected_429": sum(s.rejected for s in sessions),
+        "jobs_per_second": round(len(completed) / wall, 3) if wall else 0.0,
+        "time_to_first_event": percentiles([s.first_event for s in completed if s.first_event is not None]),
+        "time_to_verdict": percentiles([s.verdict for s in completed if s.verdict is not None]),
+        "time_to_done": percentiles([s.done for s in completed]),
+        "events_per_session": round(sum(s.events for s in completed) / len(completed), 1) if completed else 0,
+        "peak_threads": sampler.threads,
+        "peak_tasks": sampler.tasks,
+        "peak_rss_mb": round(sampler.rss / 2**20, 1),
+        "event_loop_lag": percentiles(sampler.loop_lag),
+        "model_calls": fake_llm.messages.calls,
+        "searches": fake_search.queries,
+        "stop_reasons": {k: v for k, v in stop_reasons.items() if ":" not in k},
+        "injected_errors": {"model": fake_llm.messages.errors, "search": fake_search.errors},
+        "resilience": {k: v for k, v in resilience.stats().items() if k not in ("circuits", "hedge_after_seconds")},
+        "governor": governor_report(governor.stats(), wall),
+        "tokens_by_model": {m: {k: v for k, v in b.items() if k.endswith("tokens") or k == "calls"} for m, b in usage.items()},
+    }
+
+
+def governor_report(stats: dict, wall: float) -> dict:
+    """Each quota's limit next to the rate the run actually used, both per minute."""
+    report = {}
+    for name, limits in stats["limits"].items():
+        used = {"requests": limits["calls"], **{d: limits.get(f"used_{d}", 0) for d in ("input_tokens", "output_tokens")}}
+        report[name] = {
+            "avg_wait_seconds": limits["avg_wait_seconds"],
+            "waited": limits["waited"],
+            "per_minute": {d: (b["per_minute"], round(used[d] / wall * 60)) for d, b in limits["buckets"].items()},
+        }
+    return report
+
+
+# (report key, direction) — higher is better for throughput, lower for latencies
+REGRESSION_CHECKS = [
+    (("jobs_per_second",), "higher"),
+    (("time_to_first_event", "p95"), "lower"),
+    (("time_to_verdict", "p95"), "lower"),
+    (("time_to_done", "p95"), "lower"),
+    (("peak_rss_mb",), "lower"),
+]
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for path, direction in REGRESSION_CHECKS:
+        now, then = report, baseline
+        for key in path:
+            now, then = now.get(key, {}), then.get(key, {})
+        if not isinstance(now, (int, float)) or not isinstance(then, (int, float)) or not then:
+            continue
+        change = (now - then) / then
+        worse = change < -tolerance if direction == "higher" else change > tolerance
+        label = ".".join(path)
+        print(f"  {label:<26} {then:>10} → {now:<10} ({change:+.1%}){'  REGRESSION' if worse else ''}")
+        if worse:
+            regressions.append(label)
+    return regressions
+
+
+def print_report(report: dict):
+    config = report["config"]
+    print(f"\n{config['sessions']} sessions, concurrency {config['concurrency']}, {config['products']} products, "
+          f"{config['workers']} workers, time scale {config['time_scale']}, profile {config['profile']}")
+    print(f"  completed {report['completed']}/{config['sessions']} in {report['wall_seconds']}s "
+          f"→ {report['jobs_per_second']} jobs/s ({report['rejected_429']} rejected with 429)")
+    for key in ("time_to_first_event", "time_to_verdict", "time_to_done", "event_loop_lag"):
+        row = report[key]
+        if row:
+            print(f"  {key:<22} " + "  ".join(f"{k} {v:.3f}s" for k, v in row.items()))
+    print(f"  peak threads {report['peak_threads']}, peak tasks {report['peak_tasks']}, peak RSS {report['peak_rss_mb']} MB")
+    print(f"  {report['model_calls']} model calls, {report['searches']} searches, "
+          f"{report['events_per_session']} events per session")
+    if report.get("stop_reasons"):
+        print("  searching stopped: " + ", ".join(f"{k} {v}" for k, v in sorted(report["stop_reasons"].items())))
+    if any(report.get("injected_errors", {}).values()) or report.get("resilience"):
+        print(f"  injected errors: {report['injected_errors']}; resilience: "
+              + ", ".join(f"{k} {v}" for k, v in sorted(report["resilience"].items())))
+    for name, limits in report.get("governor", {}).items():
+        rates = ", ".join(f"{d} {used}/{limit}" for d, (limit, used) in limits["per_minute"].items())
+        print(f"  governor {name}: {rates} per minute used/limit; {limits['waited']} calls waited, avg {limits['avg_wait_seconds']}s")
+    for failure in report["failed"][:5]:
+        print(f"  FAILED {failure['product']}: {failure['error']}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nAgainst {args.compare} (tolerance {args.tolerance:.0%}):")
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+# Checks that prompt caching can work across jobs. Runs the full pipeline and
+# a comparison for different products, owners and dates against the offline
+# stand-ins, records every model request, and fails if any agent's cached
+# prefix (model, tools, system up to the first breakpoint) differs between
+# jobs, if a job's products, owner or date leak into a cached prefix, if the
+# comparison verdict never ran, or if a request carries more than the API's
+# four breakpoints. Also reports each prefix's estimated size against the
+# model's cache minimum, and how many routed planner turns are long enough to
+# be cached at all (see lib/routing.py).
+#
+#   python -m bench.prompt_cache
+import asyncio, json, os, sys
+from collections import defaultdict
+
+MAX_BREAKPOINTS = 4
+
+JOBS = [
+    # (products, owns, date line); one product is a normal analysis, several a comparison
+    (["Sony WH-1000XM5 Headphones"], None, "Today's date is March 02, 2026."),
+    (["Dyson V15 Detect Vacuum"], "Shark Stratos", "Today's date is October 18, 2026."),
+    (["Apple AirPods Pro 2", "Bose QuietComfort Ultra Earbuds"], None, "Today's date is October 18, 2026."),
+    (["Garmin Forerunner 265", "Apple Watch Series 10", "Coros Pace 3"], "Fitbit Charge 6", "Today's date is May 09, 2027."),
+]
+
+
+def breakpoints(request: dict) -> int:
+    count = sum(1 for tool in request.get("tools", []) if tool.get("cache_control"))
+    system = request.get("system")
+    if isinstance(system, list):
+        count += sum(1 for block in system if block.get("cache_control"))
+    for message in request["messages"]:
+        if isinstance(message["content"], list):
+            count += sum(1 for block in message["content"] if isinstance(block, dict) and block.get("cache_control"))
+    return count
+
+
+def install_recorder(messages, calls: list):
+    """Wrap the fake client's create/stream to keep (agent, request) for each call."""
+    from lib.compaction import estimate_tokens
+    from lib.prompts import cached_prefix
+    from lib.tracing import current_span
+    create, stream = messages.create, messages.stream
+
+    def keep(kwargs: dict):
+        span = current_span()
+        agent = span.attributes.get("agent") if span else "unknown"
+        calls.append({
+            "agent": agent,
+            "model": kwargs["model"],
+            "tools": ",".join(tool["name"] for tool in kwargs.get("tools", [])),
+            "prefix": cached_prefix(kwargs),
+            "breakpoints": breakpoints(kwargs),
+            # Everything up to the request's last breakpoint, roughly: what the next turn could read
+            "request_tokens": estimate_tokens(json.dumps([kwargs.get("tools"), kwargs.get("system"), kwargs["messages"]], default=str)),
+        })
+
+    async def recorded_create(**kwargs):
+        keep(kwargs)
+        return await create(**kwargs)
+
+    def recorded_stream(**kwargs):
+        keep(kwargs)
+        return stream(**kwargs)
+
+    messages.create, messages.stream = recorded_create, recorded_stream
+
+
+async def run(parallel_search: bool) -> list[dict]:
+    import lib.client, lib.prompts
+    from bench.fakes import FakeAsyncAnthropic, FakeTavily, Profile
+    from tools.backend import set_backend
+    from pipeline import arun_pipeline, arun_comparison
+
+    profile = Profile(time_scale=0.0)
+    lib.client.async_client = FakeAsyncAnthropic(profile)
+    set_backend(FakeTavily(profile))
+    calls: list[dict] = []
+    install_recorder(lib.client.async_client.messages, calls)
+
+    for job, (products, owns, date_line) in enumerate(JOBS):
+        lib.prompts.today = lambda: date_line
+        start = len(calls)
+        if len(products) == 1:
+            await arun_pipeline(products[0], owns, parallel_search=parallel_search)
+        else:
+            await arun_comparison(products, owns, parallel_search=parallel_search)
+        for call in calls[start:]:
+            call["job"] = job
+    return calls
+
+
+def leaks(call: dict) -> list[str]:
+    """Job-specific text found in a call's cached prefix; it belongs after the breakpoint."""
+    products, owns, date_line = JOBS[call["job"]]
+    prefix = json.loads(call["prefix"])
+    static = json.dumps(prefix["system"]) + json.dumps(prefix["tools"])
+    return [text for text in (*products, owns, date_line) if text and json.dumps(text)[1:-1] in static]
+
+
+def main() -> int:
+    os.environ.setdefault("ANTHROPIC_API_KEY", "offline-benchmark")
+    os.environ["SEARCH_CACHE_PATH"] = ""
+    from lib.compaction import estimate_tokens
+    from lib.prompts import MIN_CACHEABLE_TOKENS
+
+    failures = []
+    for parallel_search in (False, True):
+        calls = asyncio.run(run(parallel_search))
+        prefixes = defaultdict(set)
+        for call in calls:
+            # The orchestrator's verdict and comparison calls are different prompts; tell them apart by tool
+            prefixes[(call["agent"], call["model"], call["tools"])].add(call["prefix"])
+            if call["breakpoints"] > MAX_BREAKPOINTS:
+                failures.append(f"{call['agent']}: {call['breakpoints']} cache breakpoints in one request")
+            if found := leaks(call):
+                failures.append(f"{call['agent']} ({call['tools']}): job context in the cached prefix: {found}")
+        comparisons = [call for call in calls if call["tools"] == "submit_comparison"]
+        if len({call["job"] for call in comparisons}) != sum(len(products) > 1 for products, _, _ in JOBS):
+            failures.append("orchestrator: not every comparison job made a submit_comparison request")
+
+        print(f"parallel_search={parallel_search}: {len(calls)} requests")
+        for (agent, model, tools), seen in sorted(prefixes.items()):
+            tokens = max(estimate_tokens(prefix) for prefix in seen)
+            minimum = MIN_CACHEABLE_TOKENS["haiku" if "haiku" in model else "sonnet"]
+            status = "identical" if len(seen) == 1 else f"{len(seen)} DIFFERENT prefixes"
+            note = "" if tokens >= minimum else f"  (under the {minimum}-token minimum: only cached with what follows)"
+            print(f"  {agent:<13} {tools:<32} {status:<10} ~{tokens} tokens{note}")
+            if len(seen) > 1:
+                variants = [json.loads(prefix)["system"] for prefix in seen]
+                failures.append(f"{agent}: cached prefix differs across jobs: {variants}")
+
+        # Planner turns cache nothing across jobs; within one they do once the conversation is long enough
+        planner = defaultdict(lambda: [0, 0])
+        for call in calls:
+            if "haiku" in call["model"] and call["agent"] != "alternatives":
+                planner[call["agent"]][0] += call["request_tokens"] >= MIN_CACHEABLE_TOKENS["haiku"]
+                planner[call["agent"]][1] += 1
+        if planner:
+            reached = ", ".join(f"{agent} {hits}/{total}" for agent, (hits, total) in sorted(planner.items()))
+            print(f"  planner turns reaching the {MIN_CACHEABLE_TOKENS['haiku']}-token minimum: {reached}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+# A small in-memory server speaking the subset of the Redis protocol that
+# RedisStore (lib/job_store.py) uses, for running several API workers against
+# a shared JOB_STORE with no Redis installed:
+#
+#   python -m bench.redis_standin --port 6399
+#   JOB_STORE=redis JOB_STORE_URL=redis://localhost:6399/0 uvicorn api:app --port 8001
+#   JOB_STORE=redis JOB_STORE_URL=redis://localhost:6399/0 uvicorn api:app --port 8002
+#
+# Supports PING, AUTH, SELECT, SET (NX, PX), GET, DEL, PEXPIRE, XADD and
+# XREAD (COUNT, BLOCK, STREAMS), with key expiry. One keyspace; no persistence.
+import argparse, asyncio, time
+from lib.job_store import RespConnection
+
+
+def stream_id(raw: bytes) -> tuple[int, int]:
+    ms, _, seq = raw.partition(b"-")
+    return int(ms), int(seq or 0)
+
+
+class Standin:
+    def __init__(self):
+        self.values: dict[bytes, object] = {}   # bytes for strings, list of (id, fields) for streams
+        self.expires: dict[bytes, float] = {}
+        self.changed = asyncio.Condition()
+
+    def _live(self, key: bytes):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return self.values.get(key)
+
+    def _expire(self, key: bytes, ms: bytes):
+        self.expires[key] = time.monotonic() + int(ms) / 1000
+
+    async def handle(self, args: list[bytes]):
+        command, args = args[0].upper().decode(), args[1:]
+        if command in ("PING", "AUTH", "SELECT"):
+            return "PONG" if command == "PING" else "OK"
+        if command == "GET":
+            value = self._live(args[0])
+            return value if isinstance(value, bytes) or value is None else Exception("WRONGTYPE")
+        if command == "SET":
+            key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+            if b"NX" in options and self._live(key) is not None:
+                return None
+            self.values[key] = value
+            self.expires.pop(key, None)
+            if b"PX" in options:
+                self._expire(key, args[2 + options.index(b"PX") + 1])
+            return "OK"
+        if command == "DEL":
+            removed = 0
+            for key in args:
+                removed += self._live(key) is not None
+                self.values.pop(key, None)
+                self.expires.pop(key, None)
+            return removed
+        if command == "PEXPIRE":
+            if self._live(args[0]) is None:
+                return 0
+            self._expire(args[0], args[1])
+            return 1
+        if command == "XADD":
+            return await self._xadd(args[0], args[1], args[2:])
+        if command == "XREAD":
+            return await self._xread(args)
+        return Exception(f"ERR unknown command '{command}'")
+
+    async def _xadd(self, key: bytes, raw_id: bytes, fields: list[bytes]):
+        entries = self._live(key)
+        if entries is None:
+            entries = self.values[key] = []
+        last = stream_id(entries[-1][0]) if entries else (0, 0)
+        if raw_id == b"*":
+            ms = int(time.time() * 1000)
+            new = (ms, last[1] + 1) if ms <= last[0] else (ms, 0)
+        else:
+            new = stream_id(raw_id)
+        if new <= last:
+            return Exception("ERR The ID specified in XADD is equal or smaller than the target stream top item")
+        entry_id = f"{new[0]}-{new[1]}".encode()
+        entries.append((entry_id, fields))
+        async with self.changed:
+            self.changed.notify_all()
+        return entry_id
+
+    async def _xread(self, args: list[bytes]):
+        upper = [a.upper() for a in args]
+        count = int(args[upper.index(b"COUNT") + 1]) if b"COUNT" in upper else None
+        block = int(args[upper.index(b"BLOCK") + 1]) if b"BLOCK" in upper else None
+        rest = args[upper.index(b"STREAMS") + 1:]
+        keys, after = rest[:len(rest) // 2], [stream_id(a) for a in rest[len(rest) // 2:]]
+        deadline = time.monotonic() + (block or 0) / 1000
+
+        def ready():
+            found = []
+            for key, start in zip(keys, after):
+                entries = [[eid, fields] for eid, fields in self._live(key) or [] if stream_id(eid) > start]
+                if entries:
+                    found.append([key, entries[:count] if count else entries])
+            return found
+
+        async with self.changed:
+            while not (found := ready()):
+                remaining = deadline - time.monotonic()
+                if block is None or remaining <= 0:
+                    return None
+                try:
+                    await asyncio.wait_for(self.changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        return found
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = RespConnection(reader, writer)
+        try:
+            while True:
+                try:
+                    args = await connection.reply()
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    return
+                writer.write(encode_reply(await self.handle(args)))
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+def encode_reply(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, Exception):
+        return b"-%s\r\n" % str(value).encode()
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+
+
+async def start(host: str = "127.0.0.1", port: int = 6399) -> asyncio.Server:
+    return await asyncio.start_server(Standin().serve, host, port)
+
+
+async def main(host: str, port: int):
+    server = await start(host, port)
+    print(f"[Standin] Serving the job-store subset of RESP on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory stand-in for the Redis job store")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.port))
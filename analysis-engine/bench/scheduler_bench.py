@@ -0,0 +1,99 @@
+# Checks for lib/scheduler.py's lanes, with no pipeline behind them: jobs are
+# coroutines that wait on an event. Verifies that the background lane's worker
+# cap leaves room for interactive jobs, that a promoted job starts without any
+# other job finishing, and times a burst of short jobs through the workers.
+#
+#   python -m bench.scheduler_bench --workers 4 --jobs 2000
+import argparse, asyncio, sys, time
+from lib.scheduler import Scheduler
+
+
+class Probe:
+    """Jobs that record when they start and run until released."""
+
+    def __init__(self):
+        self.started: dict[str, float] = {}
+        self.release: dict[str, asyncio.Event] = {}
+
+    def job(self, job_id: str):
+        self.release[job_id] = asyncio.Event()
+
+        async def run():
+            self.started[job_id] = time.monotonic()
+            await self.release[job_id].wait()
+        return run
+
+    async def starts(self, job_id: str, within: float = 0.5) -> bool:
+        deadline = time.monotonic() + within
+        while job_id not in self.started and time.monotonic() < deadline:
+            await asyncio.sleep(0.005)
+        return job_id in self.started
+
+
+async def check_lanes(workers: int) -> list[str]:
+    failures = []
+    scheduler = Scheduler(workers=workers, lane_workers={"background": 1})
+    probe = Probe()
+    await scheduler.submit("bg-1", probe.job("bg-1"), lane="background")
+    await scheduler.submit("bg-2", probe.job("bg-2"), lane="background")
+    if not await probe.starts("bg-1"):
+        failures.append("first background job didn't start")
+    if await probe.starts("bg-2", within=0.1):
+        failures.append("second background job started past the lane's cap")
+    await scheduler.submit("fg-1", probe.job("fg-1"))
+    if not await probe.starts("fg-1"):
+        failures.append("interactive job waited behind the background lane")
+
+    # A request coalescing onto the queued background job moves it to the interactive lane;
+    # idle workers must pick it up without waiting for bg-1 or fg-1 to finish
+    await scheduler.promote("bg-2", "interactive")
+    if not await probe.starts("bg-2"):
+        failures.append(f"promoted job didn't start: {scheduler.stats()}")
+    for event in probe.release.values():
+        event.set()
+    await scheduler.close()
+    return failures
+
+
+async def burst(workers: int, jobs: int) -> float:
+    scheduler = Scheduler(workers=workers, queue_sizes={"interactive": jobs, "background": jobs})
+    done = asyncio.Event()
+    finished = 0
+
+    async def run():
+        nonlocal finished
+        await asyncio.sleep(0)
+        finished += 1
+        if finished == jobs:
+            done.set()
+
+    started = time.perf_counter()
+    for i in range(jobs):
+        await scheduler.submit(f"job-{i}", run, lane="interactive" if i % 4 else "background")
+    await done.wait()
+    elapsed = time.perf_counter() - started
+    await scheduler.close()
+    return elapsed
+
+
+async def run(args) -> int:
+    failures = await check_lanes(args.workers)
+    for failure in failures:
+        print(f"  FAIL {failure}")
+    print(f"  lanes    {'ok' if not failures else f'{len(failures)} failed'}")
+    elapsed = await burst(args.workers, args.jobs)
+    print(f"  burst    {args.jobs} jobs on {args.workers} workers in {elapsed:.3f}s "
+          f"({elapsed / args.jobs * 1e6:.1f}µs each)")
+    return 1 if failures else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check and time the job scheduler's lanes")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--jobs", type=int, default=2000)
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
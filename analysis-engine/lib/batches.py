@@ -0,0 +1,140 @@
+# Batched model calls for non-interactive work. Calls made within a short
+# window are collected into one batch and sent through a pluggable transport:
+# the Anthropic Message Batches API (half price, minutes-to-hours turnaround)
+# or a local stand-in that runs them through messages.create. Callers just
+# await create() and get an ordinary Message back.
+import asyncio, contextvars, itertools, os
+import lib.client
+
+MODEL_BATCH_BACKEND = os.getenv("MODEL_BATCH_BACKEND", "anthropic")
+BATCH_WINDOW_SECONDS = float(os.getenv("MODEL_BATCH_WINDOW_SECONDS", "5"))
+BATCH_MAX_REQUESTS = int(os.getenv("MODEL_BATCH_MAX_REQUESTS", "500"))
+BATCH_POLL_SECONDS = float(os.getenv("MODEL_BATCH_POLL_SECONDS", "15"))
+# Agents whose calls go through the batch path when a job has a batcher
+BATCHED_AGENTS = set(os.getenv("MODEL_BATCH_AGENTS", "orchestrator,alternatives").split(","))
+
+
+class BatchRequestFailed(Exception):
+    pass
+
+
+class AnthropicBatches:
+    name = "anthropic"
+
+    def __init__(self, poll_interval: float = BATCH_POLL_SECONDS):
+        self.poll_interval = poll_interval
+
+    async def run(self, requests: dict[str, dict]) -> dict:
+        """custom_id -> params in; custom_id -> Message or BatchRequestFailed out."""
+        batches = lib.client.async_client.messages.batches
+        batch = await batches.create(requests=[{"custom_id": cid, "params": params} for cid, params in requests.items()])
+        print(f"[Batches] Submitted {batch.id} with {len(requests)} requests")
+        while batch.processing_status != "ended":
+            await asyncio.sleep(self.poll_interval)
+            batch = await batches.retrieve(batch.id)
+        results = {}
+        async for entry in await batches.results(batch.id):
+            if entry.result.type == "succeeded":
+                results[entry.custom_id] = entry.result.message
+            else:
+                detail = getattr(entry.result, "error", None)
+                results[entry.custom_id] = BatchRequestFailed(f"{entry.result.type}: {detail}" if detail else entry.result.type)
+        return results
+
+
+class LocalBatches:
+    """Stand-in for offline runs and tests: waits `turnaround` seconds, then
+    runs every request concurrently through messages.create."""
+
+    name = "local"
+
+    def __init__(self, turnaround: float = 0.0):
+        self.turnaround = turnaround
+        self.batches: list[int] = []  # Size of each batch run, for inspection
+
+    async def run(self, requests: dict[str, dict]) -> dict:
+        self.batches.append(len(requests))
+        await asyncio.sleep(self.turnaround)
+        responses = await asyncio.gather(
+            *(lib.client.async_client.messages.create(**params) for params in requests.values()),
+            return_exceptions=True,
+        )
+        return dict(zip(requests, responses))
+
+
+class Batcher:
+    def __init__(self, transport, window: float = BATCH_WINDOW_SECONDS, max_requests: int = BATCH_MAX_REQUESTS):
+        self.transport = transport
+        self.window = window
+        self.max_requests = max_requests
+        self.pending: list[tuple[str, dict, asyncio.Future]] = []
+        self.timer: asyncio.TimerHandle | None = None
+        self.running: set[asyncio.Task] = set()
+        self.ids = itertools.count()
+        self.counters = {"requests": 0, "batches": 0, "failed": 0}
+
+    async def create(self, **params):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((f"req-{next(self.ids)}", params, future))
+        self.counters["requests"] += 1
+        if len(self.pending) >= self.max_requests:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        self.counters["batches"] += 1
+        # A batch serves many jobs, so it runs outside any one job's context
+        task = asyncio.create_task(self._run(batch), context=contextvars.Context())
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+
+    async def _run(self, batch: list[tuple[str, dict, asyncio.Future]]):
+        try:
+            results = await self.transport.run({cid: params for cid, params, _ in batch})
+        except Exception as e:
+            results = {cid: e for cid, _, _ in batch}
+        for cid, _, future in batch:
+            if future.done():  # The caller gave up waiting
+                continue
+            result = results.get(cid, BatchRequestFailed("missing from batch results"))
+            if isinstance(result, BaseException):
+                self.counters["failed"] += 1
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def aclose(self):
+        self.flush()
+        for task in list(self.running):
+            task.cancel()
+        await asyncio.gather(*self.running, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"backend": self.transport.name, **self.counters, "pending": len(self.pending), "in_flight": len(self.running)}
+
+
+TRANSPORTS = {"anthropic": AnthropicBatches, "local": LocalBatches}
+
+_batcher: Batcher | None = None
+
+
+def get_batcher() -> Batcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = Batcher(TRANSPORTS[MODEL_BATCH_BACKEND]())
+    return _batcher
+
+
+def set_batcher(batcher: Batcher) -> Batcher | None:
+    """Swap the process-wide batcher (e.g. one over LocalBatches). Returns the previous one."""
+    global _batcher
+    previous, _batcher = _batcher, batcher
+    return previous
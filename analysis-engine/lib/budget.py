@@ -0,0 +1,53 @@
+# Wall-clock budgets. Every job gets one deadline. When a research stage
+# starts, it is allotted a share of whatever time is left, after setting aside
+# the orchestrator's slice. Time a fast stage doesn't use flows to the stages
+# after it.
+import os, time
+
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "110"))
+ORCHESTRATOR_RESERVE = float(os.getenv("ORCHESTRATOR_RESERVE_SECONDS", "12"))
+WRITE_RESERVE = float(os.getenv("WRITE_RESERVE_SECONDS", "15"))  # Left for an agent's write-up turn
+
+# Relative shares for the sequential research chain, in run order
+CHAIN_WEIGHTS = {"advocate": 1.0, "skeptic": 1.0, "economist": 1.2}
+SIDE_SHARE = 0.4  # Stages off the chain (alternatives) get this fraction of what's left
+
+
+class StageBudget:
+    def __init__(self, name: str, seconds: float, write_reserve: float = WRITE_RESERVE):
+        self.name = name
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.write_reserve = write_reserve
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def should_write(self) -> bool:
+        """True once searching further would eat into the time needed to write."""
+        return self.remaining() <= self.write_reserve
+
+    def search_timeout(self) -> float:
+        return max(1.0, self.remaining() - self.write_reserve)
+
+
+class Deadline:
+    def __init__(self, seconds: float = JOB_DEADLINE_SECONDS, reserve: float = ORCHESTRATOR_RESERVE,
+                 chain: dict[str, float] | None = None):
+        self.expires_at = time.monotonic() + seconds
+        self.reserve = reserve
+        self.chain = dict(chain or CHAIN_WEIGHTS)  # Stages not yet started, with their weights
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def allot(self, name: str, write_reserve: float = WRITE_RESERVE) -> StageBudget:
+        available = max(0.0, self.remaining() - self.reserve)
+        if name in self.chain:
+            share = self.chain[name] / sum(self.chain.values())
+            del self.chain[name]
+        else:
+            share = SIDE_SHARE
+        seconds = available * share
+        print(f"[Budget] {name}: {seconds:.0f}s of {self.remaining():.0f}s left")
+        return StageBudget(name, seconds, write_reserve)
@@ -0,0 +1,161 @@
+# Bulk analysis: a list of products analysed overnight rather than watched
+# live. Items run in the scheduler's background lane a few at a time, share
+# one evidence store so related products reuse each other's searches, and send
+# their synthesis calls through the batch path. Results come back as JSONL.
+import asyncio, json, os, time
+from lib.budget import Deadline
+from lib.evidence import EvidenceStore
+from lib.scheduler import QueueFull
+from lib.canonical import canonical_key
+from lib.jobs import job_key
+
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000"))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "4"))  # Items per bulk job in the scheduler at once
+# Batched calls can take minutes to come back; research budgets shouldn't collapse waiting for them
+BULK_DEADLINE_SECONDS = float(os.getenv("BULK_DEADLINE_SECONDS", "1800"))
+
+
+class BulkItem:
+    def __init__(self, index: int, product: str, owns: str | None = None):
+        self.index = index
+        self.product = product
+        self.owns = owns
+        self.status = "pending"  # pending → queued → running → done | failed
+        self.result: dict | None = None
+        self.error: str | None = None
+        self.seconds: float | None = None
+
+    def line(self) -> str:
+        record = {"index": self.index, "product": self.product, "owns": self.owns, "status": self.status}
+        if self.result is not None:
+            record.update({
+                "verdict": self.result.get("verdict"),
+                "alternatives": self.result.get("alternatives", {}).get("alternatives", []),
+                "analyses": {
+                    agent: self.result[agent]["analysis"]
+                    for agent in ("advocate", "skeptic", "economist") if agent in self.result
+                },
+                "usage": self.result.get("usage", {}).get("total"),
+                "seconds": self.seconds,
+            })
+        if self.error is not None:
+            record["error"] = self.error
+        return json.dumps(record) + "\n"
+
+
+class BulkJob:
+    def __init__(self, bulk_id: str, items: list[tuple[str, str | None]]):
+        self.id = bulk_id
+        self.items = [BulkItem(i, product, owns) for i, (product, owns) in enumerate(items)]
+        self.evidence = EvidenceStore()  # Shared by every item in the batch
+        self.created = time.time()
+        self.finished: float | None = None
+        self.task: asyncio.Task | None = None
+
+    def counts(self) -> dict:
+        counts = {"pending": 0, "queued": 0, "running": 0, "done": 0, "failed": 0}
+        for item in self.items:
+            counts[item.status] += 1
+        return counts
+
+    def status(self) -> dict:
+        return {
+            "batch_id": self.id,
+            "status": "done" if self.finished else "running",
+            "items": len(self.items),
+            **self.counts(),
+            "created": self.created,
+            "finished": self.finished,
+            "evidence": self.evidence.stats(),
+        }
+
+    def lines(self):
+        """JSONL of finished items, in submission order."""
+        for item in self.items:
+            if item.status in ("done", "failed"):
+                yield item.line()
+
+
+async def run_bulk(bulk: BulkJob, scheduler, analyze, batcher=None):
+    """Feed a bulk job's items through the scheduler's background lane, at most
+    BULK_CONCURRENCY at a time. `analyze` is arun_pipeline (or a stand-in)."""
+    slots = asyncio.Semaphore(BULK_CONCURRENCY)
+    # Neighbouring names tend to be related (same brand, same line), so running them
+    # side by side gives the shared evidence store the most chances to hit. Sibling
+    # models don't get each other's sources: shared hits must name the same product.
+    order = sorted(bulk.items, key=lambda item: canonical_key(item.product))
+
+    leaders: dict[tuple, asyncio.Future] = {}  # Canonical (product, owns) -> the item analysing it
+
+    async def one(item: BulkItem):
+        key = job_key(item.product, item.owns)
+        if key in leaders:
+            # Same product spelt differently: share the first item's analysis
+            leader = await leaders[key]
+            item.status, item.result, item.error, item.seconds = leader.status, leader.result, leader.error, 0.0
+            return
+        finished = leaders[key] = asyncio.get_running_loop().create_future()
+
+        async def run():
+            item.status = "running"
+            started = time.monotonic()
+            try:
+                item.result = await analyze(
+                    item.product, item.owns,
+                    evidence=EvidenceStore(shared=bulk.evidence, product=item.product),
+                    deadline=Deadline(BULK_DEADLINE_SECONDS),
+                    batcher=batcher,
+                )
+                item.status = "done"
+            except Exception as e:
+                item.status, item.error = "failed", str(e)
+            finally:
+                item.seconds = round(time.monotonic() - started, 1)
+                finished.set_result(item)
+
+        async with slots:
+            while True:
+                try:
+                    await scheduler.submit(f"{bulk.id}:{item.index}", run, lane="background")
+                    break
+                except QueueFull as e:
+                    await asyncio.sleep(e.retry_after)
+            item.status = "queued" if item.status == "pending" else item.status
+            await finished
+
+    try:
+        await asyncio.gather(*(one(item) for item in order))
+    finally:
+        bulk.finished = time.time()
+        print(f"[Bulk] {bulk.id}: {bulk.counts()['done']}/{len(bulk.items)} done, evidence {bulk.evidence.stats()}")
+
+
+class BulkRegistry:
+    def __init__(self, retention: float = 86400.0):
+        self.retention = retention  # How long finished results stay downloadable
+        self.jobs: dict[str, BulkJob] = {}
+
+    def get(self, bulk_id: str) -> BulkJob | None:
+        return self.jobs.get(bulk_id)
+
+    def start(self, bulk: BulkJob, scheduler, analyze, batcher=None) -> BulkJob:
+        self.jobs[bulk.id] = bulk
+
+        async def run():
+            await run_bulk(bulk, scheduler, analyze, batcher)
+            asyncio.get_running_loop().call_later(self.retention, self.jobs.pop, bulk.id, None)
+
+        bulk.task = asyncio.create_task(run())
+        return bulk
+
+    def stats(self) -> dict:
+        running = [b for b in self.jobs.values() if not b.finished]
+        return {"jobs": len(self.jobs), "running": len(running), "items_pending": sum(
+            b.counts()["pending"] + b.counts()["queued"] + b.counts()["running"] for b in running
+        )}
+
+    async def close(self):
+        tasks = [b.task for b in self.jobs.values() if b.task and not b.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,247 @@
+# Product-name canonicalization. Free-text product names map to a stable key
+# so "Sony WH-1000XM5 Headphones", "sony wh1000xm5" and "WH-1000XM5 (black)"
+# share one single-flight slot. Names are tokenized, model numbers are pulled
+# out and normalized, and anything not seen before is matched against earlier
+# names through a trigram index before it becomes a new key.
+import os, re, unicodedata
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+
+CANONICAL_MAX_ENTRIES = int(os.getenv("CANONICAL_MAX_ENTRIES", "500000"))
+CANONICAL_MAX_SPELLINGS = int(os.getenv("CANONICAL_MAX_SPELLINGS", "1000000"))  # Keys plus learned respellings
+CANONICAL_CATALOG_PATH = os.getenv("CANONICAL_CATALOG_PATH", "")  # Optional: one known product name per line
+FUZZY_SIMILARITY = 0.7      # Trigram Dice coefficient a fuzzy match must reach
+MAX_POSTING = 1000          # Trigrams this common don't narrow anything down; skip them
+MAX_PREFIX = 6              # Rarest trigrams used to gather fuzzy candidates
+MAX_VERIFY = 16             # Candidates checked exactly per fuzzy lookup
+MAX_MODEL_CANDIDATES = 64   # Entries sharing a model number checked per lookup
+
+# Words that never tell two products apart
+NOISE = {
+    "the", "a", "an", "and", "with", "for", "new", "brand", "genuine", "official", "renewed", "refurbished",
+    "black", "white", "silver", "gray", "grey", "blue", "red", "green", "pink", "gold", "beige", "navy",
+    "midnight", "graphite", "starlight", "color", "colour", "edition", "version", "model", "unlocked",
+}
+# Category nouns: dropped when a model number already identifies the product,
+# and allowed to be missing on one side of a fuzzy match
+GENERIC = {
+    "headphones", "headphone", "earbuds", "earphones", "headset", "speaker", "speakers", "laptop", "notebook",
+    "phone", "smartphone", "tablet", "tv", "television", "monitor", "camera", "watch", "smartwatch", "console",
+    "keyboard", "mouse", "router", "vacuum", "blender", "wireless", "bluetooth", "noise", "cancelling",
+    "canceling", "over", "ear", "in", "true",
+}
+
+
+def tokenize(name: str) -> list[str]:
+    """Lowercase ASCII word tokens. Hyphens, dots and slashes inside a token are
+    dropped so "WH-1000XM5" and "wh1000xm5" agree; a short letter prefix split
+    off a model number ("RTX 4090", "WH 1000XM5") is joined back on."""
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower()
+    text = re.sub(r"[()\[\]{},;:+&|\"']", " ", text)
+    raw = [re.sub(r"[-_./]", "", t) for t in text.split()]
+    tokens: list[str] = []
+    for token in raw:
+        if not token:
+            continue
+        if (tokens and token[0].isdigit() and len(token) >= 3
+                and tokens[-1].isalpha() and len(tokens[-1]) <= 3 and tokens[-1] not in NOISE):
+            tokens[-1] += token
+        elif tokens and token[0].isalpha() and _has_digit(token) and _has_digit(tokens[-1]) and not tokens[-1].isdigit():
+            tokens[-1] += token   # "wh1000 xm5"
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def _has_digit(token: str) -> bool:
+    return any(c.isdigit() for c in token)
+
+
+def is_model_number(token: str) -> bool:
+    # Letters and digits together, or a long bare number that isn't a year
+    if len(token) < 3 or not _has_digit(token):
+        return False
+    if token.isdigit():
+        return len(token) >= 3 and not re.fullmatch(r"(19|20)\d\d", token)
+    return True
+
+
+@dataclass(frozen=True)
+class ParsedName:
+    tokens: tuple[str, ...]      # Identity tokens, in input order
+    models: frozenset            # Model numbers among them
+
+    @property
+    def key(self) -> str:
+        return " ".join(self.tokens)
+
+    @property
+    def compact(self) -> str:
+        # Catches word-splitting differences: "quiet comfort" vs "quietcomfort". Category
+        # nouns only drop out when enough is left to tell "Apple Watch" from "Apple"
+        specific = [t for t in self.tokens if t not in GENERIC]
+        return "".join(specific if len(specific) >= 2 else self.tokens)
+
+
+def parse(name: str) -> ParsedName:
+    tokens = [t for t in tokenize(name) if t not in NOISE]
+    models = frozenset(t for t in tokens if is_model_number(t))
+    if models:
+        tokens = [t for t in tokens if t not in GENERIC]
+    return ParsedName(tuple(dict.fromkeys(tokens)), models)
+
+
+def trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+GENERIC_TRIGRAMS = [trigrams(word) for word in GENERIC if len(word) >= 5]
+
+
+def _covered(token: str, others: tuple[str, ...], own: tuple[str, ...] = ()) -> bool:
+    """Whether `token` has a counterpart among `others`: identical for anything with
+    digits ("15" vs "14", "xm4" vs "xm5" never match), a near spelling for plain
+    words. A word already spelt the same on `token`'s own side isn't a near spelling
+    of it ("shark spark" vs "spark"). Category nouns can always be missing."""
+    if token in others or token in GENERIC:
+        return True
+    if _has_digit(token) or len(token) < 5:
+        return False
+    grams = trigrams(token)
+    candidates = [trigrams(o) for o in others if not _has_digit(o) and o not in own] + GENERIC_TRIGRAMS  # A misspelt category noun is still one
+    return any(2 * len(grams & other) / (len(grams) + len(other)) >= 0.5 for other in candidates)
+
+
+def _before_model(tokens: list[str], parsed: ParsedName) -> bool:
+    first = min(parsed.tokens.index(m) for m in parsed.models)
+    return all(parsed.tokens.index(t) < first for t in tokens)
+
+
+def _tokens_align(a: ParsedName, b: ParsedName) -> bool:
+    return (all(_covered(t, b.tokens, a.tokens) for t in a.tokens)
+            and all(_covered(t, a.tokens, b.tokens) for t in b.tokens))
+
+
+class CanonicalIndex:
+    def __init__(self, max_entries: int = CANONICAL_MAX_ENTRIES, similarity: float = FUZZY_SIMILARITY,
+                 max_spellings: int = CANONICAL_MAX_SPELLINGS):
+        self.max_entries = max_entries
+        self.max_spellings = max(max_spellings, max_entries)
+        self.similarity = similarity
+        self.keys: list[str] = []
+        self.parsed: list[ParsedName] = []
+        self.ids: dict[str, int] = {}
+        self.compact: dict[str, int] = {}
+        self.by_model: dict[str, array] = {}
+        self.postings: dict[str, array] = {}
+        self.counters = {"exact": 0, "variant": 0, "model": 0, "fuzzy": 0, "new": 0}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, name: str) -> str:
+        parsed = parse(name)
+        return self._add(parsed) if parsed.key not in self.ids else parsed.key
+
+    def _add(self, parsed: ParsedName) -> str:
+        if len(self.keys) >= self.max_entries:
+            return parsed.key  # Full: still a usable key, just not remembered
+        entry = len(self.keys)
+        self.keys.append(parsed.key)
+        self.parsed.append(parsed)
+        self.ids[parsed.key] = entry
+        self.compact.setdefault(parsed.compact, entry)
+        for model in parsed.models:
+            self.by_model.setdefault(model, array("I")).append(entry)
+        for gram in trigrams(parsed.key):
+            self.postings.setdefault(gram, array("I")).append(entry)
+        return parsed.key
+
+    def _by_model(self, parsed: ParsedName) -> int | None:
+        # Same model numbers, and every word on each side (typos allowed) present on the
+        # other. Words ahead of the model number may be left out of one side ("WH-1000XM5"
+        # finds "sony wh1000xm5"), but only if that leaves exactly one entry it could mean;
+        # a different word on each side is a different brand ("TCL Q80C" isn't "Samsung Q80C").
+        # Words after it ("S24" vs "S24 Ultra") always count.
+        loose = []
+        for entry in self.by_model.get(min(parsed.models), ())[:MAX_MODEL_CANDIDATES]:
+            other = self.parsed[entry]
+            if other.models != parsed.models:
+                continue
+            missing = [t for t in parsed.tokens if not _covered(t, other.tokens, parsed.tokens)]
+            extra = [t for t in other.tokens if not _covered(t, parsed.tokens, other.tokens)]
+            if not missing and not extra:
+                return entry
+            if (not missing or not extra) and _before_model(missing, parsed) and _before_model(extra, other):
+                loose.append(entry)
+        return loose[0] if len(loose) == 1 else None
+
+    def _fuzzy(self, parsed: ParsedName) -> int | None:
+        grams = trigrams(parsed.key)
+        # Prefix filter: any entry with Dice >= s shares at least s/(2-s) of the query's
+        # trigrams, so it must contain one of the rarest len - that + 1 of them
+        ranked = sorted(grams, key=lambda g: len(self.postings.get(g, ())))
+        needed = int(len(grams) * self.similarity / (2 - self.similarity))
+        counts = Counter()
+        for gram in ranked[:min(len(grams) - needed + 1, MAX_PREFIX)]:
+            posting = self.postings.get(gram, ())
+            if len(posting) <= MAX_POSTING:
+                counts.update(posting)
+        best, best_score = None, self.similarity
+        for entry, _ in counts.most_common(MAX_VERIFY):
+            other = self.parsed[entry]
+            other_grams = trigrams(other.key)
+            score = 2 * len(grams & other_grams) / (len(grams) + len(other_grams))
+            if score >= best_score and not other.models and _tokens_align(parsed, other):
+                best, best_score = entry, score
+        return best
+
+    def canonicalize(self, name: str, learn: bool = True) -> str:
+        parsed = parse(name)
+        if not parsed.tokens:
+            return " ".join(name.lower().split())
+        entry = self.ids.get(parsed.key)
+        if entry is not None:
+            self.counters["exact"] += 1
+            return self.keys[entry]
+        entry = self.compact.get(parsed.compact)
+        if entry is not None:
+            self.counters["variant"] += 1
+        elif parsed.models:
+            # Model numbers must match exactly anyway, so they're the whole search
+            entry = self._by_model(parsed)
+            if entry is not None:
+                self.counters["model"] += 1
+        else:
+            entry = self._fuzzy(parsed)
+            if entry is not None:
+                self.counters["fuzzy"] += 1
+        if entry is not None:
+            if learn and len(self.ids) < self.max_spellings:
+                # Remember this spelling so the next lookup is exact
+                self.ids.setdefault(parsed.key, entry)
+            return self.keys[entry]
+        self.counters["new"] += 1
+        return self._add(parsed) if learn else parsed.key
+
+    def stats(self) -> dict:
+        return {"entries": len(self.keys), "spellings": len(self.ids), **self.counters}
+
+
+def load_catalog(index: CanonicalIndex, path: str) -> int:
+    with open(path) as f:
+        names = [line.strip() for line in f if line.strip()]
+    for name in names:
+        index.add(name)
+    return len(names)
+
+
+index = CanonicalIndex()
+if CANONICAL_CATALOG_PATH:
+    print(f"[Canonical] Loaded {load_catalog(index, CANONICAL_CATALOG_PATH)} catalog names")
+
+
+def canonical_key(name: str) -> str:
+    return index.canonicalize(name)
@@ -2,4 +2,6 @@
 import anthropic, os
 from dotenv import load_dotenv
 load_dotenv()
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
\ No newline at end of file
+client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# Retries are handled per call in lib/resilience.py, alongside the circuit breakers
+async_client = anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), max_retries=0)
@@ -0,0 +1,142 @@
+# Keeps search results in an agent's message history lean. Every turn resends
+# the whole history, so anything already seen, boilerplate, or beyond the
+# tool-result token budget is dropped before it goes in rather than paid for
+# on every later turn.
+import os, re
+from urllib.parse import urlsplit
+from tools.search import format_results
+
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "6000"))
+# Collapse older results into digests once over budget. A collapse rewrites
+# results the model was already sent, so it invalidates the cached history and
+# the next turn writes it to the cache again. It therefore only happens once
+# the history is actually over budget, cuts it to DIGEST_TARGET of the budget
+# in one go, and waits at least DIGEST_MIN_TURNS turns before the next one, so
+# the rewrite is paid rarely rather than on every turn.
+DIGESTS = os.getenv("TOOL_RESULT_DIGESTS", "0") == "1"
+DIGEST_TARGET = 0.5
+DIGEST_MIN_TURNS = int(os.getenv("TOOL_RESULT_DIGEST_MIN_TURNS", "3"))
+SNIPPET_CHARS = 500
+MIN_SNIPPET_CHARS = 120
+DUPLICATE_SIMILARITY = 0.8
+
+BOILERPLATE = re.compile(
+    r"\b(cookie|subscribe|newsletter|sign up|sign in|log in|advertisement|all rights reserved|privacy policy"
+    r"|terms of (use|service)|skip to (main )?content|we may earn|affiliate|click here|share this|follow us)\b",
+    re.I,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url)
+    host = parts.netloc.lower().removeprefix("www.")
+    return f"{host}{parts.path.rstrip('/')}"
+
+
+def clean_snippet(text: str) -> str:
+    text = re.sub(r"!\[[^\]]*\]\([^)]*\)", " ", text)      # Markdown images
+    text = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", text)   # Markdown links → their text
+    text = re.sub(r"https?://\S+", " ", text)
+    sentences = re.split(r"(?<=[.!?])\s+|\n+", text)
+    return " ".join(" ".join(s for s in sentences if s.strip() and not BOILERPLATE.search(s)).split())
+
+
+def shingles(text: str, n: int = 4) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+
+def similarity(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def strip_cache_breakpoints(messages: list):
+    """Drop cache_control from earlier tool results so only the newest carries one
+    (the API allows four breakpoints per request, and lib/prompts.py puts up to three
+    on the tools and system prompt)."""
+    for message in messages:
+        if message["role"] == "user" and isinstance(message["content"], list):
+            for block in message["content"]:
+                if isinstance(block, dict):
+                    block.pop("cache_control", None)
+
+
+class Compactor:
+    def __init__(self, budget_tokens: int = TOOL_RESULT_TOKEN_BUDGET, digests: bool = DIGESTS):
+        self.budget_tokens = budget_tokens
+        self.digests = digests
+        self.seen_urls: set[str] = set()
+        self.seen_snippets: list[set] = []
+        self.filled: list[tuple[dict, str]] = []  # (tool result, its digest) so far, oldest first
+        self.used_tokens = 0
+        self.turns_since_collapse = DIGEST_MIN_TURNS  # The first collapse may come as soon as it's needed
+        self.collapses = 0
+
+    def mark_seen(self, results: list[dict]):
+        # Sources the agent was already handed (e.g. an evidence brief) count as seen
+        for result in results:
+            self.seen_urls.add(normalize_url(result["url"]))
+            self.seen_snippets.append(shingles(clean_snippet(result["content"])))
+
+    def fill(self, tool_result: dict, query: str, results: list[dict] | None, turn_size: int = 1) -> float | None:
+        """Set tool_result["content"] to the compacted form of `results` (None means the search timed out or failed).
+        Returns how much the results added to what the agent had already seen, from 0 (nothing:
+        known URLs, near-identical snippets) to 1, or None if there was nothing to judge."""
+        if results is None:
+            tool_result["content"] = "Search failed or timed out. Work with what you have."
+            return None
+
+        fresh, repeated = [], []
+        novelty = 0.0
+        for result in results:
+            url = normalize_url(result["url"])
+            snippet = clean_snippet(result["content"])
+            fingerprint = shingles(snippet)
+            overlap = 1.0 if url in self.seen_urls else max((similarity(fingerprint, seen) for seen in self.seen_snippets), default=0.0)
+            novelty += 1.0 - overlap
+            if overlap >= DUPLICATE_SIMILARITY:
+                repeated.append(result)
+                continue
+            self.seen_urls.add(url)
+            self.seen_snippets.append(fingerprint)
+            fresh.append({**result, "content": snippet})
+
+        # Snippets shrink as the history approaches its budget
+        remaining_chars = max(0, self.budget_tokens - self.used_tokens) * 4
+        per_result = remaining_chars // max(1, len(fresh) * turn_size) - 150  # Title/URL lines
+        snippet_chars = min(SNIPPET_CHARS, max(MIN_SNIPPET_CHARS, per_result))
+
+        if fresh:
+            content = format_results(fresh, snippet_chars=snippet_chars)
+            if repeated:
+                content += f"\n({len(repeated)} more result(s) already covered by earlier searches, omitted.)"
+        else:
+            content = "No new results — everything returned was already covered by earlier searches."
+
+        tool_result["content"] = content
+        self.used_tokens += estimate_tokens(content)
+        if fresh:
+            digest = f"[Earlier search] {query}: " + "; ".join(f"{r['title']} ({r['url']})" for r in fresh)
+            self.filled.append((tool_result, digest))
+        return novelty / len(results) if results else None
+
+    def make_room(self):
+        """With digests on and the history over budget, collapse the oldest tool results
+        into one-line digests down to DIGEST_TARGET of the budget. Call once per turn,
+        before filling its results. This deliberately rewrites the cached history (see
+        DIGESTS above), so it happens at most once every DIGEST_MIN_TURNS turns."""
+        self.turns_since_collapse += 1
+        if not self.digests or self.used_tokens <= self.budget_tokens or self.turns_since_collapse < DIGEST_MIN_TURNS:
+            return
+        for tool_result, digest in self.filled:
+            if self.used_tokens <= self.budget_tokens * DIGEST_TARGET:
+                break
+            if tool_result["content"] != digest:
+                self.used_tokens -= estimate_tokens(tool_result["content"]) - estimate_tokens(digest)
+                tool_result["content"] = digest
+        self.turns_since_collapse = 0
+        self.collapses += 1
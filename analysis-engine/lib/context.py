@@ -0,0 +1,40 @@
+# Per-job state that code deep inside the agent loops needs without threading
+# it through every call. arun_pipeline sets it once; every stage task and every
+# search inherits it through the asyncio context.
+import asyncio, os
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable
+from lib.batches import Batcher
+from lib.budget import Deadline
+from lib.evidence import EvidenceStore
+from lib.usage import UsageRecorder
+
+PARALLEL_SEARCH = os.getenv("PARALLEL_SEARCH", "0") == "1"
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "3"))
+
+
+@dataclass
+class JobContext:
+    product: str
+    owns: str | None = None
+    emit: Callable | None = None
+    parallel_search: bool = PARALLEL_SEARCH
+    # Caps in-flight searches for the whole job, across agents running side by side
+    search_slots: asyncio.Semaphore = field(default_factory=lambda: asyncio.Semaphore(SEARCH_CONCURRENCY))
+    deadline: Deadline = field(default_factory=Deadline)
+    evidence: EvidenceStore = field(default_factory=EvidenceStore)
+    usage: UsageRecorder = field(default_factory=UsageRecorder)
+    batcher: Batcher | None = None  # Set for bulk jobs: synthesis calls go through the batch path
+
+    def send(self, event: dict):
+        if self.emit:
+            self.emit(event)
+
+
+current_job: ContextVar[JobContext | None] = ContextVar("current_job", default=None)
+
+
+def parallel_search_enabled() -> bool:
+    job = current_job.get()
+    return job.parallel_search if job else PARALLEL_SEARCH
@@ -0,0 +1,191 @@
+# Job-scoped evidence store. Every search result found during a pipeline run
+# is indexed by URL and by the query that found it, so a later near-duplicate
+# query is answered without going back to Tavily, and one issued while a
+# matching search is still running waits for it. Later agents are also shown
+# what earlier agents already found before they spend a search.
+import asyncio, re
+from lib.canonical import parse, tokenize
+from lib.compaction import normalize_url
+from tools.cache import PRICE_TERMS, REVIEW_TERMS, normalize_query
+
+QUERY_SIMILARITY = 0.75
+STOPWORDS = {"a", "an", "the", "and", "or", "of", "for", "to", "in", "on", "with", "is", "are", "vs"}
+
+
+def fold(word: str) -> str:
+    # Crude plural folding: "reviews" and "review" should match
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+# Words that say what a search is after. Two queries only count as the same
+# search if they ask for the same of these: "price history" isn't "price".
+INTENT_TERMS = {fold(word) for word in (
+    PRICE_TERMS | REVIEW_TERMS | {
+        "history", "tracker", "reliability", "warranty", "return", "recall", "repair", "lifespan", "battery",
+        "teardown", "resale", "value", "refurbished", "used", "long", "term", "alternative", "cheaper",
+        "upgrade", "worth", "lawsuit", "safety", "failure",
+    }
+)}
+
+
+def query_terms(query: str) -> frozenset:
+    terms = set()
+    for word in normalize_query(query).split():
+        if word in STOPWORDS or re.fullmatch(r"20\d\d", word):  # Years rarely change what a search finds
+            continue
+        terms.add(fold(word))
+    return frozenset(terms)
+
+
+def term_similarity(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def identity(query: str, vocabulary: frozenset) -> frozenset:
+    """The words of `query` that say which product it's about: the products' own name
+    tokens, plus anything with a digit in it (model numbers, generations), years aside."""
+    return frozenset(
+        token for token in tokenize(query)
+        if (token in vocabulary or any(c.isdigit() for c in token)) and not re.fullmatch(r"(19|20)\d\d", token)
+    )
+
+
+def same_subject(query: str, product: str | None, other_query: str, other_product: str | None) -> bool:
+    # Competing products often differ only by a model number or a word ("iPhone 15" vs
+    # "iPhone 15 Pro"), so every identifying token must match exactly
+    vocabulary = frozenset(token for name in (product, other_product) if name for token in parse(name).tokens)
+    return identity(query, vocabulary) == identity(other_query, vocabulary)
+
+
+def same_search(a: frozenset, b: frozenset, threshold: float = QUERY_SIMILARITY) -> bool:
+    """Close enough in wording, and after the same thing."""
+    return a == b or (term_similarity(a, b) >= threshold and a & INTENT_TERMS == b & INTENT_TERMS)
+
+
+class EvidenceStore:
+    def __init__(self, similarity: float = QUERY_SIMILARITY, shared: "EvidenceStore | None" = None,
+                 product: str | None = None):
+        self.similarity = similarity
+        # Bulk and comparison jobs also look up and add to a store shared across
+        # products. Briefs only ever come from a job's own sources, and a shared
+        # entry is only used when the query names the same product (see same_subject).
+        self.shared = shared
+        self.product = product
+        self.origins: dict[frozenset, tuple[str, str | None]] = {}  # Terms -> (query, product) that added them
+        self.by_url: dict[str, dict] = {}
+        self.by_terms: dict[frozenset, list[dict]] = {}
+        self.in_flight: dict[frozenset, asyncio.Future] = {}  # Searches started but not yet added
+        self.agent_by_url: dict[str, str] = {}  # Which agent first found each source
+        self.hits = 0
+        self.shared_hits = 0
+        self.joined = 0
+        self.misses = 0
+
+    def _closest(self, terms: frozenset, table: dict, accept=None):
+        accept = accept or (lambda t: True)
+        if terms in table and accept(terms):
+            return table[terms]
+        candidates = [t for t in table if same_search(terms, t, self.similarity) and accept(t)]
+        best = max(candidates, key=lambda t: term_similarity(terms, t), default=None)
+        return table[best] if best is not None else None
+
+    def _shared_match(self, query: str):
+        """Accepts shared entries added for the same product as `query` is about."""
+        def accept(terms: frozenset) -> bool:
+            origin = self.shared.origins.get(terms)
+            return origin is not None and same_subject(query, self.product, *origin)
+        return accept
+
+    def lookup(self, query: str) -> list[dict] | None:
+        terms = query_terms(query)
+        results = self._closest(terms, self.by_terms)
+        if results is None and self.shared is not None:
+            results = self.shared._closest(terms, self.shared.by_terms, self._shared_match(query))
+            if results is not None:
+                self.shared_hits += 1
+                self.shared.hits += 1
+                # Counts as found by this job from here on
+                self.add(query, results, "shared", share=False)
+                return results
+        if results is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return results
+
+    def running(self, query: str) -> asyncio.Future | None:
+        """A search close enough to `query` that's still in flight, here or in the shared
+        store. Its future resolves to the results, or None if that search failed."""
+        terms = query_terms(query)
+        future = self._closest(terms, self.in_flight)
+        if future is None and self.shared is not None:
+            future = self.shared._closest(terms, self.shared.in_flight, self._shared_match(query))
+        if future is not None:
+            self.joined += 1
+        return future
+
+    def start(self, query: str):
+        terms = query_terms(query)
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[terms] = future
+        if self.shared is not None and terms not in self.shared.in_flight:
+            self.shared.in_flight[terms] = future
+            self.shared.origins[terms] = (query, self.product)
+
+    def _settle(self, terms: frozenset, results: list[dict] | None):
+        future = self.in_flight.pop(terms, None)
+        if future is not None and not future.done():
+            future.set_result(results)
+
+    def abandon(self, query: str):
+        """The search begun with start() failed or timed out; release anyone waiting on it."""
+        terms = query_terms(query)
+        self._settle(terms, None)
+        if self.shared is not None:
+            self.shared._settle(terms, None)
+
+    def add(self, query: str, results: list[dict], agent: str | None = None, share: bool = True,
+            product: str | None = None):
+        terms = query_terms(query)
+        self.by_terms[terms] = results
+        self.origins[terms] = (query, product or self.product)
+        for result in results:
+            url = normalize_url(result["url"])
+            self.by_url.setdefault(url, result)
+            self.agent_by_url.setdefault(url, agent or "unknown")
+        self._settle(terms, results)
+        if share and self.shared is not None:
+            self.shared.add(query, results, agent, product=self.product)
+
+    def adopt(self, other: "EvidenceStore", agent: str):
+        """Take on another store's sources as if `agent` had found them here, so they show up in briefs."""
+        for url, result in other.by_url.items():
+            self.by_url.setdefault(url, result)
+            self.agent_by_url.setdefault(url, agent)
+
+    def relevant(self, focus: str = "", exclude_agent: str | None = None, limit: int = 8) -> list[dict]:
+        """Sources found by other agents, most on-topic for `focus` first."""
+        focus_terms = query_terms(focus)
+        candidates = [
+            result for url, result in self.by_url.items()
+            if self.agent_by_url.get(url) != exclude_agent
+        ]
+
+        def score(result: dict) -> int:
+            return len(focus_terms & query_terms(f"{result['title']} {result['content']}"))
+
+        return sorted(candidates, key=score, reverse=True)[:limit]
+
+    @staticmethod
+    def brief(sources: list[dict]) -> str:
+        if not sources:
+            return ""
+        lines = [f"- {r['title']} ({r['url']}): {' '.join(r['content'].split())[:200]}" for r in sources]
+        return (
+            "\n\nSources other agents in this analysis already found. Use them before searching, "
+            "and don't search for them again:\n" + "\n".join(lines)
+        )
+
+    def stats(self) -> dict:
+        return {"sources": len(self.by_url), "queries": len(self.by_terms), "hits": self.hits,
+                "shared_hits": self.shared_hits, "joined": self.joined, "misses": self.misses}
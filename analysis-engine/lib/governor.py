@@ -0,0 +1,218 @@
+# Process-wide admission control for provider quotas. Every direct model call
+# and every search backend request reserves capacity here before it goes out
+# (each retry and each hedged duplicate takes its own reservation), so
+# concurrent jobs share the per-minute request and token limits instead of
+# all running into 429s and retrying together.
+#
+# Each provider or model ("anthropic:<model>", "search:<backend>", the same
+# names as lib/resilience.py) has a token bucket per quota dimension, refilled
+# continuously at its per-minute limit. A model call reserves one request,
+# its estimated uncached input and its full max_tokens of output; when the
+# response arrives the reservation is settled against the real usage, so
+# unused output goes straight back. Buckets hold only a few seconds of quota,
+# so load is spread evenly instead of bursting a minute's worth and stalling.
+# Waiting calls are served round-robin across jobs (one trace per job), so a
+# job with many agents in flight can't crowd out the others.
+import asyncio, json, os, time
+from collections import Counter, OrderedDict, deque
+from lib.tracing import current_span
+
+GOVERNOR = os.getenv("GOVERNOR", "1") == "1"
+GOVERNOR_BURST_SECONDS = float(os.getenv("GOVERNOR_BURST_SECONDS", "5"))  # Bucket depth, in seconds of quota
+
+# Per-minute quotas. Override or add with GOVERNOR_QUOTAS, e.g.
+#   GOVERNOR_QUOTAS='{"anthropic:claude-sonnet-4-6": {"requests": 50, "input_tokens": 30000, "output_tokens": 8000}}'
+# Names without a quota aren't limited.
+QUOTAS = {
+    "anthropic:claude-sonnet-4-6": {"requests": 4000, "input_tokens": 2_000_000, "output_tokens": 400_000},
+    "anthropic:claude-haiku-4-5": {"requests": 4000, "input_tokens": 4_000_000, "output_tokens": 800_000},
+    "search:tavily": {"requests": 1000},
+}
+QUOTAS.update(json.loads(os.getenv("GOVERNOR_QUOTAS") or "{}"))
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_seconds: float = GOVERNOR_BURST_SECONDS):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # A reservation bigger than the bucket waits for a full bucket rather than forever
+        self.refill()
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def adjust(self, amount: float):
+        """Take (positive) or give back (negative). Can go below zero when a call used
+        more than it reserved; later calls then wait until that is paid back."""
+        self.refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+class Ticket:
+    def __init__(self, owner: str, cost: dict[str, float]):
+        self.owner = owner
+        self.cost = cost
+        self.wakeup = asyncio.Event()
+
+
+class Limiter:
+    """The buckets for one provider or model, and the calls waiting on them."""
+
+    def __init__(self, name: str, quota: dict[str, float]):
+        self.name = name
+        self.buckets = {dimension: TokenBucket(limit) for dimension, limit in quota.items()}
+        self.queues: OrderedDict[str, deque[Ticket]] = OrderedDict()  # Owner -> its waiting calls, in turn order
+        self.input_ratio = 1.0  # Real uncached input over the estimate, learned from settled calls
+        self.counters = Counter()
+
+    def front(self) -> Ticket | None:
+        for queue in self.queues.values():
+            return queue[0]
+        return None
+
+    def _wake_front(self):
+        ticket = self.front()
+        if ticket is not None:
+            ticket.wakeup.set()
+
+    def _remove(self, ticket: Ticket):
+        queue = self.queues.get(ticket.owner)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self.queues[ticket.owner]
+
+    async def acquire(self, owner: str, cost: dict[str, float]):
+        ticket = Ticket(owner, {k: v for k, v in cost.items() if k in self.buckets})
+        self.queues.setdefault(owner, deque()).append(ticket)
+        queued_at = time.monotonic()
+        try:
+            while True:
+                wait = None  # Not at the front: sleep until whoever is wakes us
+                if self.front() is ticket:
+                    wait = max((self.buckets[k].wait_time(v) for k, v in ticket.cost.items()), default=0.0)
+                    if wait <= 0:
+                        break
+                ticket.wakeup.clear()
+                try:
+                    await asyncio.wait_for(ticket.wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._remove(ticket)
+            self._wake_front()
+            raise
+        for dimension, amount in ticket.cost.items():
+            self.buckets[dimension].adjust(amount)
+        # Served: this owner goes to the back of the rotation
+        self.queues[owner].popleft()
+        if self.queues[owner]:
+            self.queues.move_to_end(owner)
+        else:
+            del self.queues[owner]
+        self._wake_front()
+        waited = time.monotonic() - queued_at
+        self.counters["calls"] += 1
+        self.counters["waited"] += waited > 0.001
+        self.counters["wait_seconds"] += waited
+        return ticket.cost
+
+    def adjust(self, dimension: str, amount: float):
+        if dimension in self.buckets and amount:
+            self.buckets[dimension].adjust(amount)
+            if amount < 0:
+                self._wake_front()
+
+    def stats(self) -> dict:
+        for bucket in self.buckets.values():
+            bucket.refill()
+        calls = self.counters["calls"]
+        return {
+            "waiting": sum(len(queue) for queue in self.queues.values()),
+            "waiting_jobs": len(self.queues),
+            "in_flight": self.counters["in_flight"],
+            "calls": calls,
+            "waited": self.counters["waited"],
+            "avg_wait_seconds": round(self.counters["wait_seconds"] / calls, 3) if calls else 0.0,
+            "input_ratio": round(self.input_ratio, 3),
+            "buckets": {
+                dimension: {"per_minute": bucket.per_minute, "available": round(bucket.level), "capacity": round(bucket.capacity)}
+                for dimension, bucket in self.buckets.items()
+            },
+            **{k: round(v) for k, v in self.counters.items() if k.startswith(("reserved_", "used_"))},
+        }
+
+
+class Reservation:
+    def __init__(self, limiter: Limiter | None, cost: dict[str, float], estimated_input: float):
+        self.limiter = limiter
+        self.cost = cost
+        self.estimated_input = estimated_input
+        self.settled = False
+
+    def settle(self, input_tokens: int = 0, output_tokens: int = 0):
+        """Replace the reserved token counts with what the call really used."""
+        if self.settled:
+            return
+        self.settled = True
+        limiter = self.limiter
+        if limiter is None:
+            return
+        limiter.counters["in_flight"] -= 1
+        for dimension, used in (("input_tokens", input_tokens), ("output_tokens", output_tokens)):
+            if dimension in self.cost:
+                limiter.adjust(dimension, used - self.cost[dimension])
+                limiter.counters[f"reserved_{dimension}"] += self.cost[dimension]
+                limiter.counters[f"used_{dimension}"] += used
+        if self.estimated_input:
+            limiter.input_ratio = min(2.0, max(0.05, 0.8 * limiter.input_ratio + 0.2 * input_tokens / self.estimated_input))
+
+    def refund(self):
+        # The call failed before it used anything we can measure; the request itself still counted
+        if self.settled:
+            return
+        self.settled = True
+        if self.limiter is not None:
+            self.limiter.counters["in_flight"] -= 1
+            for dimension in ("input_tokens", "output_tokens"):
+                if dimension in self.cost:
+                    self.limiter.adjust(dimension, -self.cost[dimension])
+
+
+limiters: dict[str, Limiter] = {}
+
+
+def limiter(name: str) -> Limiter | None:
+    if not GOVERNOR or name not in QUOTAS:
+        return None
+    if name not in limiters:
+        limiters[name] = Limiter(name, QUOTAS[name])
+    return limiters[name]
+
+
+async def reserve(name: str, input_tokens: float = 0, output_tokens: float = 0) -> Reservation:
+    """Wait for capacity for one request to `name` and return its Reservation, to be
+    settled with the request's real usage or refunded if it failed. `input_tokens` is
+    an estimate, scaled by how far off earlier estimates for this model were (prompt
+    caching makes most input free)."""
+    limits = limiter(name)
+    if limits is None:
+        return Reservation(None, {}, 0)
+    span = current_span()
+    owner = span.trace_id if span else "default"
+    expected_input = input_tokens * limits.input_ratio
+    cost = await limits.acquire(owner, {"requests": 1, "input_tokens": expected_input, "output_tokens": output_tokens})
+    limits.counters["in_flight"] += 1
+    return Reservation(limits, cost, input_tokens)
+
+
+def stats() -> dict:
+    return {"enabled": GOVERNOR, "limits": {name: limits.stats() for name, limits in limiters.items()}}
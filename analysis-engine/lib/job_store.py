@@ -0,0 +1,271 @@
+# Shared job state for running the API as several processes or containers.
+# The worker that accepts a job runs it and keeps its event log in memory for
+# its own readers (lib/jobs.py); the store holds what other workers need:
+# which job is running each single-flight key, whether a job is still alive,
+# and a copy of every job's SSE frames so any worker can serve /stream.
+#
+#   JOB_STORE=memory   one process (default)
+#   JOB_STORE=redis    JOB_STORE_URL=redis://host:6379/0, shared by every worker
+#
+# The Redis store speaks RESP directly over asyncio streams and only uses
+# SET/GET/DEL/PEXPIRE and streams (XADD/XREAD), so any Redis-protocol server
+# will do; bench/redis_standin.py is one for offline runs.
+import asyncio, os
+from urllib.parse import urlsplit
+
+JOB_STORE = os.getenv("JOB_STORE", "memory")
+JOB_STORE_URL = os.getenv("JOB_STORE_URL", "redis://localhost:6379/0")
+JOB_STORE_PREFIX = os.getenv("JOB_STORE_PREFIX", "sibt:")
+# A running job's claim and liveness record expire this long after the last
+# heartbeat, so a crashed worker's jobs stop blocking their keys
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+READ_BATCH = 500
+
+
+class JobStore:
+    """Interface every store implements. Frames are (seq, SSE bytes), seq from 1."""
+
+    name = "base"
+    shared = True  # Whether other processes read from it, i.e. whether frames need copying in
+
+    async def claim(self, key: str, job_id: str) -> str:
+        """Record `job_id` as running `key` unless a live job already is; return the holder's id."""
+        raise NotImplementedError
+
+    async def release(self, key: str, job_id: str):
+        raise NotImplementedError
+
+    async def heartbeat(self, jobs: dict[str, str]):
+        """Extend the lease on these running jobs (job_id -> key)."""
+        raise NotImplementedError
+
+    async def append(self, job_id: str, frames: list[tuple[int, bytes]]):
+        raise NotImplementedError
+
+    async def finish(self, job_id: str, retention: float):
+        raise NotImplementedError
+
+    async def status(self, job_id: str) -> str | None:
+        """"running", "done", or None for a job no live worker knows."""
+        raise NotImplementedError
+
+    async def read(self, job_id: str, after: int, timeout: float) -> tuple[list[tuple[int, bytes]], bool]:
+        """Frames after `after`, waiting up to `timeout` for the first; and whether the log has ended."""
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class MemoryStore(JobStore):
+    """Single process: every job is local, so this only keeps claims."""
+
+    name = "memory"
+    shared = False
+
+    def __init__(self):
+        self.claims: dict[str, str] = {}
+
+    async def claim(self, key: str, job_id: str) -> str:
+        return self.claims.setdefault(key, job_id)
+
+    async def release(self, key: str, job_id: str):
+        if self.claims.get(key) == job_id:
+            del self.claims[key]
+
+    async def heartbeat(self, jobs: dict[str, str]):
+        pass
+
+    async def append(self, job_id: str, frames: list[tuple[int, bytes]]):
+        pass  # The local log is the only copy
+
+    async def finish(self, job_id: str, retention: float):
+        pass
+
+    async def status(self, job_id: str) -> str | None:
+        return None  # Not local means not anywhere
+
+    async def read(self, job_id: str, after: int, timeout: float) -> tuple[list[tuple[int, bytes]], bool]:
+        return [], True
+
+
+class RespError(Exception):
+    pass
+
+
+class RespConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @staticmethod
+    def encode(*args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(out)
+
+    async def reply(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = await self.reader.readexactly(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            size = int(rest)
+            return None if size < 0 else [await self.reply() for _ in range(size)]
+        raise RespError(f"unexpected reply {line!r}")
+
+    def close(self):
+        self.writer.close()
+
+
+class RespClient:
+    """Pooled RESP connections. Blocking reads hold a connection for their
+    duration, so the pool grows with concurrent remote readers."""
+
+    def __init__(self, url: str = JOB_STORE_URL, max_idle: int = 16):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.strip("/") or 0)
+        self.max_idle = max_idle
+        self.idle: list[RespConnection] = []
+
+    async def _connect(self) -> RespConnection:
+        connection = RespConnection(*await asyncio.open_connection(self.host, self.port))
+        setup = ([("AUTH", self.password)] if self.password else []) + ([("SELECT", self.db)] if self.db else [])
+        for args in setup:
+            connection.writer.write(connection.encode(*args))
+            await connection.reply()
+        return connection
+
+    async def execute(self, *args):
+        result = (await self.pipeline([args]))[0]
+        if isinstance(result, RespError):
+            raise result
+        return result
+
+    async def pipeline(self, commands: list[tuple]) -> list:
+        """Send several commands in one write and read their replies in order."""
+        connection = self.idle.pop() if self.idle else await self._connect()
+        try:
+            connection.writer.write(b"".join(connection.encode(*args) for args in commands))
+            await connection.writer.drain()
+            result = []
+            for _ in commands:
+                try:
+                    result.append(await connection.reply())
+                except RespError as e:
+                    result.append(e)
+        except BaseException:
+            connection.close()  # Mid-reply state is unknown; never reuse it
+            raise
+        if len(self.idle) < self.max_idle:
+            self.idle.append(connection)
+        else:
+            connection.close()
+        return result
+
+    async def aclose(self):
+        for connection in self.idle:
+            connection.close()
+        self.idle.clear()
+
+
+class RedisStore(JobStore):
+    """Keys: claim:<key> -> job id, job:<id> -> running|done, events:<id> a stream
+    with entry ids 0-<seq> and the frame in field "f"; an "end" field closes it."""
+
+    name = "redis"
+
+    def __init__(self, url: str = JOB_STORE_URL, prefix: str = JOB_STORE_PREFIX, lease: float = JOB_LEASE_SECONDS):
+        self.client = RespClient(url)
+        self.prefix = prefix
+        self.lease_ms = int(lease * 1000)
+
+    def _key(self, kind: str, name: str) -> str:
+        return f"{self.prefix}{kind}:{name}"
+
+    async def claim(self, key: str, job_id: str) -> str:
+        claim_key = self._key("claim", key)
+        if await self.client.execute("SET", claim_key, job_id, "NX", "PX", self.lease_ms):
+            await self.client.execute("SET", self._key("job", job_id), "running", "PX", self.lease_ms)
+            return job_id
+        holder = await self.client.execute("GET", claim_key)
+        if holder is None:  # Expired between the two calls
+            return await self.claim(key, job_id)
+        return holder.decode()
+
+    async def release(self, key: str, job_id: str):
+        # GET then DEL rather than a script: losing the race only lets a duplicate run
+        claim_key = self._key("claim", key)
+        if await self.client.execute("GET", claim_key) == job_id.encode():
+            await self.client.execute("DEL", claim_key)
+
+    async def heartbeat(self, jobs: dict[str, str]):
+        commands = []
+        for job_id, key in jobs.items():
+            commands += [("PEXPIRE", self._key(kind, name), self.lease_ms)
+                         for kind, name in (("job", job_id), ("events", job_id), ("claim", key))]
+        if commands:
+            await self.client.pipeline(commands)
+
+    async def append(self, job_id: str, frames: list[tuple[int, bytes]]):
+        stream = self._key("events", job_id)
+        replies = await self.client.pipeline(
+            [("XADD", stream, f"0-{seq}", "f", frame) for seq, frame in frames] + [("PEXPIRE", stream, self.lease_ms)]
+        )
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+
+    async def finish(self, job_id: str, retention: float):
+        stream, retention_ms = self._key("events", job_id), int(retention * 1000)
+        await self.client.pipeline([
+            ("XADD", stream, "*", "end", "1"),
+            ("PEXPIRE", stream, retention_ms),
+            ("SET", self._key("job", job_id), "done", "PX", retention_ms),
+        ])
+
+    async def status(self, job_id: str) -> str | None:
+        value = await self.client.execute("GET", self._key("job", job_id))
+        return value.decode() if value is not None else None
+
+    async def read(self, job_id: str, after: int, timeout: float) -> tuple[list[tuple[int, bytes]], bool]:
+        reply = await self.client.execute(
+            "XREAD", "COUNT", READ_BATCH, "BLOCK", max(1, int(timeout * 1000)),
+            "STREAMS", self._key("events", job_id), f"0-{after}",
+        )
+        frames, ended = [], False
+        for _, entries in reply or []:
+            for entry_id, fields in entries:
+                values = dict(zip(fields[::2], fields[1::2]))
+                if b"end" in values:
+                    ended = True
+                    break
+                frames.append((int(entry_id.split(b"-")[1]), values[b"f"]))
+        return frames, ended
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+STORES = {"memory": MemoryStore, "redis": RedisStore}
+
+
+def store_from_env() -> JobStore:
+    return STORES[JOB_STORE]()
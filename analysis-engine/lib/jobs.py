@@ -0,0 +1,253 @@
+# Job registry. Every job keeps an append-only log of the events it has
+# emitted, numbered from 1, so any number of /stream readers can attach or
+# reconnect at any point and resume after the last event they saw. Identical
+# in-flight /analyze requests share a job. With a shared JobStore (see
+# lib/job_store.py) that holds across workers: any worker can run a job, and
+# any worker can stream it.
+#
+# Each event is serialized to its SSE frame once, when it is appended; every
+# subscriber reads the same bytes through its own cursor, so the producer never
+# waits on a reader. A subscriber that falls too far behind skips
+# analysis_delta frames (the agent's "analysis" event carries the full text
+# anyway), and one that has stopped reading altogether is disconnected.
+import asyncio, json, os, time
+from lib.canonical import canonical_key
+from lib.job_store import JOB_LEASE_SECONDS, JobStore, MemoryStore
+
+STREAM_MAX_LAG = int(os.getenv("STREAM_MAX_LAG", "64"))  # Frames behind before deltas are skipped
+# A subscriber this far behind that hasn't taken a frame for this long is dropped
+STREAM_DROP_LAG = int(os.getenv("STREAM_DROP_LAG", "256"))
+STREAM_DROP_SECONDS = float(os.getenv("STREAM_DROP_SECONDS", "30"))
+KEEPALIVE_FRAME = b": keepalive\n\n"
+LOST_FRAME = f"data: {json.dumps({'type': 'error', 'message': 'The server running this analysis went away. Try again.'})}\n\n".encode()
+
+counters = {"subscribers": 0, "remote_subscribers": 0, "frames": 0, "skipped": 0, "dropped": 0}  # Process-wide, served by /metrics
+
+
+def job_key(product: str, owns: str | None) -> tuple:
+    # Canonical names, so "Sony WH-1000XM5 Headphones" and "sony wh1000xm5" share a job
+    return (canonical_key(product), canonical_key(owns) if owns else None)
+
+
+def comparison_key(products: list[str], owns: str | None) -> tuple:
+    return ("compare", tuple(sorted({canonical_key(p) for p in products})), canonical_key(owns) if owns else None)
+
+
+class Subscriber:
+    def __init__(self, cursor: int):
+        self.cursor = cursor                  # Sequence number of the last frame taken
+        self.task = asyncio.current_task()    # The response streaming to this reader, cancelled to drop it
+        self.last_read = time.monotonic()
+        self.skipping: set[str] = set()       # Agents whose remaining deltas this reader won't get
+
+
+class Job:
+    def __init__(self, job_id: str, key: tuple | None = None):
+        self.id = job_id
+        self.key = key
+        self.events: list[dict] = []
+        self.frames: list[bytes] = []
+        self.subscribers: set[Subscriber] = set()
+        self.forward = None  # Set when frames are also copied to a shared store
+        self.done = False
+        self._waiter = asyncio.Event()
+
+    def append(self, event: dict | None):
+        """Record an event (None marks the end of the job). Must run on the loop thread."""
+        if event is None:
+            self.done = True
+        else:
+            self.events.append(event)
+            self.frames.append(f"id: {len(self.events)}\ndata: {json.dumps(event)}\n\n".encode())
+            counters["frames"] += 1
+            if self.forward:
+                self.forward(len(self.frames), self.frames[-1])
+            self._drop_stalled()
+        # Wake everyone currently waiting, then arm a fresh event for the next round
+        self._waiter.set()
+        self._waiter = asyncio.Event()
+
+    def _drop_stalled(self):
+        now = time.monotonic()
+        for subscriber in list(self.subscribers):
+            if (len(self.frames) - subscriber.cursor > STREAM_DROP_LAG
+                    and now - subscriber.last_read > STREAM_DROP_SECONDS and subscriber.task is not None):
+                print(f"[Stream] Dropping a stalled reader of {self.id} at {subscriber.cursor}/{len(self.frames)}")
+                # Counted out here: the cancelled generator's finally may not run until it's collected
+                self.subscribers.discard(subscriber)
+                counters["subscribers"] -= 1
+                counters["dropped"] += 1
+                subscriber.task.cancel()
+
+    def _skip(self, subscriber: Subscriber, seq: int) -> bool:
+        event = self.events[seq - 1]
+        agent = event.get("agent")
+        if event["type"] == "analysis_delta":
+            if agent in subscriber.skipping or len(self.frames) - seq >= STREAM_MAX_LAG:
+                # Once one delta is skipped the rest would be a fragment; wait for the full text
+                subscriber.skipping.add(agent)
+                return True
+        elif event["type"] in ("analysis", "analysis_reset"):
+            subscriber.skipping.discard(agent)
+        return False
+
+    async def subscribe(self, after: int = 0, keepalive: float = 15.0):
+        """Yield (seq, SSE frame) for every event after sequence number `after`, then
+        live ones until the job ends, skipping deltas while this reader lags.
+        Yields (None, KEEPALIVE_FRAME) when nothing arrived within `keepalive` seconds."""
+        subscriber = Subscriber(max(0, after))
+        self.subscribers.add(subscriber)
+        counters["subscribers"] += 1
+        try:
+            while True:
+                while subscriber.cursor < len(self.frames):
+                    subscriber.cursor += 1
+                    if self._skip(subscriber, subscriber.cursor):
+                        counters["skipped"] += 1
+                        continue
+                    yield subscriber.cursor, self.frames[subscriber.cursor - 1]
+                    subscriber.last_read = time.monotonic()
+                if self.done:
+                    return
+                try:
+                    await asyncio.wait_for(self._waiter.wait(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None, KEEPALIVE_FRAME
+                    subscriber.last_read = time.monotonic()
+        finally:
+            if subscriber in self.subscribers:  # Not already dropped
+                self.subscribers.discard(subscriber)
+                counters["subscribers"] -= 1
+
+
+class StoreWriter:
+    """Copies one job's frames into a shared store, in order, off the emit path."""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+        self.pending: list[tuple[int, bytes]] = []
+        self.wakeup = asyncio.Event()
+        self.closing = False
+        self.task = asyncio.create_task(self._run())
+
+    def push(self, seq: int, frame: bytes):
+        self.pending.append((seq, frame))
+        self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            batch, self.pending = self.pending, []
+            if batch:
+                try:
+                    await self.store.append(self.job_id, batch)
+                except Exception as e:
+                    # Local readers still get everything; only other workers' readers miss these
+                    print(f"[Jobs] Store write failed for {self.job_id}: {e}")
+            if self.closing and not self.pending:
+                return
+
+    async def close(self):
+        self.closing = True
+        self.wakeup.set()
+        await self.task
+
+
+class JobRegistry:
+    """Jobs this worker runs, plus a JobStore shared with the other workers for
+    single-flight claims and for streaming jobs that run elsewhere."""
+
+    def __init__(self, retention: float = 900.0, store: JobStore | None = None):
+        self.retention = retention  # How long a finished job's log stays readable
+        self.store = store or MemoryStore()
+        self.jobs: dict[str, Job] = {}
+        self.writers: dict[str, StoreWriter] = {}
+        self.heartbeat: asyncio.Task | None = None
+
+    @staticmethod
+    def _claim_key(key: tuple) -> str:
+        return json.dumps(key)
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    async def open(self, job_id: str, key: tuple) -> tuple[Job | None, str]:
+        """Create a job here, or if one with the same key is already running on any
+        worker, return (None, its id) so the caller can share it."""
+        holder = await self.store.claim(self._claim_key(key), job_id)
+        if holder != job_id:
+            return None, holder
+        job = Job(job_id, key)
+        self.jobs[job_id] = job
+        if self.store.shared:
+            writer = self.writers[job_id] = StoreWriter(self.store, job_id)
+            job.forward = writer.push
+            if self.heartbeat is None:
+                self.heartbeat = asyncio.create_task(self._heartbeat())
+        return job, job_id
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            running = {job.id: self._claim_key(job.key) for job in self.jobs.values() if not job.done}
+            try:
+                await self.store.heartbeat(running)
+            except Exception as e:
+                print(f"[Jobs] Heartbeat failed: {e}")
+
+    async def _release(self, job: Job):
+        await self.store.release(self._claim_key(job.key), job.id)
+
+    async def discard(self, job: Job):
+        # For jobs that were never admitted
+        self.jobs.pop(job.id, None)
+        writer = self.writers.pop(job.id, None)
+        if writer:
+            writer.task.cancel()
+        await self._release(job)
+
+    async def finish(self, job: Job):
+        job.append(None)
+        await self._release(job)
+        writer = self.writers.pop(job.id, None)
+        if writer:
+            await writer.close()
+            await self.store.finish(job.id, self.retention)
+        asyncio.get_running_loop().call_later(self.retention, self.jobs.pop, job.id, None)
+
+    async def stream(self, job_id: str, after: int = 0, keepalive: float = 15.0):
+        """(seq, frame) pairs for a job running on this worker or any other, as
+        Job.subscribe yields them; None if no worker knows the job."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.subscribe(after, keepalive)
+        if await self.store.status(job_id) is None:
+            return None
+        return self._remote(job_id, after, keepalive)
+
+    async def _remote(self, job_id: str, after: int, keepalive: float):
+        counters["remote_subscribers"] += 1
+        try:
+            while True:
+                frames, ended = await self.store.read(job_id, after, keepalive)
+                for after, frame in frames:
+                    yield after, frame
+                if ended:
+                    return
+                if not frames:
+                    if await self.store.status(job_id) is None:
+                        # Its worker stopped renewing the lease: crashed or restarted mid-job
+                        yield None, LOST_FRAME
+                        return
+                    yield None, KEEPALIVE_FRAME
+        finally:
+            counters["remote_subscribers"] -= 1
+
+    async def aclose(self):
+        if self.heartbeat:
+            self.heartbeat.cancel()
+        for writer in list(self.writers.values()):
+            writer.task.cancel()
+        await self.store.aclose()
@@ -0,0 +1,105 @@
+# Every model call in the engine goes through create() or stream() so its
+# usage and latency are recorded against the agent, turn and job that made it,
+# and so jobs with a batcher can send synthesis calls through the batch path.
+# Direct calls get retries, timeouts and a circuit breaker per model from
+# lib/resilience.py, and each attempt reserves its own quota with lib/governor.py.
+import json, time
+from contextlib import AsyncExitStack, asynccontextmanager
+import lib.client
+from lib import governor, resilience
+from lib.compaction import estimate_tokens
+from lib.batches import BATCHED_AGENTS
+from lib.context import current_job
+from lib.tracing import span
+from lib.usage import UsageRecorder, totals
+
+
+def input_estimate(kwargs: dict) -> int:
+    return estimate_tokens(json.dumps([kwargs.get("system"), kwargs.get("tools"), kwargs["messages"]], default=str))
+
+
+def usage_for_quota(usage) -> dict:
+    # Cache reads don't count against input-tokens-per-minute; cache writes do
+    return {
+        "input_tokens": (usage.input_tokens or 0) + (getattr(usage, "cache_creation_input_tokens", None) or 0),
+        "output_tokens": usage.output_tokens or 0,
+    }
+
+
+def record(agent: str, model: str, usage, latency: float, trace_span=None):
+    job = current_job.get()
+    if job is not None:
+        call = job.usage.record(agent, model, usage, latency)
+    else:
+        # CLI runs of a single agent have no job; still count them process-wide
+        call = UsageRecorder().record(agent, model, usage, latency)
+    totals.add(call)
+    if trace_span is not None:
+        trace_span.set(
+            turn=call.turn,
+            input_tokens=call.input_tokens,
+            output_tokens=call.output_tokens,
+            cache_read_input_tokens=call.cache_read_input_tokens,
+            cache_creation_input_tokens=call.cache_creation_input_tokens,
+            cache_hit=call.cache_read_input_tokens > 0,
+        )
+    return call
+
+
+async def create(agent: str, **kwargs):
+    job = current_job.get()
+    batched = job is not None and job.batcher is not None and agent in BATCHED_AGENTS
+    with span("llm", agent=agent, model=kwargs["model"], streamed=False, batched=batched) as trace_span:
+        started = time.monotonic()
+        if batched:
+            # Non-interactive jobs trade latency for the batch discount
+            response = await job.batcher.create(**kwargs)
+        else:
+            name = f"anthropic:{kwargs['model']}"
+            estimate = input_estimate(kwargs)
+
+            async def attempt(reservation):
+                response = await lib.client.async_client.messages.create(**kwargs)
+                reservation.settle(**usage_for_quota(response.usage))
+                return response
+
+            response = await resilience.call(
+                name,
+                attempt,
+                timeout=resilience.LLM_TIMEOUT_SECONDS,
+                deadline=job.deadline if job else None,
+                reserve=lambda: governor.reserve(name, estimate, kwargs["max_tokens"]),
+            )
+        record(agent, kwargs["model"], response.usage, time.monotonic() - started, trace_span)
+        trace_span.set(stop_reason=response.stop_reason)
+    return response
+
+
+@asynccontextmanager
+async def stream(agent: str, **kwargs):
+    job = current_job.get()
+    with span("llm", agent=agent, model=kwargs["model"], streamed=True) as trace_span:
+        started = time.monotonic()
+        name = f"anthropic:{kwargs['model']}"
+        estimate = input_estimate(kwargs)
+        async with AsyncExitStack() as stack:
+
+            async def attempt(reservation):
+                opened = await stack.enter_async_context(lib.client.async_client.messages.stream(**kwargs))
+                return opened, reservation
+
+            # Only opening the stream is retried: once text has reached the client it can't be taken back.
+            # The winning attempt's reservation is held until the stream ends.
+            message_stream, reservation = await resilience.call(
+                name,
+                attempt,
+                timeout=resilience.LLM_TIMEOUT_SECONDS,
+                deadline=job.deadline if job else None,
+                reserve=lambda: governor.reserve(name, estimate, kwargs["max_tokens"]),
+            )
+            stack.callback(reservation.refund)  # If the stream fails partway; a no-op once settled
+            yield message_stream
+            response = await message_stream.get_final_message()
+            reservation.settle(**usage_for_quota(response.usage))
+        record(agent, kwargs["model"], response.usage, time.monotonic() - started, trace_span)
+        trace_span.set(stop_reason=response.stop_reason)
@@ -0,0 +1,41 @@
+# Early stopping for the search loops. Each search's novelty (how much of it
+# the agent hadn't already seen, by URL and snippet overlap; see
+# Compactor.fill) is fed in as it lands. Once the last few searches in a row
+# added little, further searching is unlikely to change the analysis, so the
+# agent is told to write instead of spending the rest of its search budget.
+import os
+from collections import Counter
+
+NOVELTY_THRESHOLD = float(os.getenv("NOVELTY_THRESHOLD", "0.3"))  # Below this a search added little
+NOVELTY_WINDOW = int(os.getenv("NOVELTY_WINDOW", "2"))            # Consecutive low searches before stopping
+NOVELTY_MIN_SEARCHES = int(os.getenv("NOVELTY_MIN_SEARCHES", "3"))  # Never stop on novelty before this many
+
+# Why each agent run stopped searching, process-wide, served by /metrics:
+# done (the agent decided), low_novelty, search_limit, time_budget
+stop_reasons = Counter()
+
+
+class NoveltyMonitor:
+    def __init__(self, threshold: float = NOVELTY_THRESHOLD, window: int = NOVELTY_WINDOW,
+                 min_searches: int = NOVELTY_MIN_SEARCHES):
+        self.threshold = threshold
+        self.window = window
+        self.min_searches = min_searches
+        self.scores: list[float] = []
+
+    def observe(self, novelty: float | None):
+        if novelty is not None:  # A timed-out search says nothing either way
+            self.scores.append(novelty)
+
+    def exhausted(self) -> bool:
+        recent = self.scores[-self.window:]
+        return (len(self.scores) >= self.min_searches and len(recent) == self.window
+                and all(score < self.threshold for score in recent))
+
+    def summary(self) -> list[float]:
+        return [round(score, 2) for score in self.scores]
+
+
+def record_stop(agent: str, reason: str):
+    stop_reasons[reason] += 1
+    stop_reasons[f"{agent}:{reason}"] += 1
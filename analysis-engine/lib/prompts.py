@@ -0,0 +1,50 @@
+# Prompt assembly for prompt caching. A request's cacheable prefix is its
+# tools, then its system blocks, then its messages, and a cache read needs
+# that prefix to be byte-identical. So every agent lays its prompt out from
+# most to least stable:
+#
+#   tools + instructions   same for every job of an agent     <- breakpoint
+#   today's date           same for every job that day
+#   owner context          same for every job for that user
+#   upstream analyses      this job only                      <- breakpoint (multi-turn agents)
+#
+# Nothing that varies by job (product, date, owns) may go in the instructions.
+import json
+from datetime import date
+
+EPHEMERAL = {"type": "ephemeral"}
+# Shortest prefix the API will cache, by model family; shorter ones are silently billed in full.
+# No static prefix here reaches Haiku's, so routed planner turns only cache within a job (lib/routing.py)
+MIN_CACHEABLE_TOKENS = {"sonnet": 1024, "haiku": 4096}
+
+
+def today() -> str:
+    return f"Today's date is {date.today().strftime('%B %d, %Y')}."
+
+
+def system(static: str, *dynamic: str, cache_dynamic: bool = False) -> list[dict]:
+    """System blocks for one call: the agent's fixed instructions with a cache
+    breakpoint, then the date and each non-empty piece of job context, in the
+    order given. Multi-turn agents set `cache_dynamic` so the turn after the
+    first reads the job context instead of writing it again."""
+    tail = {"type": "text", "text": "\n\n".join(part.strip() for part in (today(), *dynamic) if part and part.strip())}
+    if cache_dynamic:
+        tail["cache_control"] = EPHEMERAL
+    return [{"type": "text", "text": static, "cache_control": EPHEMERAL}, tail]
+
+
+def section(title: str, text: str | None, missing: str = "No analysis available.") -> str:
+    return f"{title}\n---\n{text or missing}\n---"
+
+
+def cached_prefix(request: dict) -> str:
+    """The part of a request every job of the same agent must share: the model,
+    the tools and the system blocks up to the first breakpoint, serialized."""
+    system_blocks = request.get("system") or []
+    if isinstance(system_blocks, str):
+        static = [{"type": "text", "text": system_blocks}]
+    else:
+        ends = [i for i, block in enumerate(system_blocks) if block.get("cache_control")]
+        static = system_blocks[:ends[0] + 1] if ends else []
+    return json.dumps({"model": request["model"], "tools": request.get("tools", []), "system": static}, sort_keys=True)
+
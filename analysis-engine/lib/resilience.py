@@ -0,0 +1,250 @@
+# Retries, timeouts, hedging and circuit breaking for calls to Anthropic and
+# the search backend. Every model call and every search goes through call():
+#
+#   - each attempt gets a timeout, and transient failures (connection errors,
+#     timeouts, 408/409/429, 5xx including 529 overloaded) are retried a few
+#     times with jittered exponential backoff, never past the job's deadline
+#     (searches are bounded by their stage's search timeout instead)
+#   - a search still running at the provider's recent p95 gets a duplicate
+#     request, and whichever answers first wins
+#   - with a `reserve`, every attempt and every duplicate takes its own quota
+#     reservation from lib/governor.py; its timeout starts once it has one
+#   - a provider that keeps failing opens its circuit: calls fail at once with
+#     CircuitOpen until a cooldown passes and one probe call gets through.
+#     Callers degrade where they can (a search is skipped, the planner model
+#     hands its turns to the writer) and fail fast where they can't.
+import asyncio, os, random, time
+from collections import Counter, deque
+import anthropic, httpx
+from lib.budget import Deadline
+
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))  # Tries per call, including the first
+RETRY_BASE_SECONDS = float(os.getenv("RETRY_BASE_SECONDS", "0.5"))
+RETRY_MAX_SECONDS = float(os.getenv("RETRY_MAX_SECONDS", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))  # Streamed calls: until the response starts
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "15"))
+HEDGE_SEARCHES = os.getenv("HEDGE_SEARCHES", "1") == "1"
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 20  # Latencies seen before hedging starts
+HEDGE_MIN_SECONDS = 0.2
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))  # Consecutive failures that open a circuit
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+
+counters = Counter()  # Process-wide, served by /metrics
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} is failing; not calling it for another {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def status_of(error: BaseException) -> int | None:
+    status = getattr(error, "status_code", None)  # anthropic.APIStatusError
+    if status is None and isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+    return status
+
+
+def retryable(error: BaseException) -> bool:
+    """Whether a failure is the provider's transient trouble rather than a bad request."""
+    if isinstance(error, (asyncio.TimeoutError, anthropic.APIConnectionError, httpx.TransportError)):
+        return True
+    status = status_of(error)
+    return status is not None and (status in (408, 409, 429) or status >= 500)
+
+
+def degradable(error: BaseException) -> bool:
+    """Whether a caller that can do without the result should carry on: the provider
+    is down or kept failing through the retries."""
+    return isinstance(error, CircuitOpen) or retryable(error)
+
+
+def backoff(attempt: int, error: BaseException) -> float:
+    # Full jitter, so jobs that failed together don't retry together
+    delay = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after and retry_after.replace(".", "", 1).isdigit():
+        delay = max(delay, min(float(retry_after), RETRY_MAX_SECONDS))
+    return delay
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.name = name
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.state = "closed"  # closed, open, or half_open while one probe call runs
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def is_open(self) -> bool:
+        return self.state == "half_open" or (self.state == "open" and self.retry_in() > 0)
+
+    def check(self):
+        """Raise CircuitOpen unless a call may go ahead. Past the cooldown, the
+        first caller becomes the probe and everyone else keeps failing fast."""
+        if self.state == "closed":
+            return
+        if self.state == "open" and self.retry_in() <= 0:
+            self.state = "half_open"
+            return
+        counters["fast_failures"] += 1
+        raise CircuitOpen(self.name, self.retry_in())
+
+    def success(self):
+        if self.state != "closed":
+            print(f"[Resilience] {self.name} recovered, circuit closed")
+        self.state, self.failures = "closed", 0
+
+    def failure(self):
+        self.failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+            if self.state == "closed":
+                counters["circuits_opened"] += 1
+            print(f"[Resilience] {self.name} failing ({self.failures} in a row), circuit open for {self.cooldown:.0f}s")
+            self.state, self.opened_at = "open", time.monotonic()
+
+    def abandon(self):
+        # The probe was cancelled before it could tell us anything; let the next caller probe
+        if self.state == "half_open":
+            self.state, self.opened_at = "open", time.monotonic() - self.cooldown
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def hedge_after(self) -> float | None:
+        """Seconds after which an attempt is slower than HEDGE_QUANTILE of recent ones."""
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return max(HEDGE_MIN_SECONDS, ordered[min(int(len(ordered) * HEDGE_QUANTILE), len(ordered) - 1)])
+
+
+breakers: dict[str, CircuitBreaker] = {}
+latencies: dict[str, LatencyWindow] = {}
+
+
+def breaker(name: str) -> CircuitBreaker:
+    if name not in breakers:
+        breakers[name] = CircuitBreaker(name)
+    return breakers[name]
+
+
+def is_open(name: str) -> bool:
+    return name in breakers and breakers[name].is_open()
+
+
+async def attempt_once(attempt, timeout: float, reserve=None, window: LatencyWindow | None = None,
+                       sent: asyncio.Event | None = None):
+    """One try of attempt() under `timeout`. With `reserve`, it first waits for a quota
+    reservation of its own (not counted against the timeout) and attempt(reservation)
+    settles it; a try that fails or is cancelled has its reservation refunded."""
+    reservation = await reserve() if reserve else None
+    if sent is not None:
+        sent.set()
+    started = time.monotonic()
+    try:
+        result = await asyncio.wait_for(attempt(reservation) if reserve else attempt(), timeout)
+    except BaseException:
+        if reservation is not None:
+            reservation.refund()
+        raise
+    if window is not None:
+        window.add(time.monotonic() - started)
+    return result
+
+
+async def hedged(attempt, timeout: float, delay: float | None, reserve=None, window: LatencyWindow | None = None):
+    """Run attempt(); if it hasn't finished `delay` seconds after it went out, start a
+    second copy and take whichever succeeds first."""
+    sent = asyncio.Event()
+    tasks = [asyncio.ensure_future(attempt_once(attempt, timeout, reserve, window, sent))]
+    waiter = asyncio.ensure_future(sent.wait())
+    try:
+        if delay is not None and delay < timeout:
+            # Time spent queued for quota isn't slowness; start the clock once the request is out
+            await asyncio.wait([tasks[0], waiter], return_when=asyncio.FIRST_COMPLETED)
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                counters["hedges"] += 1
+                tasks.append(asyncio.ensure_future(attempt_once(attempt, timeout - delay, reserve, window)))
+        error = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not tasks[0]:
+                        counters["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        waiter.cancel()
+        for task in tasks:
+            if task.done() and not task.cancelled():
+                task.exception()  # A losing attempt's error has been dealt with
+            task.cancel()
+
+
+async def call(name: str, attempt, timeout: float, attempts: int = RETRY_ATTEMPTS, hedge: bool = False,
+               deadline: Deadline | None = None, reserve=None):
+    """Await attempt() (a fresh awaitable per call) with the timeout, retries and
+    circuit breaker for provider `name`; with `hedge`, duplicate slow attempts.
+    No retry is started that would wait past `deadline`. With `reserve` (an async
+    callable returning a governor Reservation), each try and each duplicate awaits
+    one and is called as attempt(reservation), which settles it on success."""
+    circuit = breaker(name)
+    window = latencies.setdefault(name, LatencyWindow())
+    for tries in range(1, attempts + 1):
+        circuit.check()
+        try:
+            if hedge and HEDGE_SEARCHES:
+                result = await hedged(attempt, timeout, window.hedge_after(), reserve, window)
+            else:
+                result = await attempt_once(attempt, timeout, reserve, window)
+        except asyncio.CancelledError:
+            circuit.abandon()
+            raise
+        except Exception as e:
+            if not retryable(e):
+                circuit.success()  # It answered; the request was the problem
+                raise
+            circuit.failure()
+            counters["failures"] += 1
+            delay = backoff(tries - 1, e)
+            if tries == attempts or circuit.is_open() or (deadline is not None and deadline.remaining() < delay):
+                raise
+            counters["retries"] += 1
+            print(f"[Resilience] {name}: {describe(e)}, retry {tries}/{attempts - 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        else:
+            circuit.success()
+            return result
+
+
+def describe(error: BaseException) -> str:
+    status = status_of(error)
+    if status is not None:
+        return f"HTTP {status}"
+    return type(error).__name__ if not str(error) else f"{type(error).__name__}: {error}"
+
+
+def stats() -> dict:
+    hedge_after = {name: round(after, 3) for name, window in latencies.items() if (after := window.hedge_after())}
+    return {
+        **counters,
+        "circuits": {name: b.state for name, b in breakers.items()},
+        "hedge_after_seconds": hedge_after,
+    }
@@ -0,0 +1,130 @@
+# Per-turn model routing for the research loop. Turns that only decide the
+# next search go to a fast planner model; the write-up goes to the strong
+# writer model. After each planner turn a list of checks looks for signs it
+# went wrong (cut off, a malformed or repeated search, stopping before it
+# searched) and, if one fires, the turn is rerun on the writer. An agent that
+# keeps needing that stays on the writer for the rest of its run. While the
+# planner model's circuit is open (lib/resilience.py) every turn goes to the writer.
+#
+# Prompt caching tradeoff: Haiku only caches prefixes of 4096+ tokens
+# (lib/prompts.py), and every agent's static instructions are far shorter,
+# so planner turns never read the instructions cached by another job. Within
+# a job a planner turn reads the previous turn's prefix once the conversation
+# passes the minimum: from the first turn for agents handed upstream analyses
+# (Skeptic, Economist), after a few searches for the Advocate, and rarely in
+# the Category agent's short runs. Caches are per model, so the writer's
+# first turn writes the whole conversation again. Padding the instructions up
+# to the minimum wouldn't pay: a cache read of 4096 tokens bills about what
+# ~400 uncached ones do. bench/prompt_cache.py reports how many planner turns
+# reach the minimum; MODEL_ROUTING=0 keeps every turn on the writer.
+import os
+from collections import Counter
+from lib import resilience
+from tools.cache import normalize_query
+
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "1") == "1"
+PLANNER_MODEL = os.getenv("PLANNER_MODEL", "claude-haiku-4-5")
+WRITER_MODEL = os.getenv("WRITER_MODEL", "claude-sonnet-4-6")
+PLANNER_MAX_TOKENS = int(os.getenv("PLANNER_MAX_TOKENS", "1024"))  # A thought and a tool call; more means it's writing
+MAX_ESCALATIONS = int(os.getenv("ROUTING_MAX_ESCALATIONS", "2"))   # Then the agent stays on the writer
+
+
+# Offered to the planner only, so it can hand over without writing the analysis itself
+DONE_TOOL = {
+    "name": "done_researching",
+    "description": "Call this, with no other tool calls, once you have enough sourced evidence. A separate writer will produce the final analysis from your research; do not write it yourself.",
+    "input_schema": {"type": "object", "properties": {}},
+}
+
+
+def truncated(response, searched: set) -> str | None:
+    if response.stop_reason == "max_tokens":
+        return "truncated"
+
+
+def unexpected_stop(response, searched: set) -> str | None:
+    if response.stop_reason not in ("tool_use", "end_turn", "max_tokens"):
+        return "unexpected_stop"
+
+
+def malformed_search(response, searched: set) -> str | None:
+    for block in response.content:
+        if block.type != "tool_use" or block.name == DONE_TOOL["name"]:
+            continue
+        if block.name != "search" or not str(block.input.get("query") or "").strip():
+            return "malformed_search"
+
+
+def repeated_search(response, searched: set) -> str | None:
+    queries = [block.input.get("query") for block in response.content if block.type == "tool_use" and block.name == "search"]
+    if queries and all(normalize_query(str(q)) in searched for q in queries):
+        return "repeated_search"
+
+
+def finished_without_searching(response, searched: set) -> str | None:
+    if finished(response) and not searched:
+        return "finished_without_searching"
+
+
+def finished(response) -> bool:
+    """Whether the planner considers the research done: it called done_researching, or wrote anyway."""
+    return response.stop_reason == "end_turn" or any(
+        block.type == "tool_use" and block.name == DONE_TOOL["name"] for block in response.content
+    )
+
+
+# Run in order after every planner turn; the first reason returned escalates it
+CHECKS = [truncated, unexpected_stop, malformed_search, repeated_search, finished_without_searching]
+
+counters = Counter()  # Process-wide, served by /metrics
+
+
+class Router:
+    def __init__(self, agent: str, enabled: bool = MODEL_ROUTING, planner: str = PLANNER_MODEL,
+                 writer: str = WRITER_MODEL, checks: list = CHECKS, max_escalations: int = MAX_ESCALATIONS):
+        self.agent = agent
+        self.enabled = enabled
+        self.planner = planner
+        self.writer = writer
+        self.checks = checks
+        self.max_escalations = max_escalations
+        self.escalations: list[str] = []
+
+    def model(self, writing: bool) -> str:
+        if writing or not self.enabled or len(self.escalations) >= self.max_escalations:
+            return self.writer
+        if resilience.is_open(f"anthropic:{self.planner}"):
+            counters["planner_unavailable"] += 1
+            return self.writer
+        return self.planner
+
+    def is_planner(self, model: str) -> bool:
+        return model == self.planner and model != self.writer
+
+    def tools(self, model: str, tools: list) -> list:
+        return [*tools, DONE_TOOL] if self.is_planner(model) else tools
+
+    def max_tokens(self, model: str, max_tokens: int) -> int:
+        return min(max_tokens, PLANNER_MAX_TOKENS) if self.is_planner(model) else max_tokens
+
+    def review(self, response, searched: set) -> str | None:
+        """Reason to rerun a planner turn on the writer, or None if it's fine."""
+        for check in self.checks:
+            reason = check(response, searched)
+            if reason:
+                return reason
+        return None
+
+    def escalate(self, reason: str) -> str:
+        self.escalations.append(reason)
+        counters["escalations"] += 1
+        counters[f"escalated:{reason}"] += 1
+        print(f"[Routing] {self.agent}: {reason}, rerunning the turn on {self.writer}")
+        return self.writer
+
+    def count(self, model: str):
+        counters["planner_turns" if self.is_planner(model) else "writer_turns"] += 1
+
+
+def stats() -> dict:
+    return {"enabled": MODEL_ROUTING, "planner": PLANNER_MODEL, "writer": WRITER_MODEL, **counters}
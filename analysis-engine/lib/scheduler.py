@@ -0,0 +1,149 @@
+# Bounded job scheduler: a fixed pool of worker tasks pulls jobs from per-lane
+# queues (interactive ahead of background). When a lane is full, submit()
+# refuses immediately so the API can answer 429 with a Retry-After instead of
+# piling more concurrent pipelines onto Anthropic and Tavily. The background
+# lane (bulk items, which can sit on Message Batches for hours) may only hold
+# some of the workers at once, so interactive jobs always have workers left.
+import asyncio, math, os, time
+from collections import deque
+
+LANES = ("interactive", "background")  # Highest priority first
+
+
+class QueueFull(Exception):
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"{lane} queue is full")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class SchedulerClosed(Exception):
+    pass
+
+
+class Scheduler:
+    def __init__(self, workers: int = 8, queue_sizes: dict | None = None, expected_duration: float = 90.0,
+                 lane_workers: dict | None = None):
+        self.workers = workers
+        self.queue_sizes = queue_sizes or {"interactive": 50, "background": 20}
+        # Most workers each lane may occupy at once; lanes not listed may use all of them
+        self.lane_workers = lane_workers or {"background": max(1, workers // 4)}
+        self.lanes: dict[str, deque] = {lane: deque() for lane in LANES}
+        self.avg_duration = expected_duration  # EMA of finished job durations, drives ETAs
+        self.running = 0
+        self.running_by_lane = {lane: 0 for lane in LANES}
+        self.closed = False
+        self._wakeup = asyncio.Condition()
+        self._tasks: list[asyncio.Task] = []
+
+    def _ensure_workers(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def waiting(self) -> list[dict]:
+        return [entry for lane in LANES for entry in self.lanes[lane]]
+
+    def eta(self, position: int) -> int:
+        # Jobs ahead of this one drain `workers` at a time
+        return math.ceil(math.ceil(position / self.workers) * self.avg_duration)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.avg_duration / self.workers))
+
+    async def submit(self, job_id: str, run, lane: str = "interactive", emit=None):
+        """Queue `run` (a zero-arg coroutine function). Raises QueueFull or SchedulerClosed."""
+        if self.closed:
+            raise SchedulerClosed()
+        if len(self.lanes[lane]) >= self.queue_sizes[lane]:
+            raise QueueFull(lane, self.retry_after())
+        self._ensure_workers()
+
+        self.lanes[lane].append({"job_id": job_id, "run": run, "emit": emit, "lane": lane, "queued_at": time.monotonic()})
+        self._announce_positions()
+        async with self._wakeup:
+            self._wakeup.notify()
+
+    async def promote(self, job_id: str, lane: str):
+        # A coalesced interactive request shouldn't wait behind the background lane
+        target = LANES.index(lane)
+        for lower in LANES[target + 1:]:
+            for entry in self.lanes[lower]:
+                if entry["job_id"] == job_id:
+                    self.lanes[lower].remove(entry)
+                    self.lanes[lane].append(entry)
+                    entry["lane"] = lane
+                    self._announce_positions()
+                    async with self._wakeup:
+                        self._wakeup.notify()  # Idle workers may have been held back by the old lane's cap
+                    return
+
+    def _announce_positions(self):
+        # Entries that a free worker is about to pick up aren't really queued
+        free = self.workers - self.running
+        for index, entry in enumerate(self.waiting(), start=1):
+            position = index - free
+            if position > 0 and entry["emit"]:
+                entry["emit"]({"type": "queued", "position": position, "eta_seconds": self.eta(position)})
+
+    def _runnable(self, lane: str) -> bool:
+        return bool(self.lanes[lane]) and self.running_by_lane[lane] < self.lane_workers.get(lane, self.workers)
+
+    def _next(self) -> dict | None:
+        for lane in LANES:
+            if self._runnable(lane):
+                return self.lanes[lane].popleft()
+        return None
+
+    async def _worker(self):
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: any(self._runnable(lane) for lane in LANES))
+                entry = self._next()
+                self.running_by_lane[entry["lane"]] += 1
+            self._announce_positions()
+
+            self.running += 1
+            started = time.monotonic()
+            if entry["emit"]:
+                entry["emit"]({"type": "started", "waited_seconds": round(started - entry["queued_at"], 1)})
+            try:
+                await entry["run"]()
+            except Exception as e:
+                print(f"[Scheduler] Job {entry['job_id']} failed: {e}")
+            finally:
+                self.running -= 1
+                if entry["lane"] == "interactive":
+                    # Background jobs (bulk runs waiting on batched calls) would skew ETAs
+                    self.avg_duration = 0.8 * self.avg_duration + 0.2 * (time.monotonic() - started)
+                async with self._wakeup:
+                    self.running_by_lane[entry["lane"]] -= 1
+                    self._wakeup.notify()  # A capped lane may have work waiting on this slot
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "running_by_lane": dict(self.running_by_lane),
+            "lane_workers": self.lane_workers,
+            "queued": {lane: len(self.lanes[lane]) for lane in LANES},
+            "avg_duration_seconds": round(self.avg_duration, 1),
+        }
+
+    async def close(self):
+        self.closed = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+def scheduler_from_env() -> Scheduler:
+    workers = int(os.getenv("JOB_WORKERS", "8"))
+    return Scheduler(
+        workers=workers,
+        queue_sizes={
+            "interactive": int(os.getenv("JOB_QUEUE_SIZE", "50")),
+            "background":  int(os.getenv("JOB_QUEUE_SIZE_BACKGROUND", "20")),
+        },
+        lane_workers={"background": int(os.getenv("JOB_WORKERS_BACKGROUND", "0")) or max(1, workers // 4)},
+    )
@@ -0,0 +1,106 @@
+# Minimal dependency-graph executor for pipeline stages. Each stage names the
+# stages whose results it needs; it starts as soon as those finish, and its
+# events go out the moment it completes rather than at the end of the job.
+import asyncio, time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+from lib.tracing import span
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[..., Awaitable]           # async (job, **inputs) -> result
+    inputs: tuple[str, ...] = ()
+    on_done: Callable | None = None          # (job, result) -> None, e.g. to emit an event
+
+
+@dataclass
+class StageTiming:
+    start: float
+    end: float = 0.0
+    waited_on: str | None = None             # The dependency that finished last
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class StageRun:
+    results: dict = field(default_factory=dict)
+    timings: dict[str, StageTiming] = field(default_factory=dict)
+    started: float = 0.0
+
+    def critical_path(self) -> list[str]:
+        # Walk back from the last stage to finish through whichever input held it up
+        if not self.timings:
+            return []
+        name = max(self.timings, key=lambda n: self.timings[n].end)
+        path = []
+        while name:
+            path.append(name)
+            name = self.timings[name].waited_on
+        return path[::-1]
+
+    def summary(self) -> dict:
+        return {
+            "total_seconds": round(max((t.end for t in self.timings.values()), default=self.started) - self.started, 2),
+            "stages": {
+                name: {"start": round(t.start - self.started, 2), "seconds": round(t.duration, 2)}
+                for name, t in self.timings.items()
+            },
+            "critical_path": self.critical_path(),
+        }
+
+
+def check_stages(stages: list[Stage]):
+    names = {s.name for s in stages}
+    for stage in stages:
+        missing = set(stage.inputs) - names
+        if missing:
+            raise ValueError(f"Stage {stage.name!r} depends on unknown stage(s): {', '.join(sorted(missing))}")
+    # Kahn's algorithm — anything left over is on a cycle
+    remaining = {s.name: set(s.inputs) for s in stages}
+    while remaining:
+        ready = [n for n, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Stage dependency cycle among: {', '.join(sorted(remaining))}")
+        for n in ready:
+            del remaining[n]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+async def run_stages(stages: list[Stage], job) -> StageRun:
+    check_stages(stages)
+    run = StageRun(started=time.monotonic())
+    done: dict[str, asyncio.Future] = {s.name: asyncio.get_running_loop().create_future() for s in stages}
+
+    async def execute(stage: Stage):
+        inputs = {}
+        waited_on = None
+        for name in stage.inputs:
+            inputs[name] = await done[name]
+        if stage.inputs:
+            waited_on = max(stage.inputs, key=lambda n: run.timings[n].end)
+
+        timing = run.timings[stage.name] = StageTiming(start=time.monotonic(), waited_on=waited_on)
+        with span("stage", agent=stage.name, waited_on=waited_on):
+            result = await stage.run(job, **inputs)
+        timing.end = time.monotonic()
+        run.results[stage.name] = result
+        if stage.on_done:
+            stage.on_done(job, result)
+        done[stage.name].set_result(result)
+
+    tasks = [asyncio.create_task(execute(s), name=f"stage:{s.name}") for s in stages]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # One failed stage fails the job; don't leave siblings running
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return run
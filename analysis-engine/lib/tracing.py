@@ -0,0 +1,167 @@
+# Lightweight tracing. A job is a root span; stages, model turns and searches
+# are child spans, linked through a contextvar so asyncio tasks inherit their
+# parent. Finished spans go to whichever exporters are configured: a JSONL
+# file (TRACE_JSONL_PATH) and/or an HTTP collector (TRACE_COLLECTOR_URL).
+import asyncio, json, os, threading, time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from uuid import uuid4
+import httpx
+
+SSE_TIMING = os.getenv("TRACE_SSE_TIMING", "0") == "1"
+
+
+class Span:
+    def __init__(self, name: str, parent: "Span | None", attributes: dict):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid4().hex
+        self.span_id = uuid4().hex[:16]
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        self.start = time.time()
+        self.end: float | None = None
+        self.finished: list[Span] = parent.finished if parent else []  # Shared by the whole trace
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start": self.start,
+            "duration_seconds": round(self.duration, 4),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class JsonlExporter:
+    """Buffers finished spans and appends them to the file, off the event loop,
+    whenever a job's root span ends or the buffer fills up."""
+
+    def __init__(self, path: str, max_buffer: int = 1000):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.buffer: list[dict] = []
+        self.lock = threading.Lock()  # Writes from overlapping flushes don't interleave
+
+    def export(self, span: Span):
+        self.buffer.append(span.to_dict())
+        if len(self.buffer) >= self.max_buffer:
+            self.flush()
+
+    def _write(self, spans: list[dict]):
+        lines = "".join(json.dumps(s, default=str) + "\n" for s in spans)
+        try:
+            with self.lock, open(self.path, "a") as f:
+                f.write(lines)
+        except OSError as e:
+            print(f"[Tracing] JSONL export failed: {e}")
+
+    def flush(self):
+        spans, self.buffer = self.buffer, []
+        if not spans:
+            return
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._write, spans)
+        except RuntimeError:
+            self._write(spans)
+
+
+class HttpExporter:
+    """Buffers finished spans and POSTs them in one batch whenever a job's root span ends."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.buffer: list[dict] = []
+
+    def export(self, span: Span):
+        self.buffer.append(span.to_dict())
+
+    def _post(self, spans: list[dict]):
+        try:
+            httpx.post(self.url, json={"spans": spans}, timeout=5.0)
+        except httpx.HTTPError as e:
+            print(f"[Tracing] Collector export failed: {e}")
+
+    def flush(self):
+        spans, self.buffer = self.buffer, []
+        if not spans:
+            return
+        try:
+            # Off the event loop: tracing must never stall a job
+            asyncio.get_running_loop().run_in_executor(None, self._post, spans)
+        except RuntimeError:
+            self._post(spans)
+
+
+exporters: list = []
+if os.getenv("TRACE_JSONL_PATH"):
+    exporters.append(JsonlExporter(os.getenv("TRACE_JSONL_PATH")))
+if os.getenv("TRACE_COLLECTOR_URL"):
+    exporters.append(HttpExporter(os.getenv("TRACE_COLLECTOR_URL")))
+
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    parent = _current.get()
+    current = Span(name, parent, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attributes["error"] = repr(e)
+        raise
+    finally:
+        current.end = time.time()
+        _current.reset(token)
+        current.finished.append(current)
+        for exporter in exporters:
+            exporter.export(current)
+            if parent is None:
+                exporter.flush()
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def annotate(**attributes):
+    """Add attributes to whatever span is current, if any."""
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def timing_summary(root: Span) -> dict:
+    """Where a job's time went: model and search seconds per agent, from its finished spans."""
+    llm = defaultdict(float)
+    search = defaultdict(float)
+    counts = defaultdict(int)
+    for s in root.finished:
+        agent = s.attributes.get("agent", "unknown")
+        if s.name == "llm":
+            llm[agent] += s.duration
+            counts["llm_calls"] += 1
+        elif s.name == "search":
+            search[agent] += s.duration
+            counts["searches"] += 1
+            counts["search_cache_hits"] += bool(s.attributes.get("cache_hit") or s.attributes.get("evidence_hit"))
+    return {
+        "total_seconds": round(root.duration, 2),
+        "llm_seconds": {k: round(v, 2) for k, v in llm.items()},
+        "search_seconds": {k: round(v, 2) for k, v in search.items()},
+        **counts,
+    }
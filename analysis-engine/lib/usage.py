@@ -0,0 +1,98 @@
+# Token and latency accounting for model calls. Each job keeps its own
+# UsageRecorder (per agent, per turn); every call also lands in the
+# process-wide totals served by /metrics.
+import time
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+
+FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+
+@dataclass
+class CallUsage:
+    agent: str
+    turn: int
+    model: str
+    input_tokens: int
+    output_tokens: int
+    cache_creation_input_tokens: int
+    cache_read_input_tokens: int
+    latency_seconds: float
+
+
+def summarize(calls: list[CallUsage]) -> dict:
+    totals = {f: sum(getattr(c, f) for c in calls) for f in FIELDS}
+    prompt = totals["input_tokens"] + totals["cache_creation_input_tokens"] + totals["cache_read_input_tokens"]
+    return {
+        "calls": len(calls),
+        **totals,
+        "cache_read_ratio": round(totals["cache_read_input_tokens"] / prompt, 3) if prompt else 0.0,
+        "latency_seconds": round(sum(c.latency_seconds for c in calls), 2),
+    }
+
+
+class UsageRecorder:
+    def __init__(self):
+        self.calls: list[CallUsage] = []
+        self.turns: dict[str, int] = defaultdict(int)
+
+    def record(self, agent: str, model: str, usage, latency: float) -> CallUsage:
+        self.turns[agent] += 1
+        call = CallUsage(
+            agent=agent,
+            turn=self.turns[agent],
+            model=model,
+            # The cache fields are None when caching didn't apply to the request
+            **{f: getattr(usage, f, None) or 0 for f in FIELDS},
+            latency_seconds=round(latency, 3),
+        )
+        self.calls.append(call)
+        return call
+
+    def summary(self) -> dict:
+        by_agent = defaultdict(list)
+        by_model = defaultdict(list)
+        for call in self.calls:
+            by_agent[call.agent].append(call)
+            by_model[call.model].append(call)
+        return {
+            "total": summarize(self.calls),
+            "by_agent": {agent: summarize(calls) for agent, calls in by_agent.items()},
+            "by_model": {model: summarize(calls) for model, calls in by_model.items()},
+            "turns": [asdict(c) for c in self.calls],
+        }
+
+
+class UsageTotals:
+    """Running process-wide totals, bucketed by agent and by model. Doesn't keep individual calls."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.by_agent: dict[str, dict] = defaultdict(lambda: defaultdict(float))
+        self.by_model: dict[str, dict] = defaultdict(lambda: defaultdict(float))
+
+    def add(self, call: CallUsage):
+        for bucket in (self.by_agent[call.agent], self.by_model[call.model]):
+            bucket["calls"] += 1
+            bucket["latency_seconds"] += call.latency_seconds
+            for f in FIELDS:
+                bucket[f] += getattr(call, f)
+
+    @staticmethod
+    def _finish(bucket: dict) -> dict:
+        prompt = bucket["input_tokens"] + bucket["cache_creation_input_tokens"] + bucket["cache_read_input_tokens"]
+        return {
+            **{k: int(v) for k, v in bucket.items() if k != "latency_seconds"},
+            "avg_latency_seconds": round(bucket["latency_seconds"] / bucket["calls"], 2) if bucket["calls"] else 0.0,
+            "cache_read_ratio": round(bucket["cache_read_input_tokens"] / prompt, 3) if prompt else 0.0,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "since": self.started,
+            "by_agent": {k: self._finish(v) for k, v in self.by_agent.items()},
+            "by_model": {k: self._finish(v) for k, v in self.by_model.items()},
+        }
+
+
+totals = UsageTotals()
@@ -1,54 +1,177 @@
-import threading
-from agents.advocate import run_advocate
-from agents.skeptic import run_skeptic
-from agents.economist import run_economist
-from agents.alternatives import run_alternatives
-from agents.orchestrator import run_orchestrator
+import asyncio, os
+from agents.advocate import arun_advocate
+from agents.skeptic import arun_skeptic
+from agents.economist import arun_economist
+from agents.alternatives import arun_alternatives
+from agents.orchestrator import arun_orchestrator, arun_comparison_orchestrator
+from agents.category import arun_category
+from lib.budget import Deadline
+from lib.context import JobContext, current_job
+from lib.evidence import EvidenceStore
+from lib.stages import Stage, run_stages
+from lib.tracing import SSE_TIMING, span, timing_summary
+from lib.usage import UsageRecorder
 
+# Comparisons run several chains side by side, each needing the same time a single analysis does
+COMPARE_DEADLINE_SECONDS = float(os.getenv("COMPARE_DEADLINE_SECONDS", "150"))
 
-def run_pipeline(product: str, owns: str | None = None, emit=None) -> dict:
-    # Alternatives runs in a background thread — it needs no context from
-    # the other agents and is fast (3 searches max), so it runs in parallel.
-    alternatives_result = {}
-
-    def _run_alternatives():
-        nonlocal alternatives_result
-        alternatives_result = run_alternatives(product, emit=emit)
-
-    alt_thread = threading.Thread(target=_run_alternatives, daemon=True)
-    alt_thread.start()
-
-    # Main sequential pipeline: each agent builds on the previous
-    advocate_result  = run_advocate(product, owns=owns, emit=emit)
-    skeptic_result   = run_skeptic(product, owns=owns, context={
-        "advocate": advocate_result["analysis"]
-    }, emit=emit)
-    economist_result = run_economist(product, owns=owns, context={
-        "advocate": advocate_result["analysis"],
-        "skeptic":  skeptic_result["analysis"]
-    }, emit=emit)
-
-    # Orchestrator synthesizes all three — no searching, one structured call
-    verdict = run_orchestrator(product, owns=owns, context={
-        "advocate":  advocate_result["analysis"],
-        "skeptic":   skeptic_result["analysis"],
-        "economist": economist_result["analysis"]
+
+async def alternatives_stage(job: JobContext) -> dict:
+    return await arun_alternatives(job.product, emit=job.emit)
+
+
+async def advocate_stage(job: JobContext) -> dict:
+    return await arun_advocate(job.product, owns=job.owns, emit=job.emit)
+
+
+async def skeptic_stage(job: JobContext, advocate: dict) -> dict:
+    return await arun_skeptic(job.product, owns=job.owns, context={
+        "advocate": advocate["analysis"]
+    }, emit=job.emit)
+
+
+async def economist_stage(job: JobContext, advocate: dict, skeptic: dict) -> dict:
+    return await arun_economist(job.product, owns=job.owns, context={
+        "advocate": advocate["analysis"],
+        "skeptic":  skeptic["analysis"]
+    }, emit=job.emit)
+
+
+async def orchestrator_stage(job: JobContext, advocate: dict, skeptic: dict, economist: dict) -> dict:
+    # Synthesizes all three — no searching, one structured call
+    return await arun_orchestrator(job.product, owns=job.owns, context={
+        "advocate":  advocate["analysis"],
+        "skeptic":   skeptic["analysis"],
+        "economist": economist["analysis"]
     })
 
-    # Wait for alternatives to finish before returning
-    alt_thread.join()
 
-    if emit:
-        emit({"type": "verdict", "data": verdict})
-        emit({"type": "done"})
+# Each stage starts as soon as its inputs are ready. Alternatives needs nothing
+# from the other agents, so it runs alongside the advocate → skeptic →
+# economist → orchestrator chain, and the verdict no longer waits for it.
+STAGES = [
+    Stage("alternatives", alternatives_stage),
+    Stage("advocate",     advocate_stage),
+    Stage("skeptic",      skeptic_stage,      inputs=("advocate",)),
+    Stage("economist",    economist_stage,    inputs=("advocate", "skeptic")),
+    Stage("verdict",      orchestrator_stage, inputs=("advocate", "skeptic", "economist"),
+          on_done=lambda job, verdict: job.send({"type": "verdict", "data": verdict})),
+]
+
+
+async def run_job(job: JobContext, stages: list[Stage], **span_attributes):
+    token = current_job.set(job)
+    try:
+        with span("job", **span_attributes) as root:
+            run = await run_stages(stages, job)
+            timings = run.summary()
+            if SSE_TIMING:
+                job.send({"type": "timing", **timings, "breakdown": timing_summary(root)})
+    finally:
+        current_job.reset(token)
+    print(f"[Pipeline] {timings['total_seconds']}s, critical path: {' → '.join(timings['critical_path'])}")
+    return run, timings
+
+
+def finish_job(job: JobContext, usage: dict):
+    print(f"[Pipeline] Tokens: {usage['total']['input_tokens']} in, {usage['total']['output_tokens']} out, "
+          f"{usage['total']['cache_read_input_tokens']} cache reads")
+    job.send({"type": "done", "usage": usage["total"]})
+
+
+async def arun_pipeline(product: str, owns: str | None = None, emit=None, stages: list[Stage] = STAGES,
+                        parallel_search: bool | None = None, **job_options) -> dict:
+    # job_options override JobContext fields, e.g. a bulk job's deadline, evidence store and batcher
+    job = JobContext(product, owns, emit, **job_options)
+    if parallel_search is not None:
+        job.parallel_search = parallel_search
+
+    run, timings = await run_job(job, stages, product=product, owns=owns)
+    usage = job.usage.summary()
+    finish_job(job, usage)
+    return {**run.results, "timings": timings, "usage": usage}
 
-    return {
-        "advocate":     advocate_result,
-        "skeptic":      skeptic_result,
-        "economist":    economist_result,
-        "alternatives": alternatives_result,
-        "verdict":      verdict,
+
+def run_pipeline(product: str, owns: str | None = None, emit=None) -> dict:
+    return asyncio.run(arun_pipeline(product, owns=owns, emit=emit))
+
+
+def comparison_stages(products: list[str], jobs: dict[str, JobContext]) -> list[Stage]:
+    """Category research runs once, alongside every product's advocate. Each
+    product's skeptic and economist then start with the category sources in
+    hand, and one comparative verdict closes it out. Per-product stages run
+    under that product's JobContext; searches issued by any chain are shared
+    with the others through the comparison's evidence store."""
+
+    async def category_stage(root: JobContext) -> dict:
+        result = await arun_category(products, emit=root.emit)
+        # Category sources land in the shared store; hand them to every product's agents
+        for job in jobs.values():
+            job.evidence.adopt(root.evidence, "category")
+        return result
+
+    def for_product(job: JobContext, run):
+        async def stage(root: JobContext, **inputs):
+            token = current_job.set(job)
+            try:
+                # "skeptic:1" → skeptic=..., so the single-product stage functions work unchanged
+                return await run(job, **{name.split(":")[0]: value for name, value in inputs.items() if name != "category"})
+            finally:
+                current_job.reset(token)
+        return stage
+
+    async def verdict_stage(root: JobContext, category: dict, **analyses) -> dict:
+        contexts = {
+            product: {agent: analyses[f"{agent}:{i}"]["analysis"] for agent in ("advocate", "skeptic", "economist")}
+            for i, product in enumerate(products)
+        }
+        return await arun_comparison_orchestrator(products, owns=root.owns, category=category["analysis"], contexts=contexts)
+
+    stages = [Stage("category", category_stage)]
+    for i, product in enumerate(products):
+        job = jobs[product]
+        stages += [
+            Stage(f"advocate:{i}",  for_product(job, advocate_stage)),
+            Stage(f"skeptic:{i}",   for_product(job, skeptic_stage),   inputs=(f"advocate:{i}", "category")),
+            Stage(f"economist:{i}", for_product(job, economist_stage), inputs=(f"advocate:{i}", f"skeptic:{i}")),
+        ]
+    chains = [f"{agent}:{i}" for i in range(len(products)) for agent in ("advocate", "skeptic", "economist")]
+    stages.append(Stage("verdict", verdict_stage, inputs=("category", *chains),
+                        on_done=lambda job, verdict: job.send({"type": "comparison", "data": verdict})))
+    return stages
+
+
+async def arun_comparison(products: list[str], owns: str | None = None, emit=None,
+                          parallel_search: bool | None = None) -> dict:
+    root = JobContext(" vs ".join(products), owns, emit, deadline=Deadline(COMPARE_DEADLINE_SECONDS))
+
+    def tagged(product: str):
+        # Per-product events carry the product so clients can tell the chains apart
+        return (lambda event: emit({**event, "product": product})) if emit else None
+
+    jobs = {
+        product: JobContext(
+            product, owns, tagged(product),
+            deadline=Deadline(COMPARE_DEADLINE_SECONDS),
+            evidence=EvidenceStore(shared=root.evidence, product=product),
+        )
+        for product in products
     }
+    if parallel_search is not None:
+        for job in (root, *jobs.values()):
+            job.parallel_search = parallel_search
+
+    run, timings = await run_job(root, comparison_stages(products, jobs), mode="comparison", products=products, owns=owns)
+    combined = UsageRecorder()
+    for job in (root, *jobs.values()):
+        combined.calls += job.usage.calls
+    usage = combined.summary()
+    finish_job(root, usage)
+    return {**run.results, "timings": timings, "usage": usage}
+
+
+def run_comparison(products: list[str], owns: str | None = None, emit=None) -> dict:
+    return asyncio.run(arun_comparison(products, owns=owns, emit=emit))
 
 
 if __name__ == "__main__":
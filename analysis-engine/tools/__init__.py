@@ -1,3 +1,4 @@
-__all__ = ["search"]
+__all__ = ["search", "asearch", "get_backend", "set_backend"]
 
-from tools.search import search
\ No newline at end of file
+from tools.search import search, asearch
+from tools.backend import get_backend, set_backend
\ No newline at end of file
@@ -0,0 +1,141 @@
+# Long-lived search backends. One backend instance is shared by every agent and
+# by the API process so connections are pooled and kept alive across searches
+# instead of paying a TLS handshake per query.
+import asyncio, os, time
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    import h2  # noqa: F401 — httpx only negotiates HTTP/2 when h2 is installed
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+TAVILY_URL = "https://api.tavily.com/search"
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+
+
+class SearchBackend:
+    """Interface every backend implements. Both entry points return
+    a list of {"title", "url", "content"} dicts."""
+
+    name = "base"
+
+    def search(self, query: str, **params) -> list[dict]:
+        raise NotImplementedError
+
+    async def asearch(self, query: str, **params) -> list[dict]:
+        # Default: run the sync path off the event loop
+        return await asyncio.to_thread(self.search, query, **params)
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        self.close()
+
+
+class TavilyBackend(SearchBackend):
+    name = "tavily"
+
+    def __init__(self, api_key: str | None = None, timeout: float = 30.0):
+        self.api_key = api_key or os.getenv("TAVILY_API_KEY")
+        self.timeout = timeout
+        self._client: httpx.Client | None = None
+        self._async_client: httpx.AsyncClient | None = None
+        self._async_loop = None
+
+    def _headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(http2=HTTP2, limits=POOL_LIMITS, timeout=self.timeout, headers=self._headers())
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        # An AsyncClient's pool is tied to the loop it was first used on, so the
+        # CLIs (one asyncio.run per invocation) get a fresh one per loop
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(http2=HTTP2, limits=POOL_LIMITS, timeout=self.timeout, headers=self._headers())
+            self._async_loop = loop
+        return self._async_client
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> list[dict]:
+        response.raise_for_status()
+        return [
+            {"title": r["title"], "url": r["url"], "content": r["content"]}
+            for r in response.json()["results"]
+        ]
+
+    def search(self, query: str, **params) -> list[dict]:
+        return self._parse(self.client.post(TAVILY_URL, json={"query": query, **params}))
+
+    async def asearch(self, query: str, **params) -> list[dict]:
+        return self._parse(await self.async_client.post(TAVILY_URL, json={"query": query, **params}))
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self):
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+class FakeBackend(SearchBackend):
+    """Local stand-in for tests and offline runs. `results` is either a dict
+    of query -> results or a callable(query, **params) -> results."""
+
+    name = "fake"
+
+    def __init__(self, results=None, latency: float = 0.0):
+        self.results = results or {}
+        self.latency = latency
+        self.queries: list[str] = []
+
+    def _lookup(self, query: str, **params) -> list[dict]:
+        self.queries.append(query)
+        if callable(self.results):
+            return self.results(query, **params)
+        return self.results.get(query, [
+            {"title": f"Result for {query}", "url": f"https://example.com/{len(self.queries)}", "content": f"Fake snippet about {query}."}
+        ])
+
+    def search(self, query: str, **params) -> list[dict]:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._lookup(query, **params)
+
+    async def asearch(self, query: str, **params) -> list[dict]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._lookup(query, **params)
+
+
+BACKENDS = {"tavily": TavilyBackend, "fake": FakeBackend}
+
+_backend: SearchBackend | None = None
+
+
+def get_backend() -> SearchBackend:
+    global _backend
+    if _backend is None:
+        _backend = BACKENDS[os.getenv("SEARCH_BACKEND", "tavily")]()
+    return _backend
+
+
+def set_backend(backend: SearchBackend) -> SearchBackend:
+    """Swap the process-wide backend (e.g. a FakeBackend in tests). Returns the previous one."""
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
@@ -0,0 +1,157 @@
+# Two-tier cache for search results: an in-process LRU in front of a SQLite
+# table that survives restarts. Entries expire by query class — prices move
+# within hours, reviews and specs hold for days. Async callers use aget/aput,
+# which run the SQLite tier in a thread so a commit never stalls the event loop.
+import asyncio, json, os, re, sqlite3, threading, time
+from collections import OrderedDict
+
+QUERY_CLASS_TTLS = {
+    "price":   6 * 3600,
+    "review":  3 * 86400,
+    "default": 86400,
+}
+
+PRICE_TERMS  = {"price", "prices", "pricing", "deal", "deals", "sale", "discount", "cost", "cheapest",
+                "coupon", "msrp", "$"}
+REVIEW_TERMS = {"review", "reviews", "reddit", "vs", "versus", "comparison", "compare", "specs",
+                "benchmark", "problems", "issues", "durability", "complaints", "alternatives", "best"}
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivially different queries share a key.
+    Separators inside a word go without a trace: "WH-1000XM5" and "wh1000xm5" are the same model."""
+    query = re.sub(r"(?<=\w)[-./](?=\w)", "", query.lower()).replace("$", " $ ")
+    return " ".join(re.sub(r"[^\w$]+", " ", query).split())
+
+
+def classify_query(query: str) -> str:
+    # Price wins over review: "XM5 review price" should still go stale quickly
+    tokens = set(normalize_query(query).split())
+    if tokens & PRICE_TERMS:
+        return "price"
+    if tokens & REVIEW_TERMS:
+        return "review"
+    return "default"
+
+
+class SearchCache:
+    def __init__(self, path: str | None = None, max_entries: int = 1024, ttls: dict | None = None):
+        self.max_entries = max_entries
+        self.ttls = {**QUERY_CLASS_TTLS, **(ttls or {})}
+        self.memory: OrderedDict[str, tuple[float, list]] = OrderedDict()
+        self.lock = threading.Lock()     # Memory tier and counters; never held across disk I/O
+        self.db_lock = threading.Lock()  # One SQLite connection shared by threads
+        self.counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+        self.db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache (key TEXT PRIMARY KEY, expires_at REAL, results TEXT)"
+            )
+            self.db.execute("DELETE FROM search_cache WHERE expires_at < ?", (time.time(),))
+            self.db.commit()
+
+    @staticmethod
+    def key(query: str, params: dict) -> str:
+        return json.dumps([normalize_query(query), sorted(params.items())])
+
+    def _memory_get(self, key: str, now: float) -> list | None:
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is None:
+                return None
+            expires_at, results = entry
+            if expires_at > now:
+                self.memory.move_to_end(key)
+                self.counters["hits"] += 1
+                self.counters["memory_hits"] += 1
+                return results
+            del self.memory[key]
+            self.counters["expirations"] += 1
+            return None
+
+    def _disk_get(self, key: str, now: float) -> list | None:
+        # Blocking; async callers run it in a thread
+        with self.db_lock:
+            row = self.db.execute("SELECT expires_at, results FROM search_cache WHERE key = ?", (key,)).fetchone()
+            if row and row[0] <= now:
+                self.db.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self.db.commit()
+        with self.lock:
+            if row and row[0] > now:
+                results = json.loads(row[1])
+                self._remember(key, row[0], results)
+                self.counters["hits"] += 1
+                self.counters["disk_hits"] += 1
+                return results
+            if row:
+                self.counters["expirations"] += 1
+            self.counters["misses"] += 1
+            return None
+
+    def _disk_put(self, key: str, expires_at: float, results: list):
+        with self.db_lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO search_cache (key, expires_at, results) VALUES (?, ?, ?)",
+                (key, expires_at, json.dumps(results)),
+            )
+            self.db.commit()
+
+    def _miss(self) -> None:
+        with self.lock:
+            self.counters["misses"] += 1
+
+    def get(self, query: str, params: dict) -> list | None:
+        key, now = self.key(query, params), time.time()
+        results = self._memory_get(key, now)
+        if results is not None:
+            return results
+        if self.db is not None:
+            return self._disk_get(key, now)
+        return self._miss()
+
+    async def aget(self, query: str, params: dict) -> list | None:
+        """get() that keeps SQLite off the event loop; memory hits stay inline."""
+        key, now = self.key(query, params), time.time()
+        results = self._memory_get(key, now)
+        if results is not None:
+            return results
+        if self.db is not None:
+            return await asyncio.to_thread(self._disk_get, key, now)
+        return self._miss()
+
+    def put(self, query: str, params: dict, results: list):
+        key = self.key(query, params)
+        expires_at = time.time() + self.ttls[classify_query(query)]
+        with self.lock:
+            self._remember(key, expires_at, results)
+        if self.db is not None:
+            self._disk_put(key, expires_at, results)
+
+    async def aput(self, query: str, params: dict, results: list):
+        key = self.key(query, params)
+        expires_at = time.time() + self.ttls[classify_query(query)]
+        with self.lock:
+            self._remember(key, expires_at, results)
+        if self.db is not None:
+            await asyncio.to_thread(self._disk_put, key, expires_at, results)
+
+    def _remember(self, key: str, expires_at: float, results: list):
+        # Caller holds the lock
+        self.memory[key] = (expires_at, results)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "memory_entries": len(self.memory),
+                "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+            }
@@ -1,27 +1,80 @@
-import string
 from dotenv import load_dotenv
 import os
-from tavily import TavilyClient
+from tools.backend import get_backend
+from tools.cache import SearchCache
+from lib import governor, resilience
+from lib.tracing import annotate
 
 load_dotenv()  # Load environment variables from .env file
 
-def search(query: str) -> str:
-    """LLM search function that allows agents to search for information."""
-    # To install: pip install tavily-python
-    
-    client = TavilyClient(os.getenv("TAVILY_API_KEY"))
-    response = client.search(
-        query=query,
-        search_depth="advanced"
+SEARCH_PARAMS = {"search_depth": "advanced"}
+
+# Set SEARCH_CACHE_PATH="" to keep the cache in memory only
+cache = SearchCache(
+    path=os.getenv("SEARCH_CACHE_PATH", os.path.join(os.path.dirname(__file__), "..", ".cache", "search.sqlite3")),
+    max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+)
+
+
+def search_results(query: str) -> list[dict]:
+    """Raw search results (title, url, content), served from cache when fresh."""
+    cached = cache.get(query, SEARCH_PARAMS)
+    if cached is not None:
+        return cached
+
+    results = get_backend().search(query, **SEARCH_PARAMS)
+    if results:  # Don't pin an empty page for hours
+        cache.put(query, SEARCH_PARAMS, results)
+    return results
+
+
+async def asearch_results(query: str) -> list[dict]:
+    cached = await cache.aget(query, SEARCH_PARAMS)
+    annotate(cache_hit=cached is not None)
+    if cached is not None:
+        return cached
+
+    backend = get_backend()
+    name = f"search:{backend.name}"
+
+    async def attempt(reservation):
+        results = await backend.asearch(query, **SEARCH_PARAMS)
+        reservation.settle()
+        return results
+
+    # Retried on transient errors, and hedged with a duplicate request when it runs past the recent p95;
+    # every request, duplicates included, reserves its own quota
+    results = await resilience.call(
+        name,
+        attempt,
+        timeout=resilience.SEARCH_TIMEOUT_SECONDS,
+        hedge=True,
+        reserve=lambda: governor.reserve(name),
     )
+    if results:
+        await cache.aput(query, SEARCH_PARAMS, results)
+    return results
+
+
+def format_results(results: list[dict], snippet_chars: int = 500) -> str:
     output = []
-    for result in response["results"]:
+    for result in results:
         output.append(f"Title: {result['title']}")
         output.append(f"URL: {result['url']}")
-        output.append(f"Snippet: {result['content'][:500]}")
+        output.append(f"Snippet: {result['content'][:snippet_chars]}")
         output.append("-" * 80)
-    return "\n".join(output)  # Print the first 500 characters of the snippet
-        
+    return "\n".join(output)  # Print the first `snippet_chars` characters of each snippet
+
+
+def search(query: str) -> str:
+    """LLM search function that allows agents to search for information."""
+    return format_results(search_results(query))
+
+
+async def asearch(query: str) -> str:
+    return format_results(await asearch_results(query))
+
 
 if __name__ == "__main__":
-    search("What is the best laptop for programming in 2024?")
\ No newline at end of file
+    search("What is the best laptop for programming in 2024?")
+    print(cache.stats())
@@ -50,5 +50,10 @@ export async function POST(req: Request) {
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify(body),
   });
-  return Response.json(await upstream.json());
+  // Pass backpressure through so the client can honour Retry-After
+  const retryAfter = upstream.headers.get("Retry-After");
+  return Response.json(await upstream.json(), {
+    status: upstream.status,
+    headers: retryAfter ? { "Retry-After": retryAfter } : undefined,
+  });
 }
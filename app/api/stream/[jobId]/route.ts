@@ -2,12 +2,17 @@
 export const dynamic = "force-dynamic";
 
 export async function GET(
-  _: Request,
+  req: Request,
   { params }: { params: Promise<{ jobId: string }> }
 ) {
   const { jobId } = await params;
+  // Forward the browser's resume point so a reconnect picks up where it left off
+  const lastEventId = req.headers.get("Last-Event-ID");
   const upstream = await fetch(`${process.env.API_URL}/stream/${jobId}`, {
-    headers: { Accept: "text/event-stream" },
+    headers: {
+      Accept: "text/event-stream",
+      ...(lastEventId ? { "Last-Event-ID": lastEventId } : {}),
+    },
   });
   return new Response(upstream.body, {
     headers: {
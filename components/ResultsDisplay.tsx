@@ -435,8 +435,10 @@ export default function ResultsDisplay({
     };
 
     es.onerror = () => {
+      // While CONNECTING the browser is retrying on its own and will resume
+      // from the last event id it saw — only give up once it has stopped.
+      if (es.readyState !== EventSource.CLOSED) return;
       setPipelineError("Connection lost. The analysis may have timed out — try again.");
-      es.close();
     };
 
     return () => es.close();